@@ -0,0 +1,96 @@
+"""Compare memory footprint and speed of models.Exam with its former, dict-based implementation.
+
+Run with: python -m benchmarks.bench_models
+"""
+import gc
+import json
+import timeit
+import typing
+import argparse
+import tracemalloc
+
+from qisbot import models
+
+_row = ('1000', 'Exam', None, None, '1', None, 'WiSe 16/17', '01.02.2017', '1,7', None, '5,0', 'bestanden', None)
+
+
+class LegacyExam(object):
+    """models.Exam as it was before it got slots."""
+
+    def __init__(self):
+        self.id = None  # type: str
+        self.name = None  # type: str
+        self.special = None  # type: str
+        self.ruling = None  # type: str
+        self.attempt = None  # type: str
+        self.nullify = None  # type: str
+        self.semester = None  # type: str
+        self.date = None  # type: str
+        self.grade = None  # type: str
+        self.points = None  # type: str
+        self.ects = None  # type: str
+        self.status = None  # type: str
+        self.recognized = None  # type: str
+
+    @property
+    def attributes(self) -> typing.Dict[str, typing.Any]:
+        attrs = {}
+        for attr in dir(self):
+            if attr.startswith('__') or attr == 'attributes':
+                continue
+            attrs[attr] = getattr(self, attr)
+        return attrs
+
+
+def legacy_from_row(row: typing.Sequence[str]) -> LegacyExam:
+    exam = LegacyExam()
+    for name, member in models.ExamData.__members__.items():
+        setattr(exam, name, row[member.value])
+    return exam
+
+
+def measure_memory(factory: typing.Callable[[], typing.Any], count: int) -> float:
+    """Get the average amount of bytes allocated per instance."""
+    gc.collect()
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    instances = [factory() for _ in range(count)]
+    allocated = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'filename'))
+    tracemalloc.stop()
+    del instances
+    # The list holding the instances is not part of an instance's footprint
+    return (allocated - count * 8) / count
+
+
+def measure_time(statement: typing.Callable[[], typing.Any], number: int) -> float:
+    """Get the best average time of a statement in microseconds."""
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def run(count: int = 10000, number: int = 10000) -> typing.Dict[str, typing.Dict[str, float]]:
+    legacy_exam = legacy_from_row(_row)
+    exam = models.Exam.from_row(_row)
+    return {
+        'legacy': {
+            'bytes_per_instance': measure_memory(lambda: legacy_from_row(_row), count),
+            'from_row_us': measure_time(lambda: legacy_from_row(_row), number),
+            'to_row_us': measure_time(
+                lambda: tuple(legacy_exam.attributes.get(name) for name in models.ExamData.__members__.keys()),
+                number),
+            'attributes_us': measure_time(lambda: legacy_exam.attributes, number)
+        },
+        'slotted': {
+            'bytes_per_instance': measure_memory(lambda: models.Exam.from_row(_row), count),
+            'from_row_us': measure_time(lambda: models.Exam.from_row(_row), number),
+            'to_row_us': measure_time(exam.to_row, number),
+            'attributes_us': measure_time(lambda: exam.attributes, number)
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000, help='Amount of instances for the memory measurement')
+    parser.add_argument('--number', type=int, default=10000, help='Amount of executions per timing')
+    arguments = parser.parse_args()
+    print(json.dumps(run(count=arguments.count, number=arguments.number), indent=2))
@@ -0,0 +1,207 @@
+"""Measure the stages of refreshing an exams extract offline, against synthetic data of increasing size.
+
+Run with: python -m benchmarks.bench_pipeline [--sizes 10 100 1000 10000] [--output results.json]
+Compare with an earlier run: python -m benchmarks.bench_pipeline --compare earlier.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import typing
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import lxml
+from lxml import html
+
+from qisbot import bot
+from qisbot import models
+from qisbot import persistence
+from qisbot.qis import Qis
+from qisbot.selectors import Selectors
+from qisbot.scraper import Scraper
+from benchmarks import synthetic
+
+_account = 'benchmark'
+_config = """[QIS]
+username = {}
+password = secret
+baseUrl = http://localhost/
+
+[NOTIFICATIONS]
+workers = 0
+""".format(_account)
+
+
+def measure(statement: typing.Callable[[], typing.Any], number: int, repeat: int = 5,
+            setup: typing.Callable[[], typing.Any] = None) -> typing.Dict[str, float]:
+    """Time a statement.
+
+    Args:
+        statement: The statement to time
+        number: Amount of executions per repetition
+        repeat: Amount of repetitions
+        setup: Called before every repetition, not timed
+    Returns:
+        The best and mean time of a single execution in milliseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started_at = time.perf_counter()
+        for _ in range(number):
+            statement()
+        timings.append((time.perf_counter() - started_at) / number * 1e3)
+    return {'best_ms': min(timings), 'mean_ms': sum(timings) / len(timings)}
+
+
+def executions_for(size: int) -> int:
+    """Execute small workloads more often, so that their timings aren't dominated by noise."""
+    return max(1, 1000 // size)
+
+
+def bench_parsing(size: int) -> typing.Dict[str, typing.Dict[str, float]]:
+    page = synthetic.exams_extract_page(synthetic.exam_rows(size)).encode('utf-8')
+
+    def parse() -> html.HtmlElement:
+        document = html.fromstring(page)
+        document.make_links_absolute(base_url='http://localhost/qisserver/rds', resolve_base_href=True)
+        return document
+
+    document = parse()
+    table = Scraper.compile(Selectors.EXAMS_EXTRACT_EXAMS_TABLE.value)(document)[0]
+    table_rows = Scraper.compile('.//tr')(table)
+    number = executions_for(size)
+    return {
+        'parse': measure(parse, number),
+        'map_to_exam': measure(lambda: Qis.map_exams(table_rows), number)
+    }
+
+
+def bench_diffing(size: int) -> typing.Dict[str, typing.Dict[str, float]]:
+    old_exams = synthetic.exams(size, seed=0)
+    # Every exam that was not graded before is graded now
+    new_exams = synthetic.exams(size, graded_ratio=1.0, seed=0)
+    pairs = list(zip(old_exams, new_exams))
+    return {
+        'compare_exams': measure(lambda: [models.compare_exams(old, new) for old, new in pairs], executions_for(size))
+    }
+
+
+def bench_persistence(size: int, directory: str) -> typing.Dict[str, typing.Dict[str, float]]:
+    database_path = os.path.join(directory, 'persistence-{}.db'.format(size))
+    exams = synthetic.exams(size)
+    db_manager = persistence.DatabaseManager(database_path)
+
+    def reset():
+        db_manager.execute('DELETE FROM exams')
+        db_manager.execute('DELETE FROM exam_history')
+        db_manager.commit()
+
+    def persist_all():
+        for exam in exams:
+            db_manager.persist_exam(exam, account=_account)
+
+    def update_all():
+        for exam in exams:
+            db_manager.update_exam(exam.id, {'status': 'bestanden'}, account=_account)
+
+    try:
+        results = {
+            'persist_exam': measure(persist_all, 1, setup=reset),
+            'apply_exam_changes': measure(lambda: db_manager.apply_exam_changes(_account, exams, []), 1, setup=reset)
+        }
+        results['update_exam'] = measure(update_all, 1)
+        results['fetch_all_exams'] = measure(lambda: db_manager.fetch_all_exams(account=_account),
+                                             executions_for(size))
+        return results
+    finally:
+        db_manager.close()
+
+
+def bench_dataset(size: int, directory: str) -> typing.Dict[str, typing.Dict[str, float]]:
+    config_path = os.path.join(directory, 'qisbot.ini')
+    with open(config_path, 'w') as config_file:
+        config_file.write(_config)
+    benchmark_bot = bot.Bot(config_path, os.path.join(directory, 'dataset-{}.db'.format(size)))
+    try:
+        benchmark_bot._db_manager.apply_exam_changes(_account, synthetic.exams(size), [])
+        return {
+            'exams_extract_dataset': measure(benchmark_bot.exams_extract_dataset, executions_for(size)),
+            'exams_extract_dataset_omit_empty': measure(lambda: benchmark_bot.exams_extract_dataset(omit_empty=True),
+                                                        executions_for(size))
+        }
+    finally:
+        benchmark_bot.shutdown()
+
+
+def run(sizes: typing.List[int]) -> typing.Dict[str, typing.Any]:
+    """Run all benchmarks for all sizes.
+
+    Returns:
+        The results keyed by benchmark and size, along with information about the environment
+    """
+    results = {}  # type: typing.Dict[str, typing.Dict[str, typing.Dict[str, float]]]
+    directory = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            for benchmarks in (bench_parsing(size), bench_diffing(size), bench_persistence(size, directory),
+                               bench_dataset(size, directory)):
+                for name, timing in benchmarks.items():
+                    results.setdefault(name, {})[str(size)] = timing
+    finally:
+        shutil.rmtree(directory)
+    return {'environment': environment(), 'results': results}
+
+
+def environment() -> typing.Dict[str, str]:
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'lxml': lxml.__version__,
+        'sqlite': persistence.sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    }
+
+
+def compare(earlier: typing.Dict[str, typing.Any], current: typing.Dict[str, typing.Any]) -> typing.List[str]:
+    """Describe how the best timings changed between two runs, as one line per benchmark and size."""
+    lines = []
+    for name, timings in sorted(current['results'].items()):
+        for size, timing in sorted(timings.items(), key=lambda item: int(item[0])):
+            earlier_timing = earlier['results'].get(name, {}).get(size)
+            if earlier_timing is None:
+                continue
+            ratio = timing['best_ms'] / earlier_timing['best_ms'] if earlier_timing['best_ms'] else float('inf')
+            lines.append('{:<24} {:>6} rows: {:10.3f} ms -> {:10.3f} ms ({:+.1%})'.format(
+                name, size, earlier_timing['best_ms'], timing['best_ms'], ratio - 1))
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='Amounts of exams to run every benchmark with')
+    parser.add_argument('--output', type=str, help='Write the results to this file instead of stdout')
+    parser.add_argument('--compare', type=str, metavar='RESULTS', help='Compare with the results of an earlier run')
+    arguments = parser.parse_args()
+    current_results = run(arguments.sizes)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(current_results, output_file, indent=2)
+    else:
+        json.dump(current_results, sys.stdout, indent=2)
+        print()
+    if arguments.compare:
+        with open(arguments.compare, 'r') as earlier_file:
+            print('\n'.join(compare(json.load(earlier_file), current_results)), file=sys.stderr)
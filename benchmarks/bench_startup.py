@@ -0,0 +1,73 @@
+"""Measure how long a cold start of the command line interface takes.
+
+Run with: python -m benchmarks.bench_startup
+"""
+import os
+import sys
+import json
+import time
+import typing
+import argparse
+import subprocess
+
+_root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(*args: str) -> str:
+    """Run a fresh interpreter and get what it wrote to stderr."""
+    process = subprocess.Popen([sys.executable] + list(args), cwd=_root_path, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError('Statement failed:\n{}'.format(stderr))
+    return stderr
+
+
+def measure_wall_time(statement: str, repeat: int) -> float:
+    """Get the best wall-clock time of executing a statement in a fresh interpreter in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python('-c', statement)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1e3
+
+
+def measure_import_times(statement: str) -> typing.Dict[str, float]:
+    """Get the cumulative import time of every module imported by a statement in milliseconds.
+
+    Uses -X importtime, which requires Python 3.7.
+    """
+    times = {}
+    for line in run_python('-X', 'importtime', '-c', statement).splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e3
+    return times
+
+
+def run(repeat: int = 10, top: int = 10) -> typing.Dict[str, typing.Any]:
+    interpreter_ms = measure_wall_time('pass', repeat)
+    cli_ms = measure_wall_time('import runqisbot', repeat)
+    results = {
+        'interpreter_ms': interpreter_ms,
+        'cli_ms': cli_ms,
+        'cli_overhead_ms': cli_ms - interpreter_ms
+    }  # type: typing.Dict[str, typing.Any]
+    if sys.version_info >= (3, 7):
+        # Leave out what the interpreter imports on its own, e.g. through site
+        startup = measure_import_times('pass')
+        times = {name: ms for name, ms in measure_import_times('import runqisbot').items() if name not in startup}
+        results['import_runqisbot_ms'] = times['runqisbot']
+        slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:top]
+        results['slowest_imports_ms'] = dict(slowest)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='Amount of cold starts per timing')
+    parser.add_argument('--top', type=int, default=10, help='Amount of slowest imports to report (Python 3.7+)')
+    arguments = parser.parse_args()
+    print(json.dumps(run(repeat=arguments.repeat, top=arguments.top), indent=2))
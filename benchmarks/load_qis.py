@@ -0,0 +1,135 @@
+"""Drive Bot.refresh_exams_extract for many simulated accounts against a local mock QIS server.
+
+Run with: python -m benchmarks.load_qis [--accounts 1000] [--workers 16] [--rounds 3] [--latency 0.02]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import shutil
+import typing
+import argparse
+import tempfile
+
+from qisbot import ratelimit
+from qisbot.runner import AccountResult
+from qisbot.runner import MultiAccountRunner
+from benchmarks.mock_qis import MockQisServer
+
+_config_template = """[QIS]
+username = user{number}
+password = {password}
+baseUrl = {base_url}
+session_file = {session_file}
+
+[NOTIFICATIONS]
+workers = 0
+"""
+
+
+def percentile(values: typing.List[float], fraction: float) -> float:
+    """Get the nearest-rank percentile of some values, 0.0 when there are none."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(results: typing.List[AccountResult], wall_time: float) -> typing.Dict[str, typing.Any]:
+    """Summarize the results of a single round of refreshes."""
+    durations = [result.duration * 1e3 for result in results if result.succeeded]
+    errors = {}  # type: typing.Dict[str, int]
+    for result in results:
+        if not result.succeeded:
+            errors[type(result.error).__name__] = errors.get(type(result.error).__name__, 0) + 1
+    return {
+        'accounts': len(results),
+        'succeeded': len(durations),
+        'errors': errors,
+        'new_exams': sum(len(result.new_exams) for result in results),
+        'changed_exams': sum(len(result.changed_exams) for result in results),
+        'wall_time_s': wall_time,
+        'throughput_per_s': len(results) / wall_time if wall_time else 0.0,
+        'latency_ms': {
+            'p50': percentile(durations, 0.5),
+            'p90': percentile(durations, 0.9),
+            'p99': percentile(durations, 0.99),
+            'max': max(durations) if durations else 0.0
+        }
+    }
+
+
+def run(accounts: int, workers: int, rounds: int, server: MockQisServer, rate: float = None,
+        max_in_flight: int = None) -> typing.Dict[str, typing.Any]:
+    """Refresh all accounts a number of times.
+
+    The first round includes every account's login, later rounds reuse the sessions.
+
+    Args:
+        accounts: Amount of simulated accounts
+        workers: Amount of accounts refreshed concurrently
+        rounds: Amount of times every account is refreshed
+        server: The running mock server
+        rate: Requests per second allowed by the rate limiter. When None, only max_in_flight applies.
+        max_in_flight: Concurrent requests allowed by the rate limiter. When None, workers is used.
+    Returns:
+        A summary of every round, along with transfer, rate limiter and server statistics
+    """
+    ratelimit.limiter.configure(rate=rate, burst=max(workers, 1), max_in_flight=max_in_flight or workers)
+    ratelimit.limiter.reset_stats()
+    directory = tempfile.mkdtemp()
+    try:
+        config_paths = []
+        for number in range(accounts):
+            config_path = os.path.join(directory, 'user{}.ini'.format(number))
+            with open(config_path, 'w') as config_file:
+                config_file.write(_config_template.format(
+                    number=number, password=server.password, base_url=server.base_url,
+                    session_file=os.path.join(directory, 'user{}.session'.format(number))))
+            config_paths.append(config_path)
+        runner = MultiAccountRunner(config_paths, os.path.join(directory, 'qisbot.db'), max_workers=workers)
+        summaries = []
+        for _ in range(rounds):
+            started_at = time.perf_counter()
+            results = runner.run()
+            summaries.append(summarize(results, time.perf_counter() - started_at))
+        runner.shutdown()
+        return {
+            'rounds': summaries,
+            'transfers': runner.transfer_stats(),
+            'rate_limiter': ratelimit.limiter.stats(),
+            'server': server.stats()
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=100, help='Amount of simulated accounts')
+    parser.add_argument('--workers', type=int, default=8, help='Amount of accounts refreshed concurrently')
+    parser.add_argument('--rounds', type=int, default=3, help='Amount of times every account is refreshed')
+    parser.add_argument('--rate', type=float, help='Requests per second allowed by the rate limiter')
+    parser.add_argument('--max-in-flight', type=int, help='Concurrent requests allowed by the rate limiter')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every response of the server is delayed')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='Maximum deviation from the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of the server responding with 503')
+    parser.add_argument('--exams', type=int, default=30, help='Amount of exams per account')
+    parser.add_argument('--change-interval', type=float, help='Seconds after which another exam gets graded')
+    parser.add_argument('--output', type=str, help='Write the results to this file instead of stdout')
+    parser.add_argument('--verbose', '-v', default=False, action='store_true', help='Log failed refreshes')
+    arguments = parser.parse_args()
+    # Failures are part of the results, logging every single one would drown them
+    logging.basicConfig(level=logging.WARNING if arguments.verbose else logging.CRITICAL)
+    with MockQisServer(latency=arguments.latency, latency_jitter=arguments.latency_jitter,
+                       error_rate=arguments.error_rate, exams_per_account=arguments.exams,
+                       change_interval=arguments.change_interval) as mock_server:
+        load_results = run(arguments.accounts, arguments.workers, arguments.rounds, mock_server, rate=arguments.rate,
+                           max_in_flight=arguments.max_in_flight)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(load_results, output_file, indent=2)
+    else:
+        json.dump(load_results, sys.stdout, indent=2)
+        print()
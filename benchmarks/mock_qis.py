@@ -0,0 +1,269 @@
+"""A local stand-in for a QIS server, serving synthetic exams extracts to any amount of accounts.
+
+Run with: python -m benchmarks.mock_qis [--port 8080] [--latency 0.05] [--error-rate 0.01]
+"""
+import gzip
+import time
+import uuid
+import zlib
+import random
+import typing
+import argparse
+import threading
+import socketserver
+import http.server
+import http.cookies
+import urllib.parse
+
+from qisbot import models
+from benchmarks import synthetic
+
+_base_path = '/qisserver/rds'
+
+_page_template = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"/><title>QIS</title></head>
+<body>
+<div id="wrapper">
+<div class="header">QIS Server</div>
+<div class="navigation">{navigation}</div>
+<div class="loginstatus"><a href="{base}?state=user&amp;type=0">Start</a><a href="{login_action}">{login_text}</a></div>
+<div class="content">{content}</div>
+</div>
+</body>
+</html>
+"""
+_login_form = """<form method="post" action="{base}?state=user&amp;type=1&amp;category=auth.login">
+<input type="text" name="username"/>
+<input type="password" name="password"/>
+<input type="submit" name="submit" value="Anmelden"/>
+</form>"""
+
+
+class MockQisServer(object):
+    """Serves the pages Qis needs to login and reach the exams extract.
+
+    Every account gets its own synthetic exams extract. When change_interval is set, one more
+    of an account's exams gets graded every change_interval seconds, so that refreshes keep
+    finding changes. Requests can be slowed down by a latency and fail at an error rate.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, password: str = 'secret', latency: float = 0.0,
+                 latency_jitter: float = 0.0, error_rate: float = 0.0, exams_per_account: int = 30,
+                 graded_ratio: float = 0.5, change_interval: float = None, compress: bool = True):
+        """Initialize a new instance.
+
+        Args:
+            host: The address to listen on
+            port: The port to listen on. When 0, a free port is picked.
+            password: The password accepted for any username
+            latency: Seconds every response is delayed by
+            latency_jitter: Maximum seconds added to or removed from the latency at random
+            error_rate: Probability of a request being answered with 503 Service Unavailable
+            exams_per_account: Amount of exams in every account's exams extract
+            graded_ratio: Ratio of an account's exams that are graded from the start
+            change_interval: Seconds after which another exam of every account gets graded.
+                When None, exams extracts never change.
+            compress: Compress responses with gzip when the client accepts it
+        """
+        self.password = password
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.exams_per_account = exams_per_account
+        self.graded_ratio = graded_ratio
+        self.change_interval = change_interval
+        self.compress = compress
+        self._started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._sessions = {}  # type: typing.Dict[str, typing.Optional[str]]
+        self._requests = 0
+        self._errors = 0
+        self._logins = 0
+        server = self
+
+        class Handler(_Handler):
+            qis = server
+
+        self._server = _ThreadingHTTPServer((host, port), Handler)
+        self._thread = None  # type: threading.Thread
+
+    def start(self) -> 'MockQisServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-qis', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> ():
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockQisServer':
+        return self.start()
+
+    def __exit__(self, *args) -> ():
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        """The URL to configure as baseUrl of an account."""
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}{}?state=user&type=0'.format(host, port, _base_path)
+
+    def exam_rows(self, username: str) -> typing.List[typing.Tuple[str, ...]]:
+        """Get the current exams extract of an account."""
+        seed = zlib.crc32(username.encode('utf-8'))
+        rows = synthetic.exam_rows(self.exams_per_account, self.graded_ratio, seed=seed)
+        if self.change_interval:
+            ungraded = [index for index, row in enumerate(rows) if not row[models.ExamData.grade.value]]
+            newly_graded = int((time.monotonic() - self._started_at) / self.change_interval)
+            for index in ungraded[:newly_graded]:
+                rows[index] = synthetic.exam_row(index, graded=True)
+        return rows
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return {'requests': self._requests, 'errors': self._errors, 'logins': self._logins,
+                    'sessions': len(self._sessions)}
+
+    def _count(self, error: bool = False) -> ():
+        with self._lock:
+            self._requests += 1
+            self._errors += int(error)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    # Load tests open lots of connections at once
+    request_queue_size = 128
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which Nagle's algorithm would delay until the client's ACK
+    disable_nagle_algorithm = True
+    qis = None  # type: MockQisServer
+
+    def do_GET(self):
+        if not self._prepare():
+            return
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        state = query.get('state', [''])[0]
+        next_page = query.get('next', [''])[0]
+        username = self._username
+        if state == 'user' and query.get('category', [''])[0] == 'auth.logout':
+            with self.qis._lock:
+                self.qis._sessions[self._session_id] = None
+            self._redirect('{}?state=user&type=0'.format(_base_path))
+        elif username is None or state == 'user':
+            self._render_home(username)
+        elif state == 'change':
+            self._render(username, '<a href="{}?state=notenspiegelStudent&amp;next=tree.vm&amp;nextdir='
+                                   'qispos/notenspiegel/student">Notenspiegel</a>'.format(_base_path))
+        elif state == 'notenspiegelStudent' and next_page == 'tree.vm':
+            self._render(username, '<a title="Leistungen anzeigen" href="{}?state=notenspiegelStudent&amp;'
+                                   'next=list.vm&amp;nextdir=qispos/notenspiegel/student">Leistungen</a>'
+                         .format(_base_path))
+        elif state == 'notenspiegelStudent' and next_page == 'list.vm':
+            self._respond(200, synthetic.exams_extract_page(self.qis.exam_rows(username)))
+        else:
+            self._respond(404, '<html><body>Not found</body></html>')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = urllib.parse.parse_qs(self.rfile.read(length).decode('utf-8'))
+        if not self._prepare():
+            return
+        username = form.get('username', [''])[0]
+        if username and form.get('password', [''])[0] == self.qis.password:
+            with self.qis._lock:
+                self.qis._sessions[self._session_id] = username
+                self.qis._logins += 1
+        self._redirect('{}?state=user&type=0'.format(_base_path))
+
+    def _prepare(self) -> bool:
+        """Simulate latency and errors and determine the session. Returns False when the request failed."""
+        delay = self.qis.latency + random.uniform(-self.qis.latency_jitter, self.qis.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+        failed = random.random() < self.qis.error_rate
+        self.qis._count(error=failed)
+        if failed:
+            self._respond(503, '<html><body>Service Unavailable</body></html>')
+            return False
+        cookies = http.cookies.SimpleCookie(self.headers.get('Cookie', ''))
+        self._new_session = 'JSESSIONID' not in cookies
+        with self.qis._lock:
+            if not self._new_session and cookies['JSESSIONID'].value in self.qis._sessions:
+                self._session_id = cookies['JSESSIONID'].value
+            else:
+                self._new_session = True
+                self._session_id = uuid.uuid4().hex.upper()
+                self.qis._sessions[self._session_id] = None
+        return True
+
+    @property
+    def _username(self) -> typing.Optional[str]:
+        with self.qis._lock:
+            return self.qis._sessions.get(self._session_id)
+
+    def _render_home(self, username: typing.Optional[str]) -> ():
+        if username is None:
+            self._render(None, _login_form.format(base=_base_path))
+        else:
+            self._render(username, '<a href="{}?state=change&amp;type=1&amp;moduleParameter=studyPOSMenu">'
+                                   'Prüfungsverwaltung</a>'.format(_base_path))
+
+    def _render(self, username: typing.Optional[str], content: str) -> ():
+        if username is None:
+            login_action, login_text = '{}?state=user&amp;type=0'.format(_base_path), 'Anmelden'
+        else:
+            login_action = '{}?state=user&amp;type=4&amp;category=auth.logout'.format(_base_path)
+            login_text = 'Abmelden'
+        self._respond(200, _page_template.format(base=_base_path, navigation='Navigation', login_action=login_action,
+                                                 login_text=login_text, content=content))
+
+    def _redirect(self, location: str) -> ():
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self._send_session_cookie()
+        self.end_headers()
+
+    def _respond(self, status: int, page: str) -> ():
+        body = page.encode('utf-8')
+        self.send_response(status)
+        if self.qis.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if status != 503:
+            self._send_session_cookie()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_session_cookie(self) -> ():
+        if self._new_session:
+            self.send_header('Set-Cookie', 'JSESSIONID={}; Path=/qisserver; HttpOnly'.format(self._session_id))
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every response is delayed by')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of responding with 503')
+    parser.add_argument('--exams', type=int, default=30, help='Amount of exams per account')
+    parser.add_argument('--change-interval', type=float, help='Seconds after which another exam gets graded')
+    arguments = parser.parse_args()
+    mock_server = MockQisServer(port=arguments.port, latency=arguments.latency, error_rate=arguments.error_rate,
+                                exams_per_account=arguments.exams, change_interval=arguments.change_interval)
+    print('Serving on {} (any username, password "{}")'.format(mock_server.base_url, mock_server.password))
+    with mock_server:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
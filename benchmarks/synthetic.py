@@ -0,0 +1,75 @@
+"""Synthetic exams extracts, shaped like the pages QIS serves."""
+import random
+import typing
+
+from qisbot import models
+
+_semesters = ['WiSe 14/15', 'SoSe 15', 'WiSe 15/16', 'SoSe 16', 'WiSe 16/17', 'SoSe 17']
+_grades = ['1,0', '1,3', '1,7', '2,0', '2,3', '2,7', '3,0', '3,3', '3,7', '4,0', '5,0']
+# Empty cells hold a non-breaking space, just like they do on QIS
+_empty = '\xa0'
+
+_page_template = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"/><title>Notenspiegel</title></head>
+<body>
+<div id="wrapper">
+<div class="abstand_pruefinfo">Notenspiegel</div>
+<form method="post" action="rds?state=notenspiegelStudent&amp;next=list.vm">
+<table><tr><td>Abschluss: Bachelor</td></tr></table>
+<table>
+<tr>{header}</tr>
+{rows}
+</table>
+</form>
+<a href="rds?state=user&amp;type=4&amp;re=last&amp;category=auth.logout">Abmelden</a>
+</div>
+</body>
+</html>
+"""
+_cell_classes = ['tabelle1_alignright', 'tabelle1_alignleft'] + ['tabelle1_aligncenter'] * 11
+
+
+def exam_row(index: int, graded: bool = True) -> typing.Tuple[str, ...]:
+    """Get the ExamData values of a synthetic exam.
+
+    Args:
+        index: Number of the exam, determines its ID and most of its values
+        graded: Whether the exam has a grade already
+    Returns:
+        The values, in the order defined by models.ExamData
+    """
+    values = [str(10000 + index), 'Exam {}'.format(index), '', '', str(index % 3 + 1), '',
+              _semesters[index % len(_semesters)], '{:02d}.02.2017'.format(index % 28 + 1),
+              _grades[index % len(_grades)] if graded else '', '', '5,0',
+              'bestanden' if graded else 'angemeldet', '']
+    return tuple(values)
+
+
+def exam_rows(count: int, graded_ratio: float = 0.8, seed: int = 0) -> typing.List[typing.Tuple[str, ...]]:
+    """Get the values of count synthetic exams, of which roughly graded_ratio are graded."""
+    generator = random.Random(seed)
+    return [exam_row(index, generator.random() < graded_ratio) for index in range(count)]
+
+
+def exams(count: int, graded_ratio: float = 0.8, seed: int = 0) -> typing.List[models.Exam]:
+    """Get count synthetic Exam instances."""
+    return [models.Exam.from_row([value or None for value in row])
+            for row in exam_rows(count, graded_ratio, seed)]
+
+
+def exams_extract_page(rows: typing.Iterable[typing.Sequence[str]]) -> str:
+    """Render an exams extract page.
+
+    Args:
+        rows: The values of every exam, in the order defined by models.ExamData
+    Returns:
+        The page's HTML
+    """
+    header = ''.join('<th class="tabelle1">{}</th>'.format(name) for name in models.ExamData.__members__.keys())
+    rendered_rows = []
+    for row in rows:
+        cells = ''.join('<td class="{}">{}</td>'.format(css_class, value or _empty)
+                        for css_class, value in zip(_cell_classes, row))
+        rendered_rows.append('<tr>{}</tr>'.format(cells))
+    return _page_template.format(header=header, rows='\n'.join(rendered_rows))
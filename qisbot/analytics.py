@@ -0,0 +1,177 @@
+import typing
+
+import numpy
+
+from qisbot import models
+
+# The sums kept per account and semester. They are additive, so that they can be updated
+# by adding the difference a change makes and cohort figures are the sums of all accounts.
+AGGREGATES = ('exams', 'passed', 'failed', 'ects_earned', 'graded_ects', 'weighted_grades')
+# The fields of exams the aggregates depend on
+FIELDS = ('semester', 'grade', 'ects', 'status')
+
+
+class ExamArrays(object):
+    """The values of a set of exams as typed arrays, parsed from their text.
+
+    Missing or unparsable numbers are NaN.
+    """
+
+    def __init__(self, exams: typing.Iterable[models.Exam]):
+        exams = list(exams)
+        self.semesters = numpy.array([exam.semester or '' for exam in exams], dtype=object)
+        self.grades = numpy.array([models.parse_decimal(exam.grade) for exam in exams], dtype=float)
+        self.points = numpy.array([models.parse_decimal(exam.points) for exam in exams], dtype=float)
+        self.ects = numpy.array([models.parse_decimal(exam.ects) for exam in exams], dtype=float)
+        statuses = [(exam.status or '').strip().lower() for exam in exams]
+        self.passed = numpy.array([status == 'bestanden' for status in statuses], dtype=bool)
+        # Includes "endgültig nicht bestanden"
+        self.failed = numpy.array(['nicht bestanden' in status for status in statuses], dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.semesters)
+
+    def semester_sums(self, weights: numpy.ndarray = None) -> typing.Tuple[typing.List[str], numpy.ndarray]:
+        """Sum up the exams of every semester.
+
+        Only passed exams earn ECTS. The grades of passed exams that have ECTS make up the
+        ECTS-weighted grade sum, from which the GPA is derived.
+
+        Args:
+            weights: Factor of every exam's contribution, e.g. -1 to subtract it. When None, every exam counts once.
+        Returns:
+            The semesters and the sums as array of shape (len(AGGREGATES), len(semesters))
+        """
+        if not len(self):
+            return [], numpy.zeros((len(AGGREGATES), 0))
+        weights = numpy.ones(len(self)) if weights is None else weights
+        semesters, index = numpy.unique(self.semesters, return_inverse=True)
+        ects = numpy.nan_to_num(self.ects)
+        graded = self.passed & ~numpy.isnan(self.grades) & (ects > 0)
+        values = numpy.vstack([
+            numpy.ones(len(self)),
+            self.passed,
+            self.failed,
+            numpy.where(self.passed, ects, 0.0),
+            numpy.where(graded, ects, 0.0),
+            numpy.where(graded, numpy.nan_to_num(self.grades) * ects, 0.0)
+        ]) * weights
+        # Adds up the values of every semester's exams for all aggregates at once
+        membership = index == numpy.arange(len(semesters))[:, numpy.newaxis]
+        sums = values.dot(membership.T)
+        return [str(semester) for semester in semesters], sums
+
+    def grade_counts(self, weights: numpy.ndarray = None) -> typing.Dict[float, int]:
+        """Count how often every grade occurs among the exams that have one.
+
+        Args:
+            weights: What every exam counts as, e.g. -1 to subtract it. When None, every exam counts once.
+        """
+        has_grade = ~numpy.isnan(self.grades)
+        weights = numpy.ones(len(self)) if weights is None else weights
+        grades, index = numpy.unique(self.grades[has_grade], return_inverse=True)
+        counts = numpy.bincount(index, weights=weights[has_grade], minlength=len(grades))
+        return {float(grade): int(round(count)) for grade, count in zip(grades, counts)}
+
+
+def aggregate_changes(before: typing.Iterable[models.Exam],
+                      after: typing.Iterable[models.Exam]) -> typing.Tuple[typing.Dict[str, typing.List[float]],
+                                                                             typing.Dict[float, int]]:
+    """Determine how the aggregates of an account change when some of its exams change.
+
+    Args:
+        before: The changed exams as they were persisted, if they were persisted at all
+        after: The new and changed exams with their new values
+    Returns:
+        The difference of AGGREGATES per semester and the difference of every grade's count.
+        Semesters and grades that don't change are left out.
+    """
+    before, after = list(before), list(after)
+    # A single pass over both, with the exams as they were persisted subtracted
+    arrays = ExamArrays(before + after)
+    weights = numpy.concatenate([-numpy.ones(len(before)), numpy.ones(len(after))])
+    semesters, sums = arrays.semester_sums(weights)
+    return ({semester: column.tolist() for semester, column in zip(semesters, sums.T) if numpy.any(column)},
+            {grade: count for grade, count in arrays.grade_counts(weights).items() if count})
+
+
+def _figures(semesters: typing.Sequence[str], sums: numpy.ndarray,
+             grade_counts: typing.Iterable[typing.Tuple[float, int]]) -> typing.Dict[str, typing.Any]:
+    """Derive the figures of a report from aggregates.
+
+    Args:
+        semesters: The semesters the aggregates belong to
+        sums: AGGREGATES per semester, of shape (len(AGGREGATES), len(semesters))
+        grade_counts: Tuples of grade and count
+    """
+    exams, passed, failed, ects_earned, graded_ects, weighted_grades = sums.sum(axis=1)
+    decided = passed + failed
+    order = sorted(range(len(semesters)), key=lambda position: (models.semester_key(semesters[position]) or 0,
+                                                                 semesters[position]))
+    return {
+        'exams': int(exams),
+        'passed': int(passed),
+        'failed': int(failed),
+        'pass_rate': float(passed / decided) if decided else None,
+        'fail_rate': float(failed / decided) if decided else None,
+        'ects_earned': float(ects_earned),
+        'ects_per_semester': [(semesters[position], float(sums[AGGREGATES.index('ects_earned'), position]))
+                              for position in order],
+        'gpa': float(weighted_grades / graded_ects) if graded_ects else None,
+        'grade_distribution': [(grade, count) for grade, count in sorted(grade_counts) if count]
+    }
+
+
+def account_report(db_manager, account: str) -> typing.Dict[str, typing.Any]:
+    """Report the grades of an account, based on its incrementally maintained aggregates.
+
+    Args:
+        db_manager: The persistence.DatabaseManager holding the account's exams
+        account: The account to report on
+    Returns:
+        The amount of exams, passed and failed ones, pass and fail rates (None without decided exams),
+        ECTS earned in total and per semester in chronological order, the ECTS-weighted GPA (None
+        without graded exams) and the grade distribution as tuples of grade and count
+    """
+    rows = db_manager.fetch_aggregates(account=account)
+    semesters = [row[1] for row in rows]
+    sums = numpy.array([row[2:] for row in rows], dtype=float).reshape(-1, len(AGGREGATES)).T
+    grade_counts = [(grade, count) for _, grade, count in db_manager.fetch_grade_counts(account=account)]
+    return _figures(semesters, sums, grade_counts)
+
+
+def cohort_report(db_manager) -> typing.Dict[str, typing.Any]:
+    """Report the grades of all accounts together.
+
+    Args:
+        db_manager: The persistence.DatabaseManager holding the exams of all accounts
+    Returns:
+        The figures of account_report for the exams of all accounts, along with the amount of accounts
+        and the mean, median, best and worst of their GPAs
+    """
+    rows = db_manager.fetch_aggregates()
+    accounts = sorted({row[0] for row in rows})
+    values = numpy.array([row[2:] for row in rows], dtype=float).reshape(-1, len(AGGREGATES))
+    # Semesters of all accounts are summed up, accounts are summed up per account to derive their GPAs
+    semesters, semester_index = numpy.unique(numpy.array([row[1] for row in rows], dtype=str), return_inverse=True)
+    account_index = numpy.searchsorted(numpy.array(accounts, dtype=str), numpy.array([row[0] for row in rows],
+                                                                                     dtype=str))
+    semester_sums = numpy.vstack([numpy.bincount(semester_index, weights=column, minlength=len(semesters))
+                                  for column in values.T])
+    graded_ects = numpy.bincount(account_index, weights=values[:, AGGREGATES.index('graded_ects')],
+                                 minlength=len(accounts))
+    weighted_grades = numpy.bincount(account_index, weights=values[:, AGGREGATES.index('weighted_grades')],
+                                     minlength=len(accounts))
+    gpas = weighted_grades[graded_ects > 0] / graded_ects[graded_ects > 0]
+    grade_counts = {}  # type: typing.Dict[float, int]
+    for _, grade, count in db_manager.fetch_grade_counts():
+        grade_counts[grade] = grade_counts.get(grade, 0) + count
+    report = _figures([str(semester) for semester in semesters], semester_sums, grade_counts.items())
+    report.update({
+        'accounts': len(accounts),
+        'gpa_mean': float(gpas.mean()) if len(gpas) else None,
+        'gpa_median': float(numpy.median(gpas)) if len(gpas) else None,
+        'gpa_best': float(gpas.min()) if len(gpas) else None,
+        'gpa_worst': float(gpas.max()) if len(gpas) else None
+    })
+    return report
@@ -1,77 +1,235 @@
 import functools
-
-import tablib
-import zope.event
+import typing
 
 from qisbot import config
+from qisbot import metrics
 from qisbot import persistence
-from qisbot import qis
-from qisbot import scraper
+from qisbot import ratelimit
 from qisbot import events
+from qisbot import export
 from qisbot import models
 from qisbot import notifies
+from qisbot.lazy import lazy_import
+from qisbot.exceptions import QisNotLoggedInException
+
+# Printing the persisted exams extract needs neither the network nor notifications
+dispatch = lazy_import('qisbot.dispatch')
+qis = lazy_import('qisbot.qis')
+scraper = lazy_import('qisbot.scraper')
+sessions = lazy_import('qisbot.sessions')
+transport = lazy_import('qisbot.transport')
+
+
+def rate_limits(conf: config.QisConfiguration) -> typing.Tuple[typing.Optional[float], typing.Optional[int],
+                                                                 typing.Optional[int]]:
+    """Get the configured rate, burst and max_in_flight of requests to QIS, None for each that is missing."""
+    return conf.rate_limit, conf.rate_burst, conf.max_in_flight
+
+
+def configure_rate_limiter(conf: config.QisConfiguration) -> ():
+    """Apply the configured request limits to the rate limiter shared by all Scrapers of the process.
+
+    Limits missing from the configuration are left as they are. As the limits apply to the whole
+    process, this should only be done once, rather than for every account.
+
+    Args:
+        conf: The configuration to take the limits from
+    """
+    limiter = ratelimit.limiter
+    rate, burst, max_in_flight = rate_limits(conf)
+    if rate is None and burst is None and max_in_flight is None:
+        return
+    limiter.configure(rate=rate if rate is not None else limiter.rate,
+                      burst=burst if burst is not None else limiter.burst,
+                      max_in_flight=max_in_flight if max_in_flight is not None else limiter.max_in_flight)
 
 
 def ensure_login(func):
-    """Make sure to be logged in before performing a given action."""
+    """Make sure to be logged in before performing a given action.
+
+    When the session turns out to be lost while performing the action, it is logged in again
+    and the action is retried once.
+    """
 
     @functools.wraps(func)
     def login(*args, **kwargs):
         bot = args[0]  # type: Bot
         if not isinstance(bot, Bot):
             raise TypeError('@ensure_login only works for Bot instances')
-        if not bot.qis.is_logged_in:
-            bot.qis.login(bot.config.username, bot.config.password)
-        return func(*args, **kwargs)
+        # Logging in counts towards the deadline of the action, too
+        with bot.qis.scraper.deadline(bot.config.refresh_deadline):
+            if not bot.qis.is_logged_in:
+                bot.login()
+            bot.save_session()
+            try:
+                return func(*args, **kwargs)
+            except QisNotLoggedInException:
+                # The session expired since its login state was last checked
+                bot.login()
+                bot.save_session()
+                return func(*args, **kwargs)
 
     return login
 
 
 class Bot(object):
-    def __init__(self, config_path: str, database_path: str):
+    def __init__(self, config_path: str, database_path: str = None,
+                 db_manager: persistence.DatabaseManager = None, dispatcher: 'dispatch.NotificationDispatcher' = None,
+                 http_adapter: 'transport.TunedHTTPAdapter' = None, adopt_unowned_exams: bool = False,
+                 apply_rate_limits: bool = True):
         """Initialize a new Bot instance.
 
         Args:
             config_path: Path to the configuration file to use
             database_path: Path to the database file to use
+            db_manager: A DatabaseManager to use instead of opening database_path.
+                This allows multiple Bot instances to share one database.
+            dispatcher: A NotificationDispatcher to use instead of creating one
+                based on the configuration. This allows multiple Bot instances to share one.
+            http_adapter: An adapter to send requests through instead of creating one based on
+                the configuration. This allows multiple Bot instances to share their connections.
+            adopt_unowned_exams: Assign the exams of databases created before exams were scoped by account
+                to this bot's account. Only the account those exams belong to should do so.
+            apply_rate_limits: Apply the configured request limits to the rate limiter shared by the
+                whole process. When multiple Bot instances share the process, it should be done only once.
         Raises:
             ValueError: When config path or database path were not provided
         """
         if not config_path:
             raise ValueError('config_path must not be None or empty')
-        elif not database_path:
+        elif not database_path and db_manager is None:
             raise ValueError('database_path must not be None or empty')
         self.config = config.QisConfiguration(config_path)
-        self._db_manager = persistence.DatabaseManager(database_path)
-        self._scraper = scraper.Scraper()
-        self.qis = qis.Qis(base_url=self.config.base_url, custom_scraper=self._scraper)
+        self._db_manager = db_manager or persistence.DatabaseManager(database_path)
+        if adopt_unowned_exams:
+            self._db_manager.adopt_unowned_exams(self.account)
+        self._dispatcher = dispatcher
+        if apply_rate_limits:
+            configure_rate_limiter(self.config)
+        self._http_adapter = http_adapter
+        self._scraper = None  # type: scraper.Scraper
+        self._qis = None  # type: qis.Qis
+        self._session_store = None  # type: sessions.SessionStore
+
+    @property
+    def qis(self) -> 'qis.Qis':
+        """The Qis instance of this bot, created along with its session on first use."""
+        if self._qis is None:
+            self._scraper = scraper.Scraper(adapter=self._http_adapter or transport.TunedHTTPAdapter(
+                pool_maxsize=self.config.pool_maxsize))
+            self._scraper.timeout = (self.config.connect_timeout, self.config.read_timeout)
+            self._scraper.retries = self.config.retries
+            if self.config.session_file:
+                self._session_store = sessions.SessionStore(self.config.session_file)
+                if self._session_store.restore(self._scraper.cookies, max_age=self.config.session_max_age):
+                    self._scraper.destinations = self._session_store.destinations
+            self._qis = qis.Qis(base_url=self.config.base_url, custom_scraper=self._scraper,
+                                login_state_ttl=self.config.login_state_ttl)
+        return self._qis
+
+    @property
+    def dispatcher(self) -> 'dispatch.NotificationDispatcher':
+        """The dispatcher of this bot's notifications, created on first use unless one was provided."""
+        if self._dispatcher is None:
+            self._dispatcher = dispatch.NotificationDispatcher(
+                workers=self.config.notify_workers, handler_timeout=self.config.notify_handler_timeout)
+        return self._dispatcher
+
+    def login(self) -> ():
+        """Log in with a fresh session, as whatever session there was is worthless."""
+        del self.qis.scraper.cookies
+        self.qis.login(self.config.username, self.config.password)
+
+    def save_session(self) -> ():
+        """Save the current session, if a session file is configured.
 
+        This should only be called while the session is known to be logged in.
+        """
+        if self._session_store is not None:
+            self._session_store.save(self._scraper.cookies, destinations=self._scraper.destinations)
+
+    @property
+    def account(self) -> str:
+        """The account this bot operates on, used to scope its exams in the database."""
+        return self.config.username
+
+    @metrics.timed('refresh')
     @ensure_login
-    def refresh_exams_extract(self) -> ():
+    def refresh_exams_extract(self) -> typing.List[events.BaseEvent]:
         """Fetch the exams extract from remote.
 
         New exams will be persisted, existing ones will be compared with their
         already-fetched equivalents and changes will be detected.
+
+        When the exams extract didn't change since the last refresh, nothing but its
+        fingerprint is processed.
+
+        Returns:
+            All events that were emitted during the refresh. Their handlers may still be running,
+            see shutdown for waiting until they finished.
         """
-        exams_extract = self.qis.exams_extract
-        for exam in exams_extract:
-            persisted_exam = self._db_manager.fetch_exam(exam.id)
-            if persisted_exam:
-                changes = models.compare_exams(old=persisted_exam, new=exam)
-                if len(changes):
-                    zope.event.notify(
-                        events.ExamChangedEvent(self.config, old_exam=persisted_exam, new_exam=exam, changes=changes))
-                    # Persist the changes
-                    update_changes = {}
-                    for changed_field, values in changes.items():
-                        update_changes[changed_field] = values[1]
-                    self._db_manager.update_exam(exam.id, update_changes)
-                    self._db_manager.commit()
-            else:
-                self._db_manager.persist_exam(exam)
-                zope.event.notify(events.NewExamEvent(self.config, exam))
-
-    def exams_extract_dataset(self, force_refresh=False, omit_empty=False) -> tablib.Dataset:
+        emitted_events = []
+        exams_table = self.qis.fetch_exams_extract_table()
+        fingerprint = scraper.fingerprint(exams_table)
+        if fingerprint == self._db_manager.fetch_extract_fingerprint(self.account):
+            self.save_session()
+            return emitted_events
+        exams_extract = self.qis.map_exams(self.qis.extract_rows(exams_table))
+        # Compare row hashes first, only exams whose hash differs are fetched and diffed field by field
+        persisted_hashes = self._db_manager.fetch_exam_hashes(self.account)
+        with metrics.timer('row_hash'):
+            row_hashes = [exam.row_hash for exam in exams_extract]
+        outdated_ids = [int(exam.id) for exam, row_hash in zip(exams_extract, row_hashes)
+                        if int(exam.id) in persisted_hashes and persisted_hashes[int(exam.id)] != row_hash]
+        persisted_exams = self._db_manager.fetch_exams(self.account, outdated_ids)
+        new_exams = []
+        changed_exams = []
+        exam_changes = []
+        with metrics.timer('diff'):
+            for exam, row_hash in zip(exams_extract, row_hashes):
+                exam_id = int(exam.id)
+                if exam_id not in persisted_hashes:
+                    new_exams.append(exam)
+                    emitted_events.append(events.NewExamEvent(self.config, exam))
+                elif persisted_hashes[exam_id] != row_hash:
+                    persisted_exam = persisted_exams[exam_id]
+                    changes = models.compare_exams(old=persisted_exam, new=exam)
+                    if len(changes):
+                        exam_changes.append((exam_id, changes))
+                        emitted_events.append(events.ExamChangedEvent(self.config, old_exam=persisted_exam,
+                                                                      new_exam=exam, changes=changes))
+                    # Even without changes, the persisted row hash is outdated
+                    changed_exams.append(exam)
+                # Exams listed more than once are compared with their previous occurrence
+                persisted_hashes[exam_id] = row_hash
+                persisted_exams[exam_id] = exam
+        self._db_manager.apply_exam_changes(self.account, new_exams, changed_exams, changes=exam_changes)
+        # Only notify about changes that were actually persisted
+        if emitted_events:
+            notifies.enable(self.config)
+        for event in emitted_events:
+            self.dispatcher.notify(event)
+        if emitted_events:
+            self.dispatcher.notify(events.RefreshCompletedEvent(self.config, list(emitted_events)))
+        self._db_manager.update_extract_fingerprint(self.account, fingerprint)
+        # Keep navigation destinations resolved during the refresh for the next run
+        self.save_session()
+        return emitted_events
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """Wait for pending notifications to be handled and stop notifying.
+
+        Args:
+            timeout: Maximum amount of seconds to wait. Waits indefinitely when None.
+        Returns:
+            True when all notifications were handled, False when the timeout expired first
+        """
+        if self._dispatcher is None:
+            # Nothing was ever notified
+            return True
+        return self._dispatcher.shutdown(timeout)
+
+    def exams_extract_dataset(self, force_refresh=False, omit_empty=False) -> 'tablib.Dataset':
         """Get the exams extract as tabular dataset.
 
         Args:
@@ -82,21 +240,11 @@ class Bot(object):
         """
         if force_refresh:
             self.refresh_exams_extract()
-        exams_extract = self._db_manager.fetch_all_exams()
-        dataset = tablib.Dataset()
-        dataset.headers = [attr_name for attr_name in models.ExamData.__members__.keys()]
-        for exam in exams_extract:
-            row = []
-            for attr_name in models.ExamData.__members__.keys():
-                value = getattr(exam, attr_name) or ''
-                row.append(value)
-            dataset.append(row)
-        if omit_empty:
-            for column_header in dataset.headers:
-                column = dataset[column_header]
-                if not [column_val for column_val in column if column_val]:
-                    del dataset[column_header]
-        return dataset
+        table = export.ColumnarTable(models.ExamData.__members__.keys())
+        for row in self._db_manager.iter_exam_rows(account=self.account):
+            # Rows start with the account
+            table.append(row[1:])
+        return table.to_dataset(omit_empty=omit_empty)
 
     def print_exams_extract(self, force_refresh=False) -> ():
         """Print the exams extract as table to stdout.
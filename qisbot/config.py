@@ -27,6 +27,50 @@ class QisConfiguration(object):
     def password(self) -> typing.Optional[str]:
         return self.parser.get('QIS', 'password')
 
+    @property
+    def session_file(self) -> typing.Optional[str]:
+        return self.parser.get('QIS', 'session_file', fallback=None)
+
+    @property
+    def session_max_age(self) -> float:
+        return self.parser.getfloat('QIS', 'session_max_age', fallback=1800)
+
+    @property
+    def login_state_ttl(self) -> float:
+        return self.parser.getfloat('QIS', 'login_state_ttl', fallback=60)
+
+    @property
+    def connect_timeout(self) -> float:
+        return self.parser.getfloat('QIS', 'connect_timeout', fallback=10)
+
+    @property
+    def read_timeout(self) -> float:
+        return self.parser.getfloat('QIS', 'read_timeout', fallback=30)
+
+    @property
+    def retries(self) -> int:
+        return self.parser.getint('QIS', 'retries', fallback=2)
+
+    @property
+    def refresh_deadline(self) -> float:
+        return self.parser.getfloat('QIS', 'refresh_deadline', fallback=300)
+
+    @property
+    def pool_maxsize(self) -> int:
+        return self.parser.getint('QIS', 'pool_maxsize', fallback=2)
+
+    @property
+    def rate_limit(self) -> typing.Optional[float]:
+        return self.parser.getfloat('QIS', 'rate_limit', fallback=None)
+
+    @property
+    def rate_burst(self) -> typing.Optional[int]:
+        return self.parser.getint('QIS', 'rate_burst', fallback=None)
+
+    @property
+    def max_in_flight(self) -> typing.Optional[int]:
+        return self.parser.getint('QIS', 'max_in_flight', fallback=None)
+
     @property
     def notify_on_new(self) -> bool:
         return self.parser.getboolean('NOTIFICATIONS', 'on_new', fallback=False)
@@ -43,6 +87,14 @@ class QisConfiguration(object):
     def notify_email(self) -> bool:
         return self.parser.getboolean('NOTIFICATIONS', 'email', fallback=False)
 
+    @property
+    def notify_workers(self) -> int:
+        return self.parser.getint('NOTIFICATIONS', 'workers', fallback=1)
+
+    @property
+    def notify_handler_timeout(self) -> float:
+        return self.parser.getfloat('NOTIFICATIONS', 'handler_timeout', fallback=60)
+
     @property
     def email_notify_host(self) -> str:
         return self.parser.get('EMAIL NOTIFY', 'host')
@@ -66,3 +118,44 @@ class QisConfiguration(object):
     @property
     def email_notify_destination(self) -> str:
         return self.parser.get('EMAIL NOTIFY', 'destination')
+
+    @property
+    def email_notify_destinations(self) -> typing.List[str]:
+        return [address.strip() for address in self.email_notify_destination.split(',') if address.strip()]
+
+    @property
+    def email_notify_digest(self) -> bool:
+        return self.parser.getboolean('EMAIL NOTIFY', 'digest', fallback=False)
+
+    @property
+    def daemon_interval(self) -> float:
+        return self.parser.getfloat('DAEMON', 'interval', fallback=900)
+
+    @property
+    def daemon_season_interval(self) -> float:
+        return self.parser.getfloat('DAEMON', 'season_interval', fallback=300)
+
+    @property
+    def daemon_season_months(self) -> typing.List[int]:
+        months = self.parser.get('DAEMON', 'season_months', fallback='2,3,4,7,8,9')
+        return [int(month) for month in months.split(',') if month.strip()]
+
+    @property
+    def daemon_min_interval(self) -> float:
+        return self.parser.getfloat('DAEMON', 'min_interval', fallback=120)
+
+    @property
+    def daemon_max_interval(self) -> float:
+        return self.parser.getfloat('DAEMON', 'max_interval', fallback=21600)
+
+    @property
+    def daemon_change_window(self) -> float:
+        return self.parser.getfloat('DAEMON', 'change_window', fallback=3600)
+
+    @property
+    def daemon_backoff(self) -> float:
+        return self.parser.getfloat('DAEMON', 'backoff', fallback=1.5)
+
+    @property
+    def daemon_jitter(self) -> float:
+        return self.parser.getfloat('DAEMON', 'jitter', fallback=0.1)
@@ -0,0 +1,180 @@
+import math
+import time
+import random
+import typing
+import logging
+import threading
+
+from qisbot import config
+from qisbot import runner
+
+
+class AdaptiveScheduler(object):
+    """Decides how long to wait before refreshing an account's exams extract again.
+
+    The interval depends on how likely new results are:
+        - Right after a change, more are likely to follow, so min_interval is used.
+        - During exam-result season, season_interval is used.
+        - Otherwise interval is used.
+    Every refresh that doesn't change anything (or fails) stretches the interval by backoff,
+    up to interval during season and max_interval outside of it. A random jitter is applied
+    on top, so that many accounts don't hit QIS at the same instant.
+    """
+
+    def __init__(self, interval: float = 900, season_interval: float = 300, season_months: typing.List[int] = None,
+                 min_interval: float = 120, max_interval: float = 21600, change_window: float = 3600,
+                 backoff: float = 1.5, jitter: float = 0.1):
+        """Initialize a new instance.
+
+        Args:
+            interval: Seconds between refreshes outside of exam-result season
+            season_interval: Seconds between refreshes during exam-result season
+            season_months: Months (1-12) of the exam-result season
+            min_interval: Seconds between refreshes right after a change, and the lower bound of all delays
+            max_interval: Upper bound of all delays
+            change_window: Seconds after a change during which min_interval is used
+            backoff: Factor the interval grows by with every refresh that didn't change anything
+            jitter: Maximum deviation from the interval, as a fraction of it
+        Raises:
+            ValueError: When the intervals are not positive or contradict each other
+        """
+        if min(interval, season_interval, min_interval) <= 0:
+            raise ValueError('Intervals must be positive')
+        elif not min_interval <= min(interval, season_interval) or max(interval, season_interval) > max_interval:
+            raise ValueError('Intervals must lie between min_interval and max_interval')
+        elif backoff < 1:
+            raise ValueError('backoff must be at least 1')
+        elif not 0 <= jitter < 1:
+            raise ValueError('jitter must be at least 0 and less than 1')
+        self.interval = interval
+        self.season_interval = season_interval
+        self.season_months = set(season_months if season_months is not None else (2, 3, 4, 7, 8, 9))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_window = change_window
+        self.backoff = backoff
+        self.jitter = jitter
+        self.quiet_refreshes = 0
+        self.last_change_at = None  # type: float
+
+    @staticmethod
+    def from_config(conf: config.QisConfiguration) -> 'AdaptiveScheduler':
+        """Create a scheduler from the [DAEMON] section of a configuration."""
+        return AdaptiveScheduler(interval=conf.daemon_interval, season_interval=conf.daemon_season_interval,
+                                 season_months=conf.daemon_season_months, min_interval=conf.daemon_min_interval,
+                                 max_interval=conf.daemon_max_interval, change_window=conf.daemon_change_window,
+                                 backoff=conf.daemon_backoff, jitter=conf.daemon_jitter)
+
+    def record(self, changed: bool, now: float = None) -> ():
+        """Record the outcome of a refresh.
+
+        Args:
+            changed: Whether the refresh detected new or changed exams. Failed refreshes didn't.
+            now: Time (as returned by time.time) of the refresh. When None, the current time is used.
+        """
+        if changed:
+            self.quiet_refreshes = 0
+            self.last_change_at = time.time() if now is None else now
+        else:
+            self.quiet_refreshes += 1
+
+    def in_season(self, now: float = None) -> bool:
+        return time.localtime(now).tm_mon in self.season_months
+
+    def next_delay(self, now: float = None) -> float:
+        """Determine the seconds to wait until the next refresh.
+
+        Args:
+            now: The current time (as returned by time.time). When None, the current time is used.
+        Returns:
+            The delay in seconds, jitter included
+        """
+        now = time.time() if now is None else now
+        if self.last_change_at is not None and now - self.last_change_at < self.change_window:
+            delay = self.min_interval
+        else:
+            in_season = self.in_season(now)
+            delay = self.season_interval if in_season else self.interval
+            ceiling = self.interval if in_season else self.max_interval
+            ceiling = max(delay, ceiling)
+            # Backing off any further than to the ceiling doesn't change anything, but would overflow eventually
+            backoffs = self.quiet_refreshes
+            if self.backoff > 1:
+                backoffs = min(backoffs, math.ceil(math.log(ceiling / delay, self.backoff)))
+            delay = min(delay * self.backoff ** backoffs, ceiling)
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return min(max(delay, self.min_interval), self.max_interval)
+
+    def __repr__(self) -> str:
+        return '<{}(quiet_refreshes={}, last_change_at={})>'.format(self.__class__.__name__, self.quiet_refreshes,
+                                                                   self.last_change_at)
+
+
+class Daemon(object):
+    """Keeps refreshing the exams extracts of all accounts of a MultiAccountRunner, each on its own schedule.
+
+    Bots, their sessions and the database connection live as long as the daemon does,
+    so that startup and login costs are only paid once. The first refresh of every account
+    happens at a random point within its first interval and every later one is scheduled
+    from the time the account's own refresh finished, so that accounts stay spread out.
+    """
+
+    def __init__(self, account_runner: runner.MultiAccountRunner,
+                 schedulers: typing.Dict[str, AdaptiveScheduler] = None):
+        """Initialize a new instance.
+
+        Args:
+            account_runner: The runner to refresh the accounts with
+            schedulers: The scheduler of each config path. When None, they are created from
+                the [DAEMON] section of each account's configuration.
+        Raises:
+            ValueError: When no runner was provided
+        """
+        if account_runner is None:
+            raise ValueError('account_runner must not be None')
+        self.runner = account_runner
+        if schedulers is None:
+            schedulers = {config_path: AdaptiveScheduler.from_config(config.QisConfiguration(config_path))
+                          for config_path in account_runner.config_paths}
+        self.schedulers = schedulers
+        started_at = time.time()
+        self._due_at = {config_path: started_at + random.uniform(0, schedulers[config_path].next_delay(started_at))
+                        for config_path in account_runner.config_paths}
+        self._stop = threading.Event()
+
+    def run_once(self, now: float = None) -> typing.List[runner.AccountResult]:
+        """Refresh all accounts that are due and schedule their next refresh.
+
+        Args:
+            now: The current time (as returned by time.time). When None, the current time is used.
+        Returns:
+            The results of the refreshed accounts
+        """
+        now = time.time() if now is None else now
+        due = [config_path for config_path, due_at in self._due_at.items() if due_at <= now]
+        if not due:
+            return []
+        results = self.runner.run(due)
+        for result in results:
+            scheduler = self.schedulers[result.config_path]
+            scheduler.record(bool(result.events), now=result.finished_at)
+            delay = scheduler.next_delay(result.finished_at)
+            self._due_at[result.config_path] = result.finished_at + delay
+            logging.info('Refreshing {} again in {:.0f} seconds'.format(result.account or result.config_path, delay))
+        return results
+
+    def run_forever(self) -> ():
+        """Refresh accounts whenever they are due, until stop is called."""
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(max(self.next_due_at - time.time(), 0))
+        self.runner.shutdown()
+
+    def stop(self) -> ():
+        """Make run_forever return after the current refresh. Safe to call from signal handlers."""
+        self._stop.set()
+
+    @property
+    def next_due_at(self) -> float:
+        """Time (as returned by time.time) the next account is due."""
+        return min(self._due_at.values())
@@ -0,0 +1,229 @@
+import time
+import queue
+import typing
+import logging
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+
+import zope.event
+import zope.event.classhandler
+
+from qisbot import events
+from qisbot import metrics
+
+# Put into the queue once per worker to make it stop
+_stop = object()
+
+
+def handlers_for(event: events.BaseEvent) -> typing.List[typing.Callable[[events.BaseEvent], typing.Any]]:
+    """Determine all handlers zope.event would call for a given event, in the same order.
+
+    Handlers registered via zope.event.classhandler are resolved individually, so that
+    each of them can be run (and timed out) on its own.
+
+    Args:
+        event: The event to determine the handlers for
+    Returns:
+        A list of all handlers
+    """
+    handlers = []
+    for subscriber in zope.event.subscribers:
+        if subscriber is zope.event.classhandler.dispatch:
+            for event_class in event.__class__.__mro__:
+                handlers.extend(zope.event.classhandler.registry.get(event_class, ()))
+        else:
+            handlers.append(subscriber)
+    return handlers
+
+
+class _HandlerThread(object):
+    """A daemon thread running the handlers submitted to it one at a time, so that it can be reused.
+
+    Unlike the threads of a ThreadPoolExecutor, it doesn't keep the interpreter from exiting
+    while a handler hangs.
+    """
+
+    def __init__(self, name: str):
+        self._tasks = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, func: typing.Callable[[], typing.Any]) -> Future:
+        """Run a function after all functions submitted before.
+
+        Returns:
+            The future of the function's result
+        """
+        future = Future()
+        self._tasks.put((func, future))
+        return future
+
+    def stop(self) -> ():
+        """Make the thread exit once it ran all functions submitted before."""
+        self._tasks.put(None)
+
+    def _run(self) -> ():
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            func, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func())
+            except BaseException as ex:
+                future.set_exception(ex)
+
+
+class NotificationDispatcher(object):
+    """Runs event handlers on background workers, so that notifying doesn't block the caller.
+
+    Every worker runs its handlers on a thread of its own, which is reused from handler to handler.
+    A handler that exceeds the timeout is abandoned: its thread continues in the background until
+    the handler returns, while the worker moves on with a new thread. At most max_abandoned handlers
+    are abandoned at a time, while that many still run, further handlers are skipped.
+    """
+
+    def __init__(self, workers: int = 1, handler_timeout: float = 60.0, max_abandoned: int = 4):
+        """Initialize a new instance and start its workers.
+
+        Args:
+            workers: Amount of events handled at the same time. When 0, events are
+                handled synchronously by notify, just like zope.event.notify does.
+            handler_timeout: Seconds a single handler may take to handle an event
+            max_abandoned: Maximum amount of handlers that exceeded the timeout and still run
+        Raises:
+            ValueError: When workers is negative or handler_timeout or max_abandoned is not positive
+        """
+        if workers < 0:
+            raise ValueError('workers must not be negative')
+        elif handler_timeout <= 0:
+            raise ValueError('handler_timeout must be positive')
+        elif max_abandoned < 1:
+            raise ValueError('max_abandoned must be at least 1')
+        self.handler_timeout = handler_timeout
+        self.max_abandoned = max_abandoned
+        self._abandoned = []  # type: typing.List[_HandlerThread]
+        self._abandoned_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._workers = []  # type: typing.List[threading.Thread]
+        for number in range(workers):
+            worker = threading.Thread(target=self._work, name='qisbot-notify-{}'.format(number), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def notify(self, event: events.BaseEvent) -> ():
+        """Queue an event to be handled by all of its handlers.
+
+        Args:
+            event: The event to notify about
+        Raises:
+            RuntimeError: When the dispatcher was shut down
+        """
+        if not self._workers:
+            with metrics.timer('notify'):
+                zope.event.notify(event)
+            return
+        if not any(worker.is_alive() for worker in self._workers):
+            raise RuntimeError('Cannot notify after the dispatcher was shut down')
+        self._queue.put(event)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until all queued events were handled.
+
+        Args:
+            timeout: Maximum amount of seconds to wait. Waits indefinitely when None.
+        Returns:
+            True when all events were handled, False when the timeout expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """Handle all queued events and stop the workers.
+
+        Args:
+            timeout: Maximum amount of seconds to wait for queued events to be handled.
+                Waits indefinitely when None.
+        Returns:
+            True when all events were handled, False when the timeout expired first
+        """
+        for _ in self._workers:
+            self._queue.put(_stop)
+        drained = self.wait(timeout)
+        for worker in self._workers:
+            worker.join(0 if not drained else None)
+        return drained
+
+    @property
+    def pending(self) -> int:
+        """Amount of events that are queued or currently being handled."""
+        return self._queue.unfinished_tasks
+
+    @property
+    def abandoned(self) -> int:
+        """Amount of handlers that exceeded the timeout and still run."""
+        with self._abandoned_lock:
+            self._abandoned = [handler_thread for handler_thread in self._abandoned if handler_thread.thread.is_alive()]
+            return len(self._abandoned)
+
+    def _work(self) -> ():
+        """Handle queued events until told to stop."""
+        handler_thread = _HandlerThread('{}-handler'.format(threading.current_thread().name))
+        try:
+            while True:
+                event = self._queue.get()
+                try:
+                    if event is _stop:
+                        return
+                    for handler in handlers_for(event):
+                        handler_thread = self._run_handler(handler_thread, handler, event)
+                finally:
+                    self._queue.task_done()
+        finally:
+            handler_thread.stop()
+
+    def _run_handler(self, handler_thread: _HandlerThread, handler: typing.Callable[[events.BaseEvent], typing.Any],
+                     event: events.BaseEvent) -> _HandlerThread:
+        """Run a single handler, giving up on it after handler_timeout seconds.
+
+        Args:
+            handler_thread: The thread to run the handler on
+            handler: The handler to run
+            event: The event to handle
+        Returns:
+            The thread to run the next handler on, which is a new one when the handler was abandoned
+        """
+        abandoned = self.abandoned
+        if abandoned >= self.max_abandoned:
+            logging.error('Skipped handler {} for {}, {} abandoned handlers are still running'.format(
+                handler, event, abandoned))
+            return handler_thread
+
+        def run():
+            with metrics.timer('notify.{}'.format(getattr(handler, '__name__', handler.__class__.__name__))):
+                handler(event)
+
+        future = handler_thread.submit(run)
+        try:
+            future.result(self.handler_timeout)
+        except TimeoutError:
+            logging.error('Handler {} did not handle {} within {} seconds'.format(handler, event,
+                                                                                  self.handler_timeout))
+            # The thread exits once the handler returns, the worker continues on a new one
+            handler_thread.stop()
+            with self._abandoned_lock:
+                self._abandoned.append(handler_thread)
+            return _HandlerThread(handler_thread.thread.name)
+        except BaseException as ex:
+            # The worker has to survive whatever a handler raises, including qisbot's own exceptions
+            logging.error('Handler {} failed to handle {}: {}'.format(handler, event, ex))
+        return handler_thread
@@ -51,3 +51,17 @@ class ExamChangedEvent(BaseEvent):
         self.old_exam = old_exam
         self.new_exam = new_exam
         self.changes = changes
+
+
+class RefreshCompletedEvent(BaseEvent):
+    """Event that notifies about a refresh that detected new or changed Exams."""
+
+    def __init__(self, configuration: config.QisConfiguration, exam_events: typing.List[BaseEvent]):
+        """Initialize a new instance.
+
+        Args:
+            configuration: An instance of the application's configuration
+            exam_events: All NewExamEvents and ExamChangedEvents of the refresh, in the order they were emitted
+        """
+        super().__init__(configuration)
+        self.exam_events = exam_events
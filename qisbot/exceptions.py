@@ -28,3 +28,13 @@ class UnexpectedStateException(BaseException):
 class PersistenceException(IOError):
     """Raised when a database related process or action failed."""
     pass
+
+
+class DeadlineExceededException(ScraperException):
+    """Raised when a request could not be completed before the deadline of the operation it is part of."""
+    pass
+
+
+class CircuitOpenException(ScraperException):
+    """Raised instead of sending a request to a host that is considered to be down."""
+    pass
@@ -0,0 +1,177 @@
+import csv
+import json
+import typing
+
+from qisbot import models
+from qisbot import metrics
+from qisbot import persistence
+from qisbot.lazy import lazy_import
+
+# Only needed to build datasets, streaming exports don't
+tablib = lazy_import('tablib')
+
+FORMATS = ('csv', 'ndjson', 'table')
+# Every exported row starts with the account, followed by the exam's values
+COLUMNS = ['account'] + list(models.ExamData.__members__.keys())
+
+
+class ColumnarTable(object):
+    """Builds a table column by column from rows, in a single pass over them.
+
+    A column's values are only stored once its first value arrives. Columns that stay
+    empty never take up memory and can be left out without looking at any row again.
+    """
+
+    def __init__(self, columns: typing.Iterable[str]):
+        """Initialize a new, empty instance.
+
+        Args:
+            columns: Names of the columns
+        """
+        self.columns = list(columns)
+        self.row_count = 0
+        self._values = [None] * len(self.columns)  # type: typing.List[typing.Optional[typing.List[str]]]
+
+    def append(self, row: typing.Sequence) -> ():
+        """Append a row. Values are stored as strings, None and other false values as empty strings.
+
+        Args:
+            row: The values, in the order of the columns
+        Raises:
+            ValueError: When the amount of values doesn't match the amount of columns
+        """
+        if len(row) != len(self.columns):
+            raise ValueError('Unexpected amount of values (Expected {}, got {})'.format(len(self.columns), len(row)))
+        for index, value in enumerate(row):
+            values = self._values[index]
+            if value:
+                if values is None:
+                    # The first value of the column, all rows before were empty
+                    values = self._values[index] = [''] * self.row_count
+                values.append(str(value))
+            elif values is not None:
+                values.append('')
+        self.row_count += 1
+
+    @property
+    def empty_columns(self) -> typing.List[str]:
+        """Names of the columns that don't have any values."""
+        return [name for name, values in zip(self.columns, self._values) if values is None]
+
+    def to_dataset(self, omit_empty: bool = False) -> 'tablib.Dataset':
+        """Get the table as tabular dataset.
+
+        Args:
+            omit_empty: Leave out columns that don't have any values
+        Returns:
+            The resulting dataset
+        """
+        headers, columns = [], []
+        for name, values in zip(self.columns, self._values):
+            if values is None:
+                if omit_empty:
+                    continue
+                values = [''] * self.row_count
+            headers.append(name)
+            columns.append(values)
+        dataset = tablib.Dataset(*zip(*columns))
+        dataset.headers = headers
+        return dataset
+
+
+def write_csv(rows: typing.Iterable[typing.Sequence], output: typing.TextIO,
+              columns: typing.Sequence[str] = COLUMNS) -> int:
+    """Write rows as CSV with a header line, one row at a time.
+
+    Args:
+        rows: The rows to write, with values in the order of columns
+        output: Text stream to write to. Should be opened with newline='' when it's a file.
+        columns: Names of the columns
+    Returns:
+        The amount of rows written
+    """
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_ndjson(rows: typing.Iterable[typing.Sequence], output: typing.TextIO,
+                 columns: typing.Sequence[str] = COLUMNS) -> int:
+    """Write rows as newline delimited JSON, one object keyed by column name per line.
+
+    Args:
+        rows: The rows to write, with values in the order of columns
+        output: Text stream to write to
+        columns: Names of the columns
+    Returns:
+        The amount of rows written
+    """
+    count = 0
+    for row in rows:
+        output.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        output.write('\n')
+        count += 1
+    return count
+
+
+def write_table(rows: typing.Iterable[typing.Sequence], output: typing.TextIO, widths: typing.Sequence[int],
+                columns: typing.Sequence[str] = COLUMNS) -> int:
+    """Write rows as table with fixed-width columns, one row at a time.
+
+    As the rows are only seen once, the widths of the columns have to be known in advance.
+
+    Args:
+        rows: The rows to write, with values in the order of columns
+        output: Text stream to write to
+        widths: Length of the longest value of every column. Columns are at least as wide as their name.
+        columns: Names of the columns
+    Returns:
+        The amount of rows written
+    """
+    widths = [max(width, len(column)) for column, width in zip(columns, widths)]
+
+    def write_line(values: typing.Iterable[str]) -> ():
+        output.write('  '.join(value.ljust(width) for value, width in zip(values, widths)).rstrip())
+        output.write('\n')
+
+    write_line(columns)
+    write_line('-' * width for width in widths)
+    count = 0
+    for row in rows:
+        write_line('' if value is None else str(value) for value in row)
+        count += 1
+    return count
+
+
+@metrics.timed('export')
+def export(db_manager: persistence.DatabaseManager, output: typing.TextIO, export_format: str = 'csv',
+           account: str = None, semester: str = None, status: str = None) -> int:
+    """Export exams from the database, streaming them from the database to the output.
+
+    Memory use doesn't depend on the amount of exams: they are read in batches and written one at a time.
+
+    Args:
+        db_manager: The database to export from
+        output: Text stream to write to
+        export_format: One of FORMATS
+        account: Only export the exams of this account. When None, the exams of all accounts are exported.
+        semester: Only export the exams of this semester
+        status: Only export the exams with this status
+    Returns:
+        The amount of exported exams
+    Raises:
+        ValueError: When the format is not supported
+    """
+    if export_format not in FORMATS:
+        raise ValueError('Unsupported export format {!r}, expected one of {}'.format(export_format, FORMATS))
+    rows = db_manager.iter_exam_rows(account=account, semester=semester, status=status)
+    if export_format == 'csv':
+        return write_csv(rows, output)
+    elif export_format == 'ndjson':
+        return write_ndjson(rows, output)
+    widths = db_manager.fetch_column_widths(account=account, semester=semester, status=status)
+    return write_table(rows, output, [widths[column] for column in COLUMNS])
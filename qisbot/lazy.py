@@ -0,0 +1,40 @@
+import types
+import importlib
+
+
+class LazyModule(object):
+    """Stands in for a module until one of its attributes is accessed, which imports the module.
+
+    Imports go through importlib.import_module, so threads accessing a module that is being
+    imported wait until it's completely initialized. Attributes are always looked up on the
+    module itself, so that patching them works as usual.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None  # type: types.ModuleType
+
+    def __getattr__(self, attribute: str):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        return '<{} {!r} ({})>'.format(self.__class__.__name__, self._name,
+                                       'imported' if self._module is not None else 'not imported yet')
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Import a module once one of its attributes is accessed for the first time.
+
+    This keeps modules that are only needed by some command paths, like requests and lxml,
+    from slowing down the startup of all the others. Annotations that are evaluated at
+    definition time count as an access, so they should refer to lazily imported modules as strings.
+
+    Args:
+        name: Absolute name of the module
+    Returns:
+        A stand-in for the module
+    """
+    return LazyModule(name)
@@ -0,0 +1,174 @@
+import json
+import time
+import bisect
+import typing
+import functools
+import threading
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in seconds, from fast SQLite queries to slow logins
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(object):
+    """Counts observed durations in buckets, along with their count, sum and maximum."""
+
+    def __init__(self, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        """Initialize a new instance.
+
+        Args:
+            buckets: Upper bounds of the buckets in ascending order. A bucket for everything above is added implicitly.
+        Raises:
+            ValueError: When no buckets were provided or they're not in ascending order
+        """
+        if not buckets:
+            raise ValueError('buckets must not be None or empty')
+        elif list(buckets) != sorted(buckets):
+            raise ValueError('buckets must be in ascending order')
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> ():
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def cumulative_counts(self) -> typing.List[typing.Tuple[float, int]]:
+        """Get the amount of observations less than or equal to each bucket's upper bound, ending with infinity."""
+        with self._lock:
+            counts = list(self._counts)
+        cumulative, total = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def quantile(self, fraction: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls into (the maximum for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        for bound, count in self.cumulative_counts():
+            if count >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def __repr__(self) -> str:
+        return '<{}(count={}, sum={:.6f})>'.format(self.__class__.__name__, self.count, self.sum)
+
+
+class MetricsRegistry(object):
+    """Collects the durations of the phases of a refresh, one histogram per phase."""
+
+    def __init__(self, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._histograms = {}  # type: typing.Dict[str, Histogram]
+
+    def observe(self, phase: str, seconds: float) -> ():
+        """Record the duration of a phase.
+
+        Args:
+            phase: Name of the phase, e.g. "fetch" or "database.apply_exam_changes"
+            seconds: The duration
+        """
+        if not self.enabled:
+            return
+        histogram = self._histograms.get(phase)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(phase, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, phase: str):
+        """Record the duration of the code in a context, whether or not it raises."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started_at)
+
+    def timed(self, phase: str):
+        """Decorate a function to record the duration of every call."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started_at = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(phase, time.perf_counter() - started_at)
+
+            return wrapper
+
+        return decorator
+
+    def histograms(self) -> typing.Dict[str, Histogram]:
+        with self._lock:
+            return dict(self._histograms)
+
+    def reset(self) -> ():
+        with self._lock:
+            self._histograms = {}
+
+    def to_dict(self) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        """Get all histograms as plain data, keyed by phase."""
+        return {
+            phase: {
+                'count': histogram.count,
+                'sum': histogram.sum,
+                'mean': histogram.mean,
+                'max': histogram.max,
+                'p50': histogram.quantile(0.5),
+                'p90': histogram.quantile(0.9),
+                'p99': histogram.quantile(0.99),
+                'buckets': [['+Inf' if bound == float('inf') else bound, count]
+                            for bound, count in histogram.cumulative_counts()]
+            } for phase, histogram in sorted(self.histograms().items())
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, name: str = 'qisbot_phase_duration_seconds') -> str:
+        """Export all histograms in the Prometheus text exposition format."""
+        lines = ['# HELP {} Time spent in the phases of refreshing exams extracts'.format(name),
+                 '# TYPE {} histogram'.format(name)]
+        for phase, histogram in sorted(self.histograms().items()):
+            label = phase.replace('\\', '\\\\').replace('"', '\\"')
+            for bound, count in histogram.cumulative_counts():
+                lines.append('{}_bucket{{phase="{}",le="{}"}} {}'.format(
+                    name, label, '+Inf' if bound == float('inf') else repr(bound), count))
+            lines.append('{}_sum{{phase="{}"}} {}'.format(name, label, repr(histogram.sum)))
+            lines.append('{}_count{{phase="{}"}} {}'.format(name, label, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def breakdown(self) -> str:
+        """Describe where the time went as a table, slowest phases first."""
+        rows = [('phase', 'count', 'total ms', 'mean ms', 'p90 ms', 'max ms')]
+        for phase, histogram in sorted(self.histograms().items(), key=lambda item: -item[1].sum):
+            rows.append((phase, str(histogram.count), '{:.2f}'.format(histogram.sum * 1e3),
+                         '{:.3f}'.format(histogram.mean * 1e3), '{:.3f}'.format(histogram.quantile(0.9) * 1e3),
+                         '{:.3f}'.format(histogram.max * 1e3)))
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        return '\n'.join('  '.join(value.ljust(widths[0]) if column == 0 else value.rjust(widths[column])
+                                   for column, value in enumerate(row)) for row in rows)
+
+
+# Shared by all instrumented code of the process
+registry = MetricsRegistry()
+timer = registry.timer
+timed = registry.timed
@@ -1,7 +1,15 @@
+import re
 import enum
 import typing
+import hashlib
+import collections
 
-from lxml import html
+from qisbot import metrics
+from qisbot.lazy import lazy_import
+
+# Only needed to map exams from HTML, which reading them from the database doesn't
+html = lazy_import('lxml.html')
+scraper = lazy_import('qisbot.scraper')
 
 
 class ExamData(enum.Enum):
@@ -23,6 +31,13 @@ class ExamData(enum.Enum):
 
 
 class Exam(object):
+    """A single exam, holding the data defined in ExamData.
+
+    Instances have no __dict__, their fields are stored in slots in the order of ExamData.
+    """
+
+    __slots__ = tuple(ExamData.__members__.keys())
+
     def __init__(self):
         self.id = None  # type: str
         self.name = None  # type: str
@@ -38,25 +53,47 @@ class Exam(object):
         self.status = None  # type: str
         self.recognized = None  # type: str
 
+    @classmethod
+    def from_row(cls, row: typing.Sequence[typing.Optional[str]]) -> 'Exam':
+        """Create an Exam from a sequence of values in the order of ExamData.
+
+        Values are taken as they are, no conversion is performed.
+
+        Args:
+            row: The values
+        Returns:
+            The resulting Exam instance
+        """
+        exam = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, row):
+            setattr(exam, name, value)
+        return exam
+
+    def to_row(self) -> typing.Tuple[typing.Optional[str], ...]:
+        """Get all values in the order of ExamData."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @property
+    def row_hash(self) -> str:
+        """A stable hash of all values, used to detect changes without comparing every field."""
+        normalized_values = '\x1f'.join((value or '').strip() for value in self.to_row())
+        return hashlib.sha1(normalized_values.encode('utf-8')).hexdigest()
+
     @property
     def attributes(self) -> typing.Dict[str, typing.Any]:
         """Get a dictionary of all attributes.
 
         The keys of the dictionary are a lowercase representation of
-        the ExamData enum's member names.
+        the ExamData enum's member names, in the order of ExamData.
         """
-        attrs = {}
-        for attr in dir(self):
-            if attr.startswith('__') or attr == 'attributes':
-                continue
-            attrs[attr] = getattr(self, attr)
-        return attrs
+        return collections.OrderedDict(zip(self.__slots__, self.to_row()))
 
     def __repr__(self):
         return '<{} ({})>'.format(self.__class__.__name__, self.attributes)
 
 
-def map_to_exam(source: typing.Union[html.HtmlElement, typing.Tuple[str]]) -> Exam:
+@metrics.timed('map_to_exam')
+def map_to_exam(source: typing.Union['html.HtmlElement', typing.Tuple[str]]) -> Exam:
     """Map a given source to an equivalent Exam instance.
 
     Args:
@@ -69,8 +106,8 @@ def map_to_exam(source: typing.Union[html.HtmlElement, typing.Tuple[str]]) -> Ex
         TypeError: When source has an unsupported type
     """
 
-    def map_from_html(table_row: html.HtmlElement) -> Exam:
-        row_cells = table_row.xpath('.//td')
+    def map_from_html(table_row: 'html.HtmlElement') -> Exam:
+        row_cells = scraper.Scraper.compile('.//td')(table_row)
         if len(row_cells) != len(ExamData.__members__):
             raise ValueError(
                 'Unexpected amount of cells (Expected {}, got {})'.format(len(ExamData.__members__), len(row_cells)))
@@ -88,16 +125,13 @@ def map_to_exam(source: typing.Union[html.HtmlElement, typing.Tuple[str]]) -> Ex
         if len(query_result) != len(ExamData.__members__):
             raise ValueError('Unexpected amount of colums (Expected {}, got {})'.format(len(query_result),
                                                                                         len(ExamData.__members__)))
-        exam = Exam()
-        for name, member in ExamData.__members__.items():
-            attribute_value = query_result[member.value]
-            setattr(exam, name, str(attribute_value) if attribute_value else None)
-        return exam
+        return Exam.from_row([str(value) if value else None for value in query_result])
 
-    if isinstance(source, html.HtmlElement):
-        return map_from_html(source)
-    elif isinstance(source, (tuple, list)):
+    # Checked first, so that mapping database rows doesn't import lxml
+    if isinstance(source, (tuple, list)):
         return map_from_sql(source)
+    elif isinstance(source, html.HtmlElement):
+        return map_from_html(source)
     else:
         raise TypeError('Cannot map Exam from type {}'.format(str(type(source))))
 
@@ -118,3 +152,67 @@ def compare_exams(old: Exam, new: Exam) -> typing.Dict[str, typing.Tuple[str, st
         if new_val != old_val:
             changes[attr_name] = (old_val, new_val)
     return changes
+
+
+# E.g. "SoSe 17", "WiSe 16/17", "SS 2017" or "WS 2016/17"
+_semester_pattern = re.compile(r'^\s*(SoSe|SS|WiSe|WS)\s*(\d{2}|\d{4})\b', re.IGNORECASE)
+# E.g. "24.07.2017" or "24.07.17"
+_date_pattern = re.compile(r'^\s*(\d{1,2})\.(\d{1,2})\.(\d{2}|\d{4})\s*$')
+
+
+def parse_decimal(value: typing.Optional[str]) -> typing.Optional[float]:
+    """Parse a number formatted the way QIS does, e.g. "1,7" or "1.234,5".
+
+    Values without a comma are parsed as they are, e.g. "5" or "2.5".
+
+    Args:
+        value: The value to parse
+    Returns:
+        The number or None when the value is empty or not a number
+    """
+    if not value:
+        return None
+    text = value.strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def semester_key(value: typing.Optional[str]) -> typing.Optional[int]:
+    """Get a key that sorts semesters chronologically, e.g. 20171 for "SoSe 17" and 20172 for "WiSe 17/18".
+
+    Args:
+        value: The semester as shown by QIS
+    Returns:
+        The key or None when the value is not a semester
+    """
+    match = _semester_pattern.match(value or '')
+    if match is None:
+        return None
+    year = int(match.group(2))
+    if year < 100:
+        year += 2000
+    summer = match.group(1).lower() in ('sose', 'ss')
+    return year * 10 + (1 if summer else 2)
+
+
+def parse_date(value: typing.Optional[str]) -> typing.Optional[str]:
+    """Parse a date formatted the way QIS does, e.g. "24.07.2017", into its ISO 8601 form, e.g. "2017-07-24".
+
+    Args:
+        value: The value to parse
+    Returns:
+        The date, which sorts chronologically as text, or None when the value is not a date
+    """
+    match = _date_pattern.match(value or '')
+    if match is None:
+        return None
+    day, month, year = (int(group) for group in match.groups())
+    if year < 100:
+        year += 2000
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return '{:04d}-{:02d}-{:02d}'.format(year, month, day)
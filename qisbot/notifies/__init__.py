@@ -1,5 +1,9 @@
+import typing
 import logging
 import functools
+import importlib
+
+from qisbot import config
 
 
 def failsafe_notify(func):
@@ -18,5 +22,24 @@ def failsafe_notify(func):
     return wrapper
 
 
-from qisbot.notifies.email import *
-from qisbot.notifies.stdout import *
+# Modules of all notifiers, each paired with the QisConfiguration property that enables it
+_notifiers = (('notify_stdout', 'qisbot.notifies.stdout'), ('notify_email', 'qisbot.notifies.email'))
+
+
+def enable(conf: config.QisConfiguration) -> typing.List[str]:
+    """Import the notifiers enabled in a configuration, which registers their event handlers.
+
+    Importing a notifier is what subscribes it to events, so notifiers that no configuration
+    enables are never imported. Once imported, handlers still check each event's configuration.
+
+    Args:
+        conf: The QisConfiguration to enable notifiers for
+    Returns:
+        Module names of the enabled notifiers
+    """
+    enabled = []
+    for property_name, module_name in _notifiers:
+        if getattr(conf, property_name):
+            importlib.import_module(module_name)
+            enabled.append(module_name)
+    return enabled
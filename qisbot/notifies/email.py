@@ -1,6 +1,9 @@
+import time
+import atexit
 import random
 import typing
 import smtplib
+import threading
 import email.mime.text
 from contextlib import contextmanager
 
@@ -31,6 +34,38 @@ _updated_exam_message = ('qisbot is {emotion} to {action} that your "{exam}" exa
                          'been updated! I noticed the following changes:\n')
 
 
+_digest_message = ('qisbot is {emotion} to {action} that {count} of your exams have just been '
+                   'published or updated.\n')
+
+
+def _open_connection(conf: config.QisConfiguration) -> typing.Union[smtplib.SMTP, smtplib.SMTP_SSL]:
+    """Open an SMTP connection based on the configuration and log in.
+
+    Args:
+        conf: The application's configuration (needed for E-Mail server & login data)
+    Returns:
+        The logged in connection
+    """
+    if conf.email_notify_ssl:
+        connection = smtplib.SMTP_SSL(conf.email_notify_host, conf.email_notify_port)
+    else:
+        connection = smtplib.SMTP(conf.email_notify_host, conf.email_notify_port)
+    try:
+        connection.login(conf.email_notify_username, conf.email_notify_password)
+    except Exception:
+        connection.close()
+        raise
+    return connection
+
+
+def _close_connection(connection: typing.Union[smtplib.SMTP, smtplib.SMTP_SSL]) -> ():
+    """Close a connection, ignoring servers that already dropped it."""
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, OSError):
+        connection.close()
+
+
 @contextmanager
 def _email_connection(conf: config.QisConfiguration) -> typing.Union[smtplib.SMTP, smtplib.SMTP_SSL]:
     """Open an SMTP connection based on the configuration and close it when leaving the context.
@@ -40,51 +75,167 @@ def _email_connection(conf: config.QisConfiguration) -> typing.Union[smtplib.SMT
     """
     connection = None
     try:
-        if conf.email_notify_ssl:
-            connection = smtplib.SMTP_SSL(conf.email_notify_host, conf.email_notify_port)
-        else:
-            connection = smtplib.SMTP(conf.email_notify_host, conf.email_notify_port)
-        connection.login(conf.email_notify_username, conf.email_notify_password)
+        connection = _open_connection(conf)
         yield connection
     finally:
         if connection:
-            connection.quit()
+            _close_connection(connection)
 
 
-@zope.event.classhandler.handler(events.NewExamEvent)
-@failsafe_notify
-def on_new_exam_email(event: events.NewExamEvent) -> ():
-    """Notify the user about a newly published exam result via E-Mail."""
-    if not event.config.notify_email:
-        return
+class SMTPConnectionPool(object):
+    """Keeps logged in SMTP connections open, so that subsequent messages don't need a new TLS session and login.
+
+    Connections are pooled per server and user. A connection is only ever used by one
+    sender at a time; idle connections are dropped after max_idle seconds, as servers
+    tend to close them on their own anyway.
+    """
+
+    def __init__(self, max_idle: float = 60.0):
+        """Initialize a new instance.
+
+        Args:
+            max_idle: Seconds a connection may stay unused before it is closed instead of reused
+        """
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = {}  # type: typing.Dict[tuple, typing.List[typing.Tuple[smtplib.SMTP, float]]]
+
+    @staticmethod
+    def _key_of(conf: config.QisConfiguration) -> tuple:
+        return conf.email_notify_host, conf.email_notify_port, conf.email_notify_ssl, conf.email_notify_username
+
+    def _checkout(self, key: tuple) -> typing.Optional[smtplib.SMTP]:
+        """Take the most recently used idle connection for the given key, closing expired ones."""
+        with self._lock:
+            idle = self._idle.get(key, [])
+            if idle and time.monotonic() - idle[-1][1] <= self.max_idle:
+                return idle.pop()[0]
+            # Connections are appended when returned, so all others have expired as well
+            expired, idle[:] = list(idle), []
+        for connection, _ in expired:
+            _close_connection(connection)
+        return None
+
+    @contextmanager
+    def connection(self, conf: config.QisConfiguration) -> typing.Union[smtplib.SMTP, smtplib.SMTP_SSL]:
+        """Borrow a connection for the given configuration, opening one when none is idle.
+
+        The connection is returned to the pool when leaving the context, unless an error
+        occurred while using it.
+
+        Args:
+            conf: The application's configuration (needed for E-Mail server & login data)
+        """
+        key = self._key_of(conf)
+        connection = self._checkout(key) or _open_connection(conf)
+        try:
+            yield connection
+        except BaseException:
+            _close_connection(connection)
+            raise
+        with self._lock:
+            self._idle.setdefault(key, []).append((connection, time.monotonic()))
+
+    def sendmail(self, conf: config.QisConfiguration, destinations: typing.List[str], message: str) -> ():
+        """Send a message over a pooled connection.
+
+        A pooled connection may have been dropped by the server since it was last used,
+        in which case the message is sent once more over a fresh connection.
+
+        Args:
+            conf: The application's configuration (needed for E-Mail server & login data)
+            destinations: The addresses to send the message to
+            message: The complete message
+        """
+        try:
+            with self.connection(conf) as conn:
+                conn.sendmail(conf.email_notify_username, destinations, message)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection(conf) as conn:
+                conn.sendmail(conf.email_notify_username, destinations, message)
+
+    def close(self) -> ():
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                _close_connection(connection)
+
+    @property
+    def idle_connections(self) -> int:
+        with self._lock:
+            return sum(len(connections) for connections in self._idle.values())
+
+
+connection_pool = SMTPConnectionPool()
+atexit.register(connection_pool.close)
+
+
+def _new_exam_content(exam: models.Exam) -> str:
     message_content = _new_exam_message.format(emotion=random.choice(_emotions), action=random.choice(_actions),
-                                               exam=event.exam.name)
+                                               exam=exam.name)
     for attr_name in models.ExamData.__members__.keys():
-        attribute = getattr(event.exam, attr_name)
+        attribute = getattr(exam, attr_name)
         if attribute and attribute != 'None':
             message_content += '\t- {}: "{}"\n'.format(attr_name, attribute)
+    return message_content
+
+
+def _exam_changed_content(event: events.ExamChangedEvent) -> str:
+    message_content = _updated_exam_message.format(emotion=random.choice(_emotions), action=random.choice(_actions),
+                                                   exam=event.old_exam.name)
+    for changed_attr, values in event.changes.items():
+        message_content += '\t- {}: "{}" -> "{}"\n'.format(changed_attr, values[0], values[1])
+    return message_content
+
+
+def _send(conf: config.QisConfiguration, subject: str, message_content: str) -> ():
     message = email.mime.text.MIMEText(message_content, _subtype='plain')
-    message['Subject'] = 'qisbot: The results of your "{}" exam have been published!'.format(event.exam.name)
-    message['From'] = event.config.email_notify_username
-    with _email_connection(event.config) as conn:
-        conn.sendmail(event.config.email_notify_username, event.config.email_notify_destination, message.as_string())
+    message['Subject'] = subject
+    message['From'] = conf.email_notify_username
+    connection_pool.sendmail(conf, conf.email_notify_destinations, message.as_string())
+
+
+@zope.event.classhandler.handler(events.NewExamEvent)
+@failsafe_notify
+def on_new_exam_email(event: events.NewExamEvent) -> ():
+    """Notify the user about a newly published exam result via E-Mail."""
+    if not event.config.notify_email or event.config.email_notify_digest:
+        return
+    _send(event.config, 'qisbot: The results of your "{}" exam have been published!'.format(event.exam.name),
+          _new_exam_content(event.exam))
 
 
 @zope.event.classhandler.handler(events.ExamChangedEvent)
 @failsafe_notify
 def on_exam_changed_email(event: events.ExamChangedEvent) -> ():
     """Notify the user about an updated exam result via E-Mail."""
-    if not event.config.notify_email:
+    if not event.config.notify_email or event.config.email_notify_digest:
         return
-    message_content = _updated_exam_message.format(emotion=random.choice(_emotions), action=random.choice(_actions),
-                                                   exam=event.old_exam.name)
-    for changed_attr, values in event.changes.items():
-        message_content += '\t- {}: "{}" -> "{}"\n'.format(changed_attr, values[0], values[1])
-    message = email.mime.text.MIMEText(message_content, _subtype='plain')
-    message['Subject'] = 'qisbot: Your "{}" exam has been updated!'.format(event.old_exam.name)
-    message['From'] = event.config.email_notify_username
-    with _email_connection(event.config) as conn:
-        conn.sendmail(event.config.email_notify_username, event.config.email_notify_destination, message.as_string())
+    _send(event.config, 'qisbot: Your "{}" exam has been updated!'.format(event.old_exam.name),
+          _exam_changed_content(event))
+
+
+@zope.event.classhandler.handler(events.RefreshCompletedEvent)
+@failsafe_notify
+def on_refresh_completed_email(event: events.RefreshCompletedEvent) -> ():
+    """Notify the user about all exams published or updated during a refresh with a single E-Mail."""
+    if not event.config.notify_email or not event.config.email_notify_digest:
+        return
+    sections = []
+    for exam_event in event.exam_events:
+        if isinstance(exam_event, events.NewExamEvent):
+            sections.append(_new_exam_content(exam_event.exam))
+        elif isinstance(exam_event, events.ExamChangedEvent):
+            sections.append(_exam_changed_content(exam_event))
+    if not sections:
+        return
+    message_content = _digest_message.format(emotion=random.choice(_emotions), action=random.choice(_actions),
+                                             count=len(sections))
+    message_content += '\n' + '\n'.join(sections)
+    _send(event.config, 'qisbot: {} of your exams have been published or updated!'.format(len(sections)),
+          message_content)
 
 
 def test_connection(conf: config.QisConfiguration, print_exception=False) -> bool:
@@ -1,25 +1,64 @@
 import enum
+import time
+import uuid
 import sqlite3
+import threading
 import typing
+import collections
 
 from qisbot import models
+from qisbot import metrics
+from qisbot.lazy import lazy_import
 from qisbot.exceptions import PersistenceException
 
+# Only needed once exams change, reading them doesn't
+analytics = lazy_import('qisbot.analytics')
+
+# Applied to every connection. WAL journaling lets readers (e.g. printing the exams extract)
+# work alongside a refresh writing to the same file, and only requires syncing on checkpoints.
+_pragmas = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16384',
+    'PRAGMA temp_store = MEMORY'
+)
+
+# Typed columns stored next to the text QIS shows, so that reports can compare and add up values within SQLite.
+# Tuples of column name, domain, the field of models.ExamData it is parsed from and the function parsing it.
+_typed_columns = (
+    ('grade_value', 'REAL', 'grade', models.parse_decimal),
+    ('points_value', 'REAL', 'points', models.parse_decimal),
+    ('ects_value', 'REAL', 'ects', models.parse_decimal),
+    ('date_value', 'TEXT', 'date', models.parse_date),
+    ('semester_key', 'INTEGER', 'semester', models.semester_key)
+)
+
 
 class DatabaseManager(object):
-    def __init__(self, database_path: str):
+    def __init__(self, database_path: str, timeout: float = 30.0, cached_statements: int = 256):
         """Initialize a new DatabaseManager instance.
 
+        The database's schema is migrated to the latest version if required.
+
         Args:
             database_path: Path to the database file to use
+            timeout: Seconds to wait for locks held by other connections to the same file
+            cached_statements: Amount of prepared statements to keep for reuse
         Raises:
             ValueError: When no database path was provided
+            PersistenceException: When migrating the database's schema failed
         """
         if not database_path:
             raise ValueError('database_path must not be None or empty')
-        self._connection = sqlite3.connect(database_path)
-        for name, schema in self.schemas.items():
-            self.execute(schema)
+        # The connection may be shared by multiple refresh workers, which is why
+        # every compound operation on it has to hold the lock
+        self._connection = sqlite3.connect(database_path, timeout=timeout, check_same_thread=False,
+                                           cached_statements=cached_statements)
+        self._lock = threading.RLock()
+        with self._lock:
+            for pragma in _pragmas:
+                self.execute(pragma)
+            self._migrate()
 
     def execute(self, statement: str, params: typing.Iterable = ()) -> sqlite3.Cursor:
         """Execute a given SQL statement.
@@ -30,69 +69,103 @@ class DatabaseManager(object):
         Returns:
             The cursor for the result
         """
-        return self._connection.execute(statement, params)
+        with self._lock:
+            return self._connection.execute(statement, params)
 
     def commit(self) -> ():
         """Commits the last actions performed on the database."""
-        self._connection.commit()
+        with self._lock:
+            self._connection.commit()
 
-    def persist_exam(self, exam: models.Exam) -> ():
+    @metrics.timed('database.persist_exam')
+    def persist_exam(self, exam: models.Exam, account: str = '') -> ():
         """Insert a given Exam instance into the database.
 
         Args:
             exam: The Exam to persist
+            account: The account the exam belongs to
         Raises:
             PersistenceException: When the given exam already exists in the database
         """
-        statement = 'INSERT INTO exams VALUES ('
-        parameters = []
-        for attr_name in models.ExamData.__members__.keys():
-            statement += '?, '
-            parameters.append(exam.attributes.get(attr_name))
-        statement = statement[:statement.rfind(', ')] + ')'
         try:
-            self.execute(statement, params=parameters)
-            self.commit()
-        except sqlite3.IntegrityError as err:
-            raise PersistenceException('Exam with id {} was already persisted'.format(exam.id)) from err
+            self.apply_exam_changes(account, [exam], [])
+        except PersistenceException as ex:
+            raise PersistenceException('Exam with id {} was already persisted'.format(exam.id)) from ex.__cause__
 
-    def update_exam(self, exam_id: str, changes: typing.Dict[str, str]) -> ():
+    @metrics.timed('database.update_exam')
+    def update_exam(self, exam_id: str, changes: typing.Dict[str, str], account: str = '') -> ():
         """Update a given exam record.
 
+        The record's row hash is reset, as it can't be determined from the changes alone. Typed
+        columns of the changed fields are parsed again. The changes are appended to the exam history
+        as part of the same transaction.
+
         Args:
             exam_id: ID of the exam to update
             changes: Changes to apply
+            account: The account the exam belongs to
         """
         statement = 'UPDATE exams SET '
         parameters = []
         for attr_name, new_value in changes.items():
             statement += '{}=?, '.format(attr_name)
             parameters.append(new_value)
-        statement = statement[:statement.rfind(', ')] + ' WHERE id = ?'
+        for column, _, field, parse in _typed_columns:
+            if field in changes:
+                statement += '{}=?, '.format(column)
+                parameters.append(parse(changes[field]))
+        statement += 'row_hash=NULL WHERE account = ? AND id = ?'
+        parameters.append(account)
         parameters.append(exam_id)
-        self.execute(statement, params=parameters)
+        with self._lock:
+            persisted_exam = self.fetch_exam(exam_id, account=account)
+            self.execute(statement, params=parameters)
+            if persisted_exam is None:
+                return
+            if any(name in analytics.FIELDS for name in changes):
+                updated_exam = models.Exam.from_row(persisted_exam.to_row())
+                for name, new_value in changes.items():
+                    setattr(updated_exam, name, new_value)
+                self._update_aggregates(account, [persisted_exam], [updated_exam])
+            run_id, changed_at = uuid.uuid4().hex, time.time()
+            self._connection.executemany(self._history_statement, [
+                (account, int(exam_id), name, getattr(persisted_exam, name), new_value, changed_at, run_id)
+                for name, new_value in changes.items() if getattr(persisted_exam, name) != new_value])
 
-    def fetch_exam(self, exam_id: str) -> typing.Optional[models.Exam]:
+    @metrics.timed('database.fetch_exam')
+    def fetch_exam(self, exam_id: str, account: str = '') -> typing.Optional[models.Exam]:
         """Fetch an Exam with a given ID from the database.
 
         Args:
             exam_id: ID of the requested Exam
+            account: The account the exam belongs to
         Returns:
             The resulting Exam instance or None
         """
-        statement = 'SELECT * FROM exams WHERE exams.id = ?'
-        result = self.execute(statement, params=(int(exam_id),)).fetchone()
+        statement = 'SELECT {} FROM exams WHERE exams.account = ? AND exams.id = ?'.format(self._exam_columns)
+        with self._lock:
+            result = self.execute(statement, params=(account, int(exam_id))).fetchone()
         if not result:
             return None
         return models.map_to_exam(result)
 
-    def fetch_all_exams(self) -> typing.List[models.Exam]:
+    @metrics.timed('database.fetch_all_exams')
+    def fetch_all_exams(self, account: str = None) -> typing.List[models.Exam]:
         """Fetch all exams from the database.
 
+        Args:
+            account: Only fetch the exams of this account. When None, the exams
+                of all accounts are fetched.
         Returns:
             A list of all persisted exams.
         """
-        result = self.execute('SELECT * FROM exams').fetchall()
+        statement = 'SELECT {} FROM exams'.format(self._exam_columns)
+        parameters = ()
+        if account is not None:
+            statement += ' WHERE account = ?'
+            parameters = (account,)
+        with self._lock:
+            result = self.execute(statement, params=parameters).fetchall()
         if not result:
             return []
         exams = []
@@ -100,11 +173,555 @@ class DatabaseManager(object):
             exams.append(models.map_to_exam(result_item))
         return exams
 
+    def iter_exam_rows(self, account: str = None, semester: str = None, status: str = None,
+                       batch_size: int = 500) -> typing.Iterator[typing.Tuple]:
+        """Stream the rows of exams from the database, without loading all of them at once.
+
+        All filters are optional and applied by SQLite. Rows are read in batches, the lock is only
+        held while a batch is read, so that refreshes aren't blocked while the rows are processed.
+
+        Args:
+            account: Only stream the exams of this account
+            semester: Only stream the exams of this semester
+            status: Only stream the exams with this status
+            batch_size: Amount of rows to read at once
+        Yields:
+            Tuples of the account followed by the exam's values in the order defined in models.ExamData,
+            ordered by account and exam ID
+        """
+        condition, parameters = self._exam_filter(account, semester, status)
+        statement = 'SELECT account, {} FROM exams{} ORDER BY account, id'.format(self._exam_columns, condition)
+        with self._lock:
+            # A cursor of its own, so that statements executed in between don't reset it
+            cursor = self._connection.cursor()
+            cursor.execute(statement, parameters)
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    @metrics.timed('database.fetch_column_widths')
+    def fetch_column_widths(self, account: str = None, semester: str = None,
+                            status: str = None) -> typing.Dict[str, int]:
+        """Fetch the length of the longest value of every column of the exams iter_exam_rows would stream.
+
+        Args:
+            account: Only consider the exams of this account
+            semester: Only consider the exams of this semester
+            status: Only consider the exams with this status
+        Returns:
+            The lengths keyed by column name (account and the names defined in models.ExamData),
+            0 for columns without any values
+        """
+        columns = ['account'] + list(models.ExamData.__members__.keys())
+        condition, parameters = self._exam_filter(account, semester, status)
+        statement = 'SELECT {} FROM exams{}'.format(
+            ', '.join('MAX(LENGTH({}))'.format(column) for column in columns), condition)
+        with self._lock:
+            result = self.execute(statement, params=parameters).fetchone()
+        return {column: width or 0 for column, width in zip(columns, result)}
+
+    @metrics.timed('database.fetch_exams_by_grade')
+    def fetch_exams_by_grade(self, account: str = None, better_than: float = None,
+                             worse_than: float = None) -> typing.List[models.Exam]:
+        """Fetch the graded exams whose grades are within a range, e.g. all exams graded better than 2.0.
+
+        The range is applied by SQLite, to the grades parsed when the exams were persisted.
+
+        Args:
+            account: Only fetch the exams of this account. When None, the exams of all accounts are fetched.
+            better_than: Only fetch exams with a lower grade than this
+            worse_than: Only fetch exams with a higher grade than this
+        Returns:
+            The exams in chronological order of their semesters
+        """
+        conditions = ['grade_value IS NOT NULL']
+        parameters = []
+        for condition, value in (('account = ?', account), ('grade_value < ?', better_than),
+                                 ('grade_value > ?', worse_than)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        statement = 'SELECT {} FROM exams WHERE {} ORDER BY semester_key, date_value, id'.format(
+            self._exam_columns, ' AND '.join(conditions))
+        with self._lock:
+            result = self.execute(statement, params=parameters).fetchall()
+        return [models.map_to_exam(result_item) for result_item in result]
+
+    @staticmethod
+    def _exam_filter(account: str = None, semester: str = None,
+                     status: str = None) -> typing.Tuple[str, typing.List[str]]:
+        """Build the WHERE clause selecting rows by account, semester and status. None matches everything."""
+        conditions = []
+        parameters = []
+        for column, value in (('account', account), ('semester', semester), ('status', status)):
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                parameters.append(value)
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), parameters
+
+    @metrics.timed('database.fetch_exam_hashes')
+    def fetch_exam_hashes(self, account: str) -> typing.Dict[int, typing.Optional[str]]:
+        """Fetch the row hashes of all exams of an account with a single query.
+
+        Args:
+            account: The account to fetch the row hashes of
+        Returns:
+            A dict of the row hashes (None when unknown), keyed by the exams' numeric ID
+        """
+        with self._lock:
+            result = self.execute('SELECT id, row_hash FROM exams WHERE account = ?', params=(account,)).fetchall()
+        return dict(result)
+
+    @metrics.timed('database.fetch_exams')
+    def fetch_exams(self, account: str, exam_ids: typing.Iterable[int]) -> typing.Dict[int, models.Exam]:
+        """Fetch multiple exams of an account by their IDs.
+
+        Args:
+            account: The account the exams belong to
+            exam_ids: The numeric IDs of the exams to fetch
+        Returns:
+            A dict of all found exams, keyed by their numeric ID
+        """
+        exam_ids = list(exam_ids)
+        exams = {}
+        # Stay well below SQLite's limit of host parameters per statement
+        for offset in range(0, len(exam_ids), 500):
+            chunk = exam_ids[offset:offset + 500]
+            statement = 'SELECT {} FROM exams WHERE account = ? AND id IN ({})'.format(
+                self._exam_columns, ', '.join('?' * len(chunk)))
+            with self._lock:
+                result = self.execute(statement, params=[account] + chunk).fetchall()
+            for result_item in result:
+                exam = models.map_to_exam(result_item)
+                exams[int(exam.id)] = exam
+        return exams
+
+    def fetch_exams_by_id(self, account: str) -> typing.Dict[int, models.Exam]:
+        """Fetch all exams of an account with a single query.
+
+        Args:
+            account: The account to fetch the exams of
+        Returns:
+            A dict of all exams of the account, keyed by their numeric ID
+        """
+        exams = {}
+        for exam in self.fetch_all_exams(account=account):
+            exams[int(exam.id)] = exam
+        return exams
+
+    @metrics.timed('database.apply_exam_changes')
+    def apply_exam_changes(self, account: str, new_exams: typing.List[models.Exam],
+                           changed_exams: typing.List[models.Exam],
+                           changes: typing.List[typing.Tuple[int, typing.Dict[str, typing.Tuple[str, str]]]] = (),
+                           run_id: str = None, changed_at: float = None) -> ():
+        """Insert new and update changed exams of an account in a single transaction.
+
+        Changed exams are updated with all of their values. Row hashes, typed columns and the account's
+        aggregates are maintained for all exams. The values of new exams and the given changes are appended to
+        the exam history within the same transaction.
+
+        Args:
+            account: The account the exams belong to
+            new_exams: Exams to insert
+            changed_exams: Exams to update
+            changes: Tuples of exam ID and changes (as returned by models.compare_exams) to record in
+                the exam history, in the order they occurred
+            run_id: ID of the refresh the changes were detected in. A random one is generated when None.
+            changed_at: Time (as returned by time.time) the changes were detected. When None, the current
+                time is used.
+        Raises:
+            PersistenceException: When a new exam already exists in the database. No
+                changes are applied in this case.
+        """
+        typed_columns = [column for column, _, _, _ in _typed_columns]
+        insert_statement = 'INSERT INTO exams ({}, {}, account, row_hash) VALUES ({}?, ?)'.format(
+            self._exam_columns, ', '.join(typed_columns),
+            '?, ' * (len(models.ExamData.__members__) + len(typed_columns)))
+        update_columns = [name for name in models.ExamData.__members__.keys() if name != 'id']
+        update_statement = 'UPDATE exams SET {}, row_hash=? WHERE account = ? AND id = ?'.format(
+            ', '.join('{}=?'.format(name) for name in update_columns + typed_columns))
+        insert_parameters = [list(exam.to_row()) + self._typed_values(exam) + [account, exam.row_hash]
+                             for exam in new_exams]
+        update_parameters = [[getattr(exam, name) for name in update_columns] + self._typed_values(exam) +
+                             [exam.row_hash, account, int(exam.id)] for exam in changed_exams]
+        run_id = run_id or uuid.uuid4().hex
+        changed_at = time.time() if changed_at is None else changed_at
+        history_parameters = []
+        for exam in new_exams:
+            # The id entry marks when the exam appeared
+            for name, value in exam.attributes.items():
+                if value is not None:
+                    history_parameters.append((account, int(exam.id), name, None, value, changed_at, run_id))
+        for exam_id, exam_changes in changes:
+            for name, (old_value, new_value) in exam_changes.items():
+                history_parameters.append((account, int(exam_id), name, old_value, new_value, changed_at, run_id))
+        with self._lock:
+            try:
+                # Aggregates change by the difference between the last version of every exam and its persisted one
+                latest_exams = collections.OrderedDict((int(exam.id), exam) for exam in new_exams + changed_exams)
+                persisted_exams = self.fetch_exams(account, [int(exam.id) for exam in changed_exams])
+                self._connection.executemany(insert_statement, insert_parameters)
+                self._connection.executemany(update_statement, update_parameters)
+                self._connection.executemany(self._history_statement, history_parameters)
+                self._update_aggregates(account, persisted_exams.values(), latest_exams.values())
+                self.commit()
+            except sqlite3.IntegrityError as err:
+                self._connection.rollback()
+                raise PersistenceException('At least one of the new exams was already persisted') from err
+            except sqlite3.Error:
+                self._connection.rollback()
+                raise
+
+    @metrics.timed('database.fetch_history')
+    def fetch_history(self, account: str = None, exam_id: str = None, field: str = None, new_value: str = None,
+                      since: float = None, until: float = None) -> typing.List[typing.Tuple]:
+        """Fetch entries of the exam history.
+
+        All arguments are optional filters, which are combined. Answering e.g. when a grade
+        appeared across all accounts is a matter of filtering by field and new_value.
+
+        Args:
+            account: Only fetch changes of this account
+            exam_id: Only fetch changes of this exam
+            field: Only fetch changes of this field (see models.ExamData)
+            new_value: Only fetch changes to this value
+            since: Only fetch changes recorded after this time
+            until: Only fetch changes recorded at or before this time
+        Returns:
+            Tuples of account, exam ID, field, old value, new value, time and run ID, in the
+            order the changes were recorded
+        """
+        conditions = []
+        parameters = []
+        for condition, value in (('account = ?', account), ('exam_id = ?', exam_id), ('field = ?', field),
+                                 ('new_value = ?', new_value), ('changed_at > ?', since),
+                                 ('changed_at <= ?', until)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(int(value) if condition == 'exam_id = ?' else value)
+        statement = 'SELECT account, exam_id, field, old_value, new_value, changed_at, run_id FROM exam_history'
+        if conditions:
+            statement += ' WHERE ' + ' AND '.join(conditions)
+        statement += ' ORDER BY changed_at, rowid'
+        with self._lock:
+            return self.execute(statement, params=parameters).fetchall()
+
+    def fetch_exam_at(self, exam_id: str, timestamp: float, account: str = '') -> typing.Optional[models.Exam]:
+        """Reconstruct an exam as it was at a given point in time.
+
+        Args:
+            exam_id: ID of the exam
+            timestamp: The point in time (as returned by time.time)
+            account: The account the exam belongs to
+        Returns:
+            The exam as it was at the given time or None when it didn't exist yet
+        """
+        exam = self.fetch_exam(exam_id, account=account)
+        if exam is None:
+            return None
+        reconstructed = self._roll_back({int(exam.id): exam}, self.fetch_history(
+            account=account, exam_id=exam_id, since=timestamp))
+        return reconstructed.get(int(exam.id))
+
+    def fetch_exams_extract_at(self, account: str, timestamp: float) -> typing.List[models.Exam]:
+        """Reconstruct all exams of an account as they were at a given point in time.
+
+        Args:
+            account: The account to reconstruct the exams of
+            timestamp: The point in time (as returned by time.time)
+        Returns:
+            All exams that existed at the given time, with their values at that time
+        """
+        exams = self.fetch_exams_by_id(account)
+        reconstructed = self._roll_back(exams, self.fetch_history(account=account, since=timestamp))
+        return list(reconstructed.values())
+
+    @staticmethod
+    def _roll_back(exams: typing.Dict[int, models.Exam],
+                   history: typing.List[typing.Tuple]) -> typing.Dict[int, models.Exam]:
+        """Undo the given history entries on a set of exams.
+
+        Exams that didn't exist before the earliest of the entries are removed. Exams that
+        were persisted before the history was recorded are assumed to have always existed.
+
+        Args:
+            exams: The current exams, keyed by their numeric ID. They are modified in place.
+            history: Entries as returned by fetch_history
+        Returns:
+            The exams as they were before the entries were recorded
+        """
+        for _, exam_id, field, old_value, _, _, _ in reversed(history):
+            if exam_id not in exams:
+                continue
+            if field == 'id':
+                del exams[exam_id]
+            else:
+                setattr(exams[exam_id], field, old_value)
+        return exams
+
+    def _update_aggregates(self, account: str, before: typing.Iterable[models.Exam],
+                           after: typing.Iterable[models.Exam]) -> ():
+        """Add the difference some changed exams make to the aggregates of an account.
+
+        Must be called within the transaction that changes the exams.
+
+        Args:
+            account: The account the exams belong to
+            before: The exams as they were persisted before, if they were persisted at all
+            after: The exams with their new values
+        """
+        semester_changes, grade_count_changes = analytics.aggregate_changes(before, after)
+        columns = analytics.AGGREGATES
+        self._connection.executemany('INSERT OR IGNORE INTO exam_aggregates (account, semester) VALUES (?, ?)',
+                                     [(account, semester) for semester in semester_changes])
+        self._connection.executemany('UPDATE exam_aggregates SET {} WHERE account = ? AND semester = ?'.format(
+            ', '.join('{0} = {0} + ?'.format(column) for column in columns)),
+            [list(changes) + [account, semester] for semester, changes in semester_changes.items()])
+        self._connection.executemany('INSERT OR IGNORE INTO grade_counts (account, grade) VALUES (?, ?)',
+                                     [(account, grade) for grade in grade_count_changes])
+        self._connection.executemany('UPDATE grade_counts SET count = count + ? WHERE account = ? AND grade = ?',
+                                     [(count, account, grade) for grade, count in grade_count_changes.items()])
+        # Semesters and grades only disappear when exams are subtracted from them
+        if any(changes[0] < 0 for changes in semester_changes.values()):
+            self.execute('DELETE FROM exam_aggregates WHERE account = ? AND exams <= 0', params=(account,))
+        if any(count < 0 for count in grade_count_changes.values()):
+            self.execute('DELETE FROM grade_counts WHERE account = ? AND count <= 0', params=(account,))
+
+    def _rebuild_aggregates(self, account: str) -> ():
+        """Calculate the aggregates of an account from all of its exams. Must be called within a transaction."""
+        self.execute('DELETE FROM exam_aggregates WHERE account = ?', params=(account,))
+        self.execute('DELETE FROM grade_counts WHERE account = ?', params=(account,))
+        self._update_aggregates(account, [], self.fetch_all_exams(account=account))
+
+    @metrics.timed('database.fetch_aggregates')
+    def fetch_aggregates(self, account: str = None) -> typing.List[typing.Tuple]:
+        """Fetch the aggregates of the exams of every semester, maintained whenever exams change.
+
+        Args:
+            account: Only fetch the aggregates of this account. When None, those of all accounts are fetched.
+        Returns:
+            Tuples of account, semester ('' for exams without one) and the sums defined in analytics.AGGREGATES
+        """
+        statement = 'SELECT account, semester, {} FROM exam_aggregates'.format(', '.join(analytics.AGGREGATES))
+        condition, parameters = self._exam_filter(account)
+        with self._lock:
+            return self.execute(statement + condition + ' ORDER BY account, semester', params=parameters).fetchall()
+
+    @metrics.timed('database.fetch_grade_counts')
+    def fetch_grade_counts(self, account: str = None) -> typing.List[typing.Tuple[str, float, int]]:
+        """Fetch how often every grade occurs, maintained whenever exams change.
+
+        Args:
+            account: Only count the grades of this account. When None, those of all accounts are fetched.
+        Returns:
+            Tuples of account, grade and count
+        """
+        condition, parameters = self._exam_filter(account)
+        with self._lock:
+            return self.execute('SELECT account, grade, count FROM grade_counts' + condition +
+                                ' ORDER BY account, grade', params=parameters).fetchall()
+
+    def fetch_unowned_exam_count(self) -> int:
+        """Fetch the amount of exams that don't belong to any account."""
+        with self._lock:
+            return self.execute('SELECT COUNT(*) FROM exams WHERE account = \'\'').fetchone()[0]
+
+    def adopt_unowned_exams(self, account: str) -> int:
+        """Assign all exams that don't belong to any account to a given account.
+
+        Databases created before exams were scoped by account contain only the
+        exams of a single account, which is the one that should keep them. Nothing
+        is written unless there are such exams.
+
+        Args:
+            account: The account to assign the exams to
+        Returns:
+            The amount of adopted exams
+        """
+        with self._lock:
+            if not self.fetch_unowned_exam_count():
+                return 0
+            adopted = self.execute('UPDATE exams SET account = ? WHERE account = \'\'', params=(account,)).rowcount
+            self._rebuild_aggregates('')
+            self._rebuild_aggregates(account)
+            self.commit()
+        return adopted
+
+    @metrics.timed('database.fetch_extract_fingerprint')
+    def fetch_extract_fingerprint(self, account: str) -> typing.Optional[str]:
+        """Fetch the fingerprint of the exams extract that was last processed for an account.
+
+        Args:
+            account: The account to fetch the fingerprint for
+        Returns:
+            The fingerprint or None when no exams extract was processed yet
+        """
+        with self._lock:
+            result = self.execute('SELECT extract_fingerprint FROM accounts WHERE account = ?',
+                                  params=(account,)).fetchone()
+        return result[0] if result else None
+
+    @metrics.timed('database.update_extract_fingerprint')
+    def update_extract_fingerprint(self, account: str, fingerprint: str) -> ():
+        """Store the fingerprint of the exams extract that was processed for an account.
+
+        Args:
+            account: The account the exams extract belongs to
+            fingerprint: The exams extract's fingerprint
+        """
+        with self._lock:
+            self.execute('INSERT OR IGNORE INTO accounts (account) VALUES (?)', params=(account,))
+            self.execute('UPDATE accounts SET extract_fingerprint = ? WHERE account = ?',
+                         params=(fingerprint, account))
+            self.commit()
+
+    @property
+    def schema_version(self) -> int:
+        """The version of the database's schema, 0 for databases that were never migrated."""
+        with self._lock:
+            result = self.execute('SELECT MAX(version) FROM schema_version').fetchone()
+        return result[0] or 0
+
+    @property
+    def migrations(self) -> typing.List[typing.Callable[[], typing.Any]]:
+        """All schema migrations in order. The version a migration leads to is its position, starting at 1.
+
+        Migrations must never be changed once released, changes to the schema require a new one.
+        """
+        return [
+            self._migrate_initial_schema,
+            self._migrate_exam_indexes,
+            self._migrate_exam_history,
+            self._migrate_exam_aggregates,
+            self._migrate_typed_columns
+        ]
+
+    def _migrate(self) -> ():
+        """Apply all migrations the database's schema is missing.
+
+        Every migration runs in its own transaction, together with recording its version.
+
+        Raises:
+            PersistenceException: When a migration failed. The database stays at the
+                version of the last successful migration.
+        """
+        self.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+        current_version = self.schema_version
+        # Transactions are controlled explicitly, as the sqlite3 module of Python < 3.6
+        # commits implicitly before every CREATE, ALTER and DROP statement otherwise
+        isolation_level = self._connection.isolation_level
+        self._connection.isolation_level = None
+        try:
+            for version, migration in enumerate(self.migrations, start=1):
+                if version <= current_version:
+                    continue
+                try:
+                    self.execute('BEGIN')
+                    migration()
+                    self.execute('INSERT INTO schema_version (version) VALUES (?)', params=(version,))
+                    self.execute('COMMIT')
+                except sqlite3.Error as err:
+                    if self._connection.in_transaction:
+                        self.execute('ROLLBACK')
+                    raise PersistenceException('Migrating the database to version {} failed'.format(version)) from err
+        finally:
+            self._connection.isolation_level = isolation_level
+
+    def _migrate_initial_schema(self) -> ():
+        """Version 1: Create the exams and accounts tables.
+
+        Exams tables created before schema versioning existed are upgraded: Tables without
+        the account column are rebuilt, tables without the row_hash column get it added.
+        Missing row hashes are calculated afterwards.
+        """
+        columns = [row[1] for row in self.execute('PRAGMA table_info(exams)').fetchall()]
+        if columns and 'account' not in columns:
+            self.execute('ALTER TABLE exams RENAME TO exams_legacy')
+            self.execute(self.schemas['exams'])
+            self.execute('INSERT INTO exams ({0}) SELECT {0} FROM exams_legacy'.format(self._exam_columns))
+            self.execute('DROP TABLE exams_legacy')
+        elif columns and 'row_hash' not in columns:
+            self.execute('ALTER TABLE exams ADD COLUMN row_hash TEXT')
+        for name, schema in self.schemas.items():
+            self.execute(schema)
+        result = self.execute('SELECT {}, account FROM exams WHERE row_hash IS NULL'.format(
+            self._exam_columns)).fetchall()
+        row_hashes = []
+        for result_item in result:
+            exam = models.map_to_exam(result_item[:-1])
+            row_hashes.append((exam.row_hash, result_item[-1], int(exam.id)))
+        self._connection.executemany('UPDATE exams SET row_hash = ? WHERE account = ? AND id = ?', row_hashes)
+
+    def _migrate_exam_indexes(self) -> ():
+        """Version 2: Index exams by semester and status within each account."""
+        self.execute('CREATE INDEX exams_account_semester ON exams (account, semester)')
+        self.execute('CREATE INDEX exams_account_status ON exams (account, status)')
+
+    def _migrate_exam_history(self) -> ():
+        """Version 3: Create the append-only exam history."""
+        self.execute('CREATE TABLE exam_history (account TEXT NOT NULL, exam_id INTEGER NOT NULL, '
+                     'field TEXT NOT NULL, old_value TEXT, new_value TEXT, changed_at REAL NOT NULL, '
+                     'run_id TEXT NOT NULL)')
+        self.execute('CREATE INDEX exam_history_exam ON exam_history (account, exam_id, changed_at)')
+        self.execute('CREATE INDEX exam_history_account ON exam_history (account, changed_at)')
+        self.execute('CREATE INDEX exam_history_value ON exam_history (field, new_value)')
+
+    def _migrate_exam_aggregates(self) -> ():
+        """Version 4: Create the aggregates of every account and semester and calculate them for existing exams."""
+        self.execute('CREATE TABLE exam_aggregates (account TEXT NOT NULL, semester TEXT NOT NULL, '
+                     'exams INTEGER NOT NULL DEFAULT 0, passed INTEGER NOT NULL DEFAULT 0, '
+                     'failed INTEGER NOT NULL DEFAULT 0, ects_earned REAL NOT NULL DEFAULT 0, '
+                     'graded_ects REAL NOT NULL DEFAULT 0, weighted_grades REAL NOT NULL DEFAULT 0, '
+                     'PRIMARY KEY (account, semester))')
+        self.execute('CREATE TABLE grade_counts (account TEXT NOT NULL, grade REAL NOT NULL, '
+                     'count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (account, grade))')
+        for (account,) in self.execute('SELECT DISTINCT account FROM exams').fetchall():
+            self._update_aggregates(account, [], self.fetch_all_exams(account=account))
+
+    def _migrate_typed_columns(self) -> ():
+        """Version 5: Add typed columns parsed from the text of exams, fill them for existing exams and index them."""
+        for column, domain, _, _ in _typed_columns:
+            self.execute('ALTER TABLE exams ADD COLUMN {} {}'.format(column, domain))
+        result = self.execute('SELECT {}, account FROM exams'.format(self._exam_columns)).fetchall()
+        self._connection.executemany('UPDATE exams SET {} WHERE account = ? AND id = ?'.format(
+            ', '.join('{}=?'.format(column) for column, _, _, _ in _typed_columns)),
+            [self._typed_values(models.map_to_exam(result_item[:-1])) + [result_item[-1], result_item[0]]
+             for result_item in result])
+        self.execute('CREATE INDEX exams_account_semester_key ON exams (account, semester_key)')
+        self.execute('CREATE INDEX exams_account_grade_value ON exams (account, grade_value)')
+        self.execute('CREATE INDEX exams_account_date_value ON exams (account, date_value)')
+
+    @staticmethod
+    def _typed_values(exam: models.Exam) -> typing.List:
+        """Parse the values of the typed columns from an exam, in the order of their definition."""
+        return [parse(getattr(exam, field)) for _, _, field, parse in _typed_columns]
+
+    @property
+    def _history_statement(self) -> str:
+        """Statement to append an entry to the exam history."""
+        return ('INSERT INTO exam_history (account, exam_id, field, old_value, new_value, changed_at, run_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)')
+
+    @property
+    def _exam_columns(self) -> str:
+        """The exams table's data columns, in the order defined in models.ExamData."""
+        return ', '.join(models.ExamData.__members__.keys())
+
     @property
     def schemas(self) -> typing.Dict[str, str]:
-        """A dict of all table names and schemas as SQL create statements."""
+        """A dict of all table names and schemas as SQL create statements.
+
+        These are the schemas of version 1, later versions are reached through migrations.
+        """
         exams_schema = self._build_schema('exams', models.ExamData)
-        return {exams_schema[0]: exams_schema[1]}
+        accounts_schema = 'CREATE TABLE IF NOT EXISTS accounts (account TEXT PRIMARY KEY, extract_fingerprint TEXT)'
+        return {exams_schema[0]: exams_schema[1], 'accounts': accounts_schema}
 
     @staticmethod
     def _build_schema(table_name: str, data_model: enum.EnumMeta) -> str:
@@ -119,14 +736,19 @@ class DatabaseManager(object):
         schema = 'CREATE TABLE IF NOT EXISTS {} ('.format(table_name)
         for name, field in data_model.__members__.items():
             if name == 'id':
-                domain = 'INTEGER PRIMARY KEY'
+                domain = 'INTEGER NOT NULL'
             else:
                 domain = 'TEXT'
             schema += '{} {}, '.format(name, domain)
-        last_separator_index = schema.rfind(', ')
-        schema = schema[:last_separator_index] + ')'
+        # Exams IDs are only unique per account
+        schema += 'account TEXT NOT NULL DEFAULT \'\', row_hash TEXT, PRIMARY KEY (account, id))'
         return table_name, schema
 
+    def close(self) -> ():
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
+
     def __del__(self) -> ():
         """Close the database connection when instance gets garbage collected."""
         self._connection.close()
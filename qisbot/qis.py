@@ -1,13 +1,19 @@
+import time
 import functools
 import typing
+import urllib.parse
 
 import requests
 from lxml import html
 from lxml.etree import strip_tags
+from lxml.etree import ParseError, ParserError
 
 from qisbot import models
+from qisbot import metrics
 from qisbot import scraper
+from qisbot import resilience
 from qisbot.exceptions import NoSuchElementException
+from qisbot.exceptions import ScraperException
 from qisbot.exceptions import QisLoginFailedException
 from qisbot.exceptions import QisNotLoggedInException
 from qisbot.exceptions import UnexpectedStateException
@@ -30,12 +36,14 @@ def requires_login(func):
 
 
 class Qis(object):
-    def __init__(self, base_url: str, custom_scraper: scraper.Scraper = None):
+    def __init__(self, base_url: str, custom_scraper: scraper.Scraper = None, login_state_ttl: float = 60):
         """Initialize a new QIS session.
 
         Args:
             base_url: The QIS' base url (usually that of the login page)
             custom_scraper: A custom scraper instance
+            login_state_ttl: Time in seconds the login state determined from a fetched page
+                is trusted before is_logged_in probes the base url again
         Raises:
             ValueError: When no base url was provided
         """
@@ -43,7 +51,14 @@ class Qis(object):
             raise ValueError('No base url provided')
         self._base_url = base_url
         self._scraper = custom_scraper or scraper.Scraper()
+        self.login_state_ttl = login_state_ttl
+        self._login_state = None  # type: bool
+        self._login_state_session = None  # type: str
+        self._login_state_updated_at = None  # type: float
+        # Every page fetched during this session tells whether or not it's still logged in
+        self._scraper.fetch_hooks.append(self._observe_login_state)
 
+    @metrics.timed('login')
     def login(self, username: str, password: str) -> ():
         """Perform a login.
 
@@ -75,16 +90,42 @@ class Qis(object):
                 break
         if login_submit_value is None:
             raise NoSuchElementException('Unable to determine login submit value')
-        # POST the login request
+        # POST the login request. Unlike GETs, it is never retried.
+        breaker = resilience.breaker_for(urllib.parse.urlsplit(login_action).netloc)
+        trial = breaker.before_request()
+        try:
+            with self._scraper.rate_limiter.request(login_action):
+                login_response = self._scraper.session.post(login_action, data={
+                    'username': username,
+                    'password': password,
+                    'submit': login_submit_value
+                }, timeout=self._scraper.request_timeout())
+        except (requests.ConnectionError, requests.Timeout) as ex:
+            breaker.record_failure()
+            raise QisLoginFailedException('Login failed due to unreachable server') from ex
+        except BaseException as ex:
+            # E.g. an invalid URL or a passed deadline, the host is not to blame
+            if trial:
+                breaker.release_trial()
+            if isinstance(ex, requests.RequestException):
+                raise QisLoginFailedException('Login failed due to unexpected request error') from ex
+            raise
+        # The host answered, only statuses indicating a temporary problem count against it
+        if login_response.status_code in resilience.TRANSIENT_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
         try:
-            login_response = self._scraper.session.post(login_action, data={
-                'username': username,
-                'password': password,
-                'submit': login_submit_value
-            })
             login_response.raise_for_status()
-        except requests.RequestException as ex:
+        except requests.HTTPError as ex:
             raise QisLoginFailedException('Login failed due to unexpected server response') from ex
+        # The page the login redirects to usually tells whether it succeeded, saving another probe
+        self.invalidate_login_state()
+        if login_response.content:
+            try:
+                self._observe_login_state(login_response, html.fromstring(login_response.content))
+            except (ParseError, ParserError):
+                pass
         if not self.is_logged_in:
             raise QisLoginFailedException('Login not successful. Possibly invalid credentials')
 
@@ -92,8 +133,10 @@ class Qis(object):
     def is_logged_in(self) -> bool:
         """Determine whether or not the current session is logged in.
 
-        This is accomplished by opening the base_url and looking for options
-        to logout. If none is found, the session is considered to be not logged in.
+        Every page fetched through the scraper updates the cached login state, which
+        is trusted for login_state_ttl seconds. Only when it expired, this is accomplished
+        by opening the base_url and looking for options to logout. If none is found,
+        the session is considered to be not logged in.
 
         A handy side-effect is that whenever this check is performed on an already
         logged-in session, the server-side session timeout is being reset due to activity.
@@ -105,14 +148,64 @@ class Qis(object):
         if 'JSESSIONID' not in self._scraper.cookies.keys():
             # This is the first time the page is being visited, can't possibly be logged in
             return False
+        if self._login_state_is_fresh:
+            return self._login_state
         document = self._scraper.fetch(self.base_url)
+        logged_in = bool(self._login_state_of(document))
+        self._remember_login_state(logged_in)
+        return logged_in
+
+    def invalidate_login_state(self) -> ():
+        """Forget the cached login state, so that the next check performs a probe."""
+        self._login_state = None
+        self._login_state_session = None
+        self._login_state_updated_at = None
+
+    @property
+    def _login_state_is_fresh(self) -> bool:
+        """Whether or not the cached login state can be trusted."""
+        if self._login_state is None:
+            return False
+        elif self._login_state_session != self._scraper.cookies.get('JSESSIONID'):
+            # The state was determined for a different session
+            return False
+        return time.monotonic() - self._login_state_updated_at < self.login_state_ttl
+
+    def _remember_login_state(self, logged_in: bool) -> ():
+        self._login_state = logged_in
+        self._login_state_session = self._scraper.cookies.get('JSESSIONID')
+        self._login_state_updated_at = time.monotonic()
+
+    def _observe_login_state(self, response: requests.Response, document: html.HtmlElement) -> ():
+        """Update the cached login state from a fetched page.
+
+        Args:
+            response: The response the page was received with
+            document: The parsed page
+        """
+        logged_in = self._login_state_of(document)
+        if logged_in is not None:
+            self._remember_login_state(logged_in)
+
+    def _login_state_of(self, document: html.HtmlElement) -> typing.Optional[bool]:
+        """Determine the login state a page was rendered for.
+
+        Args:
+            document: The page to inspect
+        Returns:
+            True when the page offers to logout, False when it offers to login,
+            None when the page doesn't tell
+        """
         login_action_link = self._scraper.find_all(Selectors.LOGIN_ACTION_LINK.value, document)
         if not len(login_action_link):
-            return False
+            # Without the login action link, only the login form gives it away
+            if len(self._scraper.find_all(Selectors.LOGIN_PASSWORD_INPUT.value, document)):
+                return False
+            return None
         # Strip down the link's horrible text format
         login_status = login_action_link[0]
         strip_tags(login_status, 'u')
-        login_status = login_status.text.replace('"', '').strip().lower()
+        login_status = (login_status.text or '').replace('"', '').strip().lower()
         if login_status in ('logout', 'abmelden'):
             return True
         return False
@@ -130,19 +223,63 @@ class Qis(object):
             UnexpectedStateException: When navigating to exams extract page failed
             NoSuchElementException: When unable to locate exams extract data table
         """
+        return self.extract_rows(self.fetch_exams_extract_table())
+
+    @requires_login
+    def fetch_exams_extract_table(self) -> html.HtmlElement:
+        """Fetch the table of the exams extract.
+
+        Returns:
+            The table containing all exam information
+        Raises:
+            QisNotLoggedInException: When session is not logged in, or turned out to be lost
+                when jumping straight to the exams extract
+            UnexpectedStateException: When navigating to exams extract page failed
+            NoSuchElementException: When unable to locate exams extract data table
+        """
+        navigation = [Selectors.EXAM_ADMINISTRATION_LINK.value,
+                      Selectors.EXAMS_EXTRACT_LINK.value,
+                      Selectors.SHOW_ACCOMPLISHMENTS_LINK.value]
         ee_doc = None  # type: html.HtmlElement
-        for _, ee_doc in self._scraper.navigate([Selectors.EXAM_ADMINISTRATION_LINK.value,
-                                                 Selectors.EXAMS_EXTRACT_LINK.value,
-                                                 Selectors.SHOW_ACCOMPLISHMENTS_LINK.value],
-                                                self._base_url):
-            pass
-        if not self._scraper.number('count(//div[@class = "abstand_pruefinfo"])', document=ee_doc):
-            raise UnexpectedStateException('This may be something, but it\'s definitely NOT the exams extract page.')
+        # Jump straight to the exams extract when its URL is already known for this session
+        destination = self._scraper.cached_destination(navigation, self._base_url)
+        if destination:
+            try:
+                ee_doc = self._scraper.fetch(destination)
+            except ScraperException:
+                ee_doc = None
+            if ee_doc is None or not self._is_exams_extract(ee_doc):
+                self._scraper.forget_destination(navigation, self._base_url)
+                ee_doc = None
+            if self._login_state is False:
+                # QIS showed the login page instead, navigating from there can't lead anywhere
+                raise QisNotLoggedInException('The session was lost')
+        if ee_doc is None:
+            for destination, ee_doc in self._scraper.navigate(navigation, self._base_url):
+                pass
+            if not self._is_exams_extract(ee_doc):
+                raise UnexpectedStateException(
+                    'This may be something, but it\'s definitely NOT the exams extract page.')
+            self._scraper.remember_destination(navigation, self._base_url, destination)
         # Get the table that contains all the exam data
         exam_data_table = self._scraper.find_all(Selectors.EXAMS_EXTRACT_EXAMS_TABLE.value, document=ee_doc)
         if not len(exam_data_table):
             raise NoSuchElementException('Unable to find table containing exams data')
-        return self._scraper.find_all('.//tr', document=exam_data_table[0])
+        return exam_data_table[0]
+
+    def extract_rows(self, exams_table: html.HtmlElement) -> typing.List[html.HtmlElement]:
+        """Get all rows of an exams extract table.
+
+        Args:
+            exams_table: The table as returned by fetch_exams_extract_table
+        Returns:
+            A list of all rows containing exam information
+        """
+        return self._scraper.find_all('.//tr', document=exams_table)
+
+    def _is_exams_extract(self, document: html.HtmlElement) -> bool:
+        """Check whether or not a given document is the exams extract page."""
+        return bool(self._scraper.number('count(//div[@class = "abstand_pruefinfo"])', document=document))
 
     @property
     def exams_extract(self) -> typing.List[models.Exam]:
@@ -154,7 +291,19 @@ class Qis(object):
             A list of Exam instances. See models.map_exam for how
             the result of fetch_exams_extract is mapped.
         """
-        extract_rows = self.fetch_exams_extract()
+        return self.map_exams(self.fetch_exams_extract())
+
+    @staticmethod
+    def map_exams(extract_rows: typing.List[html.HtmlElement]) -> typing.List[models.Exam]:
+        """Map the rows of an exams extract to Exam instances.
+
+        Rows that don't contain exam information are skipped.
+
+        Args:
+            extract_rows: The rows as returned by fetch_exams_extract
+        Returns:
+            A list of Exam instances
+        """
         extract = []
         for row in extract_rows:
             try:
@@ -171,5 +320,9 @@ class Qis(object):
     def base_url(self) -> str:
         return self._base_url
 
+    @property
+    def scraper(self) -> scraper.Scraper:
+        return self._scraper
+
     def __repr__(self) -> str:
         return '{} (base_url={})'.format(self.__class__, self.base_url)
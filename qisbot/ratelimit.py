@@ -0,0 +1,164 @@
+import time
+import typing
+import threading
+import urllib.parse
+from contextlib import contextmanager
+
+
+class _HostBudget(object):
+    """The tokens and in-flight requests of a single host."""
+
+    __slots__ = ('tokens', 'refilled_at', 'in_flight')
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+
+
+class RateLimiter(object):
+    """Limits the requests made to each host, no matter how many Scrapers make them.
+
+    Every host gets a token bucket that refills at rate tokens per second and holds up
+    to burst tokens. A request takes one token and may only start while fewer than
+    max_in_flight requests to the same host are running. Requests that can't start
+    right away wait in line, the time they waited is recorded in the limiter's stats.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 10, max_in_flight: int = 4):
+        """Initialize a new instance.
+
+        Args:
+            rate: Requests per second allowed for each host. When None, only max_in_flight applies.
+            burst: Maximum amount of requests per host that may start at once after a quiet period
+            max_in_flight: Maximum amount of concurrent requests per host. When None, only rate applies.
+        Raises:
+            ValueError: When a limit is not positive
+        """
+        self._condition = threading.Condition()
+        self._budgets = {}  # type: typing.Dict[str, _HostBudget]
+        self.configure(rate, burst, max_in_flight)
+        self.reset_stats()
+
+    def configure(self, rate: float = None, burst: int = None, max_in_flight: int = None) -> ():
+        """Change the limits. Requests that are waiting already are subject to the new limits.
+
+        Args:
+            rate: Requests per second allowed for each host. When None, only max_in_flight applies.
+            burst: Maximum amount of requests per host that may start at once after a quiet period
+            max_in_flight: Maximum amount of concurrent requests per host. When None, only rate applies.
+        Raises:
+            ValueError: When a limit is not positive
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError('rate must be positive')
+        elif burst is not None and burst < 1:
+            raise ValueError('burst must be at least 1')
+        elif max_in_flight is not None and max_in_flight < 1:
+            raise ValueError('max_in_flight must be at least 1')
+        with self._condition:
+            self.rate = rate
+            self.burst = burst or 1
+            self.max_in_flight = max_in_flight
+            for budget in self._budgets.values():
+                budget.tokens = min(budget.tokens, self.burst)
+            self._condition.notify_all()
+
+    def _refill(self, budget: _HostBudget, now: float) -> ():
+        if self.rate is not None:
+            budget.tokens = min(budget.tokens + (now - budget.refilled_at) * self.rate, self.burst)
+        budget.refilled_at = now
+
+    def acquire(self, host: str) -> float:
+        """Wait until a request to the given host may start and account for it.
+
+        Every call has to be followed by a call to release once the request finished.
+
+        Args:
+            host: The host the request goes to
+        Returns:
+            The seconds spent waiting
+        """
+        started_at = time.monotonic()
+        delayed = False
+        with self._condition:
+            budget = self._budgets.get(host)
+            if budget is None:
+                budget = self._budgets[host] = _HostBudget(self.burst)
+            while True:
+                now = time.monotonic()
+                self._refill(budget, now)
+                in_flight_allowed = self.max_in_flight is None or budget.in_flight < self.max_in_flight
+                if in_flight_allowed and (self.rate is None or budget.tokens >= 1):
+                    break
+                delayed = True
+                # Without a free in-flight slot, only a release can change anything
+                self._condition.wait((1 - budget.tokens) / self.rate if in_flight_allowed else None)
+            if self.rate is not None:
+                budget.tokens -= 1
+            budget.in_flight += 1
+            waited = now - started_at if delayed else 0.0
+            self._requests += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            if delayed:
+                self._delayed_requests += 1
+        return waited
+
+    def release(self, host: str) -> ():
+        """Account for a finished request to the given host.
+
+        Args:
+            host: The host the request went to
+        """
+        with self._condition:
+            self._budgets[host].in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def request(self, url: str) -> float:
+        """Wait until a request to the given URL may start and hold its slot while in the context.
+
+        Args:
+            url: The URL to request
+        Yields:
+            The seconds spent waiting
+        """
+        host = urllib.parse.urlsplit(url).netloc
+        waited = self.acquire(host)
+        try:
+            yield waited
+        finally:
+            self.release(host)
+
+    def stats(self) -> typing.Dict[str, typing.Union[int, float]]:
+        """Get statistics of the requests made since the last reset.
+
+        Returns:
+            A dict containing the amount of requests, how many of them had to wait,
+            the total, mean and maximum seconds waited and the requests currently in flight
+        """
+        with self._condition:
+            return {
+                'requests': self._requests,
+                'delayed_requests': self._delayed_requests,
+                'total_wait': self._total_wait,
+                'mean_wait': self._total_wait / self._requests if self._requests else 0.0,
+                'max_wait': self._max_wait,
+                'in_flight': sum(budget.in_flight for budget in self._budgets.values())
+            }
+
+    def reset_stats(self) -> ():
+        with self._condition:
+            self._requests = 0
+            self._delayed_requests = 0
+            self._total_wait = 0.0
+            self._max_wait = 0.0
+
+    def __repr__(self) -> str:
+        return '<{}(rate={}, burst={}, max_in_flight={})>'.format(self.__class__.__name__, self.rate, self.burst,
+                                                                 self.max_in_flight)
+
+
+# Shared by all Scrapers of the process, unless they are given their own
+limiter = RateLimiter()
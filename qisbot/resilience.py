@@ -0,0 +1,167 @@
+import time
+import random
+import typing
+import threading
+
+from qisbot.exceptions import CircuitOpenException
+from qisbot.exceptions import DeadlineExceededException
+
+# Statuses that indicate a temporary problem of the server (or a proxy in front of it)
+TRANSIENT_STATUSES = (502, 503, 504)
+
+
+class Deadline(object):
+    """A point in time an operation, with all the requests it consists of, has to be completed by."""
+
+    def __init__(self, seconds: float):
+        """Initialize a new instance.
+
+        Args:
+            seconds: Seconds from now until the deadline
+        Raises:
+            ValueError: When seconds is not positive
+        """
+        if seconds <= 0:
+            raise ValueError('seconds must be positive')
+        self.expires_at = time.monotonic() + seconds
+
+    @property
+    def remaining(self) -> float:
+        """Seconds left until the deadline, never negative."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining <= 0
+
+    def timeout(self, timeout: float) -> float:
+        """Shorten a timeout to the time left until the deadline.
+
+        Args:
+            timeout: The timeout that would apply without a deadline
+        Returns:
+            The shorter of timeout and the time left
+        Raises:
+            DeadlineExceededException: When the deadline has passed
+        """
+        remaining = self.remaining
+        if remaining <= 0:
+            raise DeadlineExceededException('Deadline exceeded')
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def __repr__(self) -> str:
+        return '<{}(remaining={:.2f}s)>'.format(self.__class__.__name__, self.remaining)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Determine how long to wait before retrying a request, using exponential backoff with full jitter.
+
+    Args:
+        attempt: Number of the retry, starting at 0
+        base: Maximum delay of the first retry
+        cap: Maximum delay of any retry
+    Returns:
+        The delay in seconds
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """Fails requests to a host fast while it appears to be down, instead of tying up workers.
+
+    After failure_threshold consecutive failures the circuit opens and requests are refused
+    for reset_timeout seconds. Afterwards, a single trial request is let through: the circuit
+    closes when it succeeds and opens again when it fails. A trial that ends without telling
+    anything about the host (e.g. an invalid URL) has to be released, so that another one can follow.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        """Initialize a new instance.
+
+        Args:
+            failure_threshold: Consecutive failures after which the circuit opens
+            reset_timeout: Seconds the circuit stays open before a trial request is let through
+        Raises:
+            ValueError: When failure_threshold or reset_timeout is not positive
+        """
+        if failure_threshold < 1:
+            raise ValueError('failure_threshold must be at least 1')
+        elif reset_timeout <= 0:
+            raise ValueError('reset_timeout must be positive')
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None  # type: float
+        self._trial_running = False
+
+    def before_request(self) -> bool:
+        """Check whether a request may be sent.
+
+        Returns:
+            Whether the request is the trial of a half-open circuit. Unless its outcome is recorded,
+            it has to be released with release_trial.
+        Raises:
+            CircuitOpenException: When the circuit is open
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenException('Circuit is open, host is considered to be down')
+            self._trial_running = True
+            return True
+
+    def release_trial(self) -> ():
+        """End the trial request without recording an outcome. The circuit stays half-open for the next one."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self) -> ():
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> ():
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            elif self._trial_running or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def __repr__(self) -> str:
+        return '<{}(state={}, failures={})>'.format(self.__class__.__name__, self.state, self._failures)
+
+
+# Circuit breakers keyed by host, shared by all Scrapers of the process
+_breakers = {}  # type: typing.Dict[str, CircuitBreaker]
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(host: str) -> CircuitBreaker:
+    """Get the circuit breaker of a host, creating it on first use.
+
+    Args:
+        host: The host (including the port, if any)
+    Returns:
+        The host's circuit breaker
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker()
+        return breaker
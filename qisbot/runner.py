@@ -0,0 +1,190 @@
+import time
+import typing
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from qisbot import bot
+from qisbot import config
+from qisbot import events
+from qisbot import dispatch
+from qisbot import persistence
+from qisbot import transport
+from qisbot.exceptions import QisNotLoggedInException
+from qisbot.exceptions import UnexpectedStateException
+
+# Some of qisbot's exceptions don't derive from Exception and have to be caught explicitly
+_refresh_errors = (Exception, QisNotLoggedInException, UnexpectedStateException)
+
+
+class AccountResult(object):
+    """The outcome of refreshing the exams extract of a single account."""
+
+    def __init__(self, config_path: str, account: str = None, emitted_events: typing.List[events.BaseEvent] = None,
+                 error: BaseException = None, duration: float = 0.0, finished_at: float = None):
+        """Initialize a new instance.
+
+        Args:
+            config_path: Path to the account's configuration file
+            account: The account's name, None when the configuration couldn't be loaded
+            emitted_events: The events emitted during the refresh
+            error: The error that caused the refresh to fail
+            duration: Time the refresh took in seconds
+            finished_at: Time (as returned by time.time) the refresh finished. When None, the current time is used.
+        """
+        self.config_path = config_path
+        self.account = account
+        self.events = emitted_events or []
+        self.error = error
+        self.duration = duration
+        self.finished_at = time.time() if finished_at is None else finished_at
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    @property
+    def new_exams(self) -> typing.List[events.NewExamEvent]:
+        return [event for event in self.events if isinstance(event, events.NewExamEvent)]
+
+    @property
+    def changed_exams(self) -> typing.List[events.ExamChangedEvent]:
+        return [event for event in self.events if isinstance(event, events.ExamChangedEvent)]
+
+    def __repr__(self) -> str:
+        return '<{} (account={}, new={}, changed={}, error={!r}, duration={:.2f}s)>'.format(
+            self.__class__.__name__, self.account, len(self.new_exams), len(self.changed_exams), self.error,
+            self.duration)
+
+
+class MultiAccountRunner(object):
+    """Refreshes the exams extracts of multiple accounts concurrently.
+
+    Every account gets its own Bot (and thus its own session and Scraper), while
+    all of them share a single DatabaseManager and NotificationDispatcher. Unless told
+    otherwise, they also share their HTTP connections (but not their cookies). Bots are
+    kept between runs, so that subsequent runs can reuse their sessions.
+
+    Request limits apply to the whole process, which is why only those of the first
+    account are used. Exams of databases created before exams were scoped by account are only adopted when
+    there is a single account, as it can't be told which of multiple accounts they belong to.
+    """
+
+    def __init__(self, config_paths: typing.List[str], database_path: str, max_workers: int = 4,
+                 notify_workers: int = 1, handler_timeout: float = 60.0, share_connections: bool = True):
+        """Initialize a new instance.
+
+        Args:
+            config_paths: Paths to the configuration files of all accounts
+            database_path: Path to the database file shared by all accounts
+            max_workers: Maximum amount of accounts to refresh at the same time
+            notify_workers: Amount of events of all accounts handled at the same time
+            handler_timeout: Seconds a single notification handler may take
+            share_connections: Send the requests of all accounts through a single connection pool,
+                sized to max_workers. When False, every account gets its own pool.
+        Raises:
+            ValueError: When no config paths or database path were provided or max_workers is not positive
+        """
+        if not config_paths:
+            raise ValueError('config_paths must not be None or empty')
+        elif not database_path:
+            raise ValueError('database_path must not be None or empty')
+        elif max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+        self._config_paths = list(config_paths)
+        self._max_workers = max_workers
+        self._db_manager = persistence.DatabaseManager(database_path)
+        self._dispatcher = dispatch.NotificationDispatcher(workers=notify_workers, handler_timeout=handler_timeout)
+        self._http_adapter = transport.TunedHTTPAdapter(pool_maxsize=max_workers) if share_connections else None
+        self._bots = {}  # type: typing.Dict[str, bot.Bot]
+        self._configure_rate_limiter()
+        if len(self._config_paths) > 1 and self._db_manager.fetch_unowned_exam_count():
+            logging.warning('The database holds exams that don\'t belong to any account yet. Run qisbot with the '
+                            'configuration of the account they belong to on its own once, so that it adopts them.')
+
+    def run(self, config_paths: typing.List[str] = None) -> typing.List[AccountResult]:
+        """Refresh the exams extracts of all accounts.
+
+        Args:
+            config_paths: Only refresh the accounts of these configuration files. When None, all accounts are refreshed.
+        Returns:
+            One result per account, in the order of the config paths
+        """
+        config_paths = self._config_paths if config_paths is None else config_paths
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = [executor.submit(self._refresh_account, config_path) for config_path in config_paths]
+            return [future.result() for future in futures]
+
+    def _refresh_account(self, config_path: str) -> AccountResult:
+        """Refresh the exams extract of a single account.
+
+        Args:
+            config_path: Path to the account's configuration file
+        Returns:
+            The result of the refresh. Errors are captured in the result instead of being raised.
+        """
+        started_at = time.monotonic()
+        account = None
+        try:
+            account_bot = self._bot_for(config_path)
+            account = account_bot.account
+            emitted_events = account_bot.refresh_exams_extract()
+        except _refresh_errors as ex:
+            logging.exception('Refreshing the exams extract of {} failed'.format(account or config_path))
+            return AccountResult(config_path, account=account, error=ex, duration=time.monotonic() - started_at)
+        return AccountResult(config_path, account=account, emitted_events=emitted_events,
+                             duration=time.monotonic() - started_at)
+
+    def _configure_rate_limiter(self) -> ():
+        """Apply the request limits of the first account and warn about accounts that configure other ones."""
+        applied_limits = None
+        for config_path in self._config_paths:
+            try:
+                conf = config.QisConfiguration(config_path)
+                limits = bot.rate_limits(conf)
+            except _refresh_errors:
+                # Broken configurations are reported when their account is refreshed
+                continue
+            if applied_limits is None:
+                bot.configure_rate_limiter(conf)
+                applied_limits = limits
+            elif limits != applied_limits:
+                logging.warning('The request limits of {} are ignored, those of the first account apply to all '
+                                'accounts'.format(config_path))
+
+    def _bot_for(self, config_path: str) -> bot.Bot:
+        """Get the Bot for a given account, creating it on first use.
+
+        Args:
+            config_path: Path to the account's configuration file
+        Returns:
+            The account's Bot instance
+        """
+        # Every config path is handled by exactly one worker per run, no locking required
+        if config_path not in self._bots:
+            self._bots[config_path] = bot.Bot(config_path, db_manager=self._db_manager,
+                                              dispatcher=self._dispatcher, http_adapter=self._http_adapter,
+                                              adopt_unowned_exams=len(self._config_paths) == 1,
+                                              apply_rate_limits=False)
+        return self._bots[config_path]
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """Wait for pending notifications of all accounts to be handled and stop notifying.
+
+        Args:
+            timeout: Maximum amount of seconds to wait. Waits indefinitely when None.
+        Returns:
+            True when all notifications were handled, False when the timeout expired first
+        """
+        return self._dispatcher.shutdown(timeout)
+
+    def transfer_stats(self) -> typing.Optional[typing.Dict[str, int]]:
+        """Get the transfer statistics of the shared connection pool, None when connections aren't shared."""
+        return self._http_adapter.stats() if self._http_adapter is not None else None
+
+    @property
+    def config_paths(self) -> typing.List[str]:
+        return list(self._config_paths)
+
+    @property
+    def bots(self) -> typing.List[bot.Bot]:
+        return list(self._bots.values())
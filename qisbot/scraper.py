@@ -1,23 +1,71 @@
+import time
 import typing
+import hashlib
+import threading
+import urllib.parse
 from contextlib import contextmanager
 
 import requests
 import requests.cookies
 from lxml import html
+from lxml import etree
 from lxml.etree import ParseError
 from lxml.etree import XPathEvalError, XPathSyntaxError
 
+from qisbot import metrics
+from qisbot import ratelimit
+from qisbot import resilience
+from qisbot import transport
 from qisbot.exceptions import ScraperException
+from qisbot.exceptions import DeadlineExceededException
 from qisbot.exceptions import NoSuchElementException
+from qisbot.selectors import Selectors
+
+
+def fingerprint(element: html.HtmlElement) -> str:
+    """Calculate a fingerprint of an element's content.
+
+    Only the element's text nodes are considered, with whitespace normalized. Markup and
+    attributes (e.g. links carrying session tokens) don't influence the fingerprint.
+
+    Args:
+        element: The element to calculate the fingerprint of
+    Returns:
+        The fingerprint as hex digest
+    """
+    normalized_text = '\n'.join(' '.join(text.split()) for text in element.itertext() if text.strip())
+    return hashlib.sha256(normalized_text.encode('utf-8')).hexdigest()
 
 
 class Scraper(object):
-    def __init__(self, session: requests.Session = None):
-        self.session = session or requests.Session()
+    # Compiled XPath expressions keyed by expression string, shared by all instances
+    _compiled_xpaths = {}  # type: typing.Dict[str, etree.XPath]
+    _compiled_xpaths_lock = threading.Lock()
+    _compiled_xpaths_hits = 0
+    _compiled_xpaths_misses = 0
+
+    def __init__(self, session: requests.Session = None, rate_limiter: ratelimit.RateLimiter = None,
+                 adapter: transport.TunedHTTPAdapter = None):
+        # Sessions created here get a tuned adapter, which may be shared with other Scrapers to share connections
+        self.session = session or transport.session(adapter)
+        # Shared with all other Scrapers by default, so that the process as a whole stays within its budget
+        self.rate_limiter = rate_limiter or ratelimit.limiter
+        # Connect & read timeout of every request in seconds
+        self.timeout = (10.0, 30.0)  # type: typing.Tuple[float, float]
+        # Transient failures (connection errors, timeouts, 502, 503 & 504) of GET requests are retried
+        self.retries = 2
+        self.retry_backoff = 0.5
+        self._deadline = None  # type: resilience.Deadline
         self._current_document = None  # type: html.HtmlElement
         self._current_location = None  # type: str
         self._current_status = None  # type: int
         self.allow_redirects = True
+        # Callables that get to inspect every fetched response and its parsed document
+        self.fetch_hooks = []  # type: typing.List[typing.Callable[[requests.Response, html.HtmlElement], typing.Any]]
+        # Final URLs of navigations, keyed by start URL and XPaths. Values are tuples of session ID and URL.
+        self._destinations = {}  # type: typing.Dict[typing.Tuple[str, typing.Tuple[str, ...]], typing.Tuple[str, str]]
+        # Validators (ETag & Last-Modified) and documents of responses that provided them, keyed by URL
+        self._validated_documents = {}  # type: typing.Dict[str, typing.Tuple[str, str, html.HtmlElement]]
 
     @contextmanager
     def permit_redirects(self, permit=True):
@@ -33,9 +81,48 @@ class Scraper(object):
         yield self
         self.allow_redirects = default_value
 
+    @contextmanager
+    def deadline(self, seconds: float):
+        """Complete all requests made in a context within a given amount of seconds.
+
+        Timeouts of requests are shortened to the time left, retries that wouldn't finish
+        in time are skipped. Nested deadlines can only shorten the outer one.
+
+        Args:
+            seconds: Seconds from now until the deadline
+        Yields:
+            This Scraper instance
+        """
+        outer_deadline = self._deadline
+        deadline = resilience.Deadline(seconds)
+        if outer_deadline is not None and outer_deadline.expires_at < deadline.expires_at:
+            deadline = outer_deadline
+        self._deadline = deadline
+        try:
+            yield self
+        finally:
+            self._deadline = outer_deadline
+
+    def request_timeout(self) -> typing.Tuple[float, float]:
+        """Get the connect & read timeout for a request that starts now.
+
+        Returns:
+            The timeouts, shortened to the time left until the current deadline
+        Raises:
+            DeadlineExceededException: When the current deadline has passed
+        """
+        if self._deadline is None:
+            return self.timeout
+        return self._deadline.timeout(self.timeout[0]), self._deadline.timeout(self.timeout[1])
+
+    @metrics.timed('fetch')
     def fetch(self, url: str) -> html.HtmlElement:
         """Fetch a web page from a given URL.
 
+        When the server provided validators for a URL before, the request is made conditional.
+        If the server then responds with 304 Not Modified, the previously parsed document is
+        returned and status is 304.
+
         Args:
             url: Target URL to fetch from
         Returns:
@@ -46,21 +133,120 @@ class Scraper(object):
         """
         if not url:
             raise ValueError('URL must not be None or empty')
+        headers = {}
+        etag, last_modified, validated_document = self._validated_documents.get(url, (None, None, None))
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        response = self._get(url, headers)
         try:
-            response = self.session.get(url, allow_redirects=self.allow_redirects)
             response.raise_for_status()
         except requests.RequestException as ex:
             raise ScraperException from ex
-        try:
-            document = html.fromstring(response.content)  # type: html.HtmlElement
-            document.make_links_absolute(base_url=url, resolve_base_href=True)
-        except ParseError as err:
-            raise ScraperException from err
+        if response.status_code == 304 and validated_document is not None:
+            document = validated_document
+        else:
+            try:
+                with metrics.timer('parse'):
+                    document = html.fromstring(response.content)  # type: html.HtmlElement
+                    document.make_links_absolute(base_url=url, resolve_base_href=True)
+            except ParseError as err:
+                raise ScraperException from err
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._validated_documents[url] = (etag, last_modified, document)
+            else:
+                self._validated_documents.pop(url, None)
         self._current_status = response.status_code
         self._current_document = document
         self._current_location = url
+        for hook in self.fetch_hooks:
+            hook(response, document)
         return document
 
+    def _get(self, url: str, headers: typing.Dict[str, str]) -> requests.Response:
+        """Perform a GET request, retrying transient failures with jittered exponential backoff.
+
+        Args:
+            url: Target URL of the request
+            headers: Headers to send along
+        Returns:
+            The response, which may still carry an error status
+        Raises:
+            ScraperException: When the request failed for good
+            DeadlineExceededException: When the current deadline passed or wouldn't leave time for a retry
+            CircuitOpenException: When the host is considered to be down
+        """
+        breaker = resilience.breaker_for(urllib.parse.urlsplit(url).netloc)
+        attempt = 0
+        while True:
+            trial = breaker.before_request()
+            try:
+                with self.rate_limiter.request(url):
+                    response = self.session.get(url, allow_redirects=self.allow_redirects, headers=headers,
+                                                timeout=self.request_timeout())
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                error = ex
+            except BaseException as ex:
+                # E.g. an invalid URL or a passed deadline, the host is not to blame
+                if trial:
+                    breaker.release_trial()
+                if isinstance(ex, requests.RequestException):
+                    raise ScraperException from ex
+                raise
+            else:
+                if response.status_code not in resilience.TRANSIENT_STATUSES:
+                    breaker.record_success()
+                    return response
+                error = requests.HTTPError('{} Server Error for url: {}'.format(response.status_code, url),
+                                           response=response)
+            breaker.record_failure()
+            if attempt >= self.retries:
+                raise ScraperException from error
+            delay = resilience.backoff_delay(attempt, base=self.retry_backoff)
+            if self._deadline is not None and delay >= self._deadline.remaining:
+                raise DeadlineExceededException('No time left to retry {}'.format(url)) from error
+            time.sleep(delay)
+            attempt += 1
+
+    @classmethod
+    def compile(cls, xpath: str) -> etree.XPath:
+        """Get the compiled form of an XPath expression.
+
+        Every expression is only compiled once, subsequent calls return the cached result.
+
+        Args:
+            xpath: The XPath expression to compile
+        Returns:
+            The compiled expression, which can be called with the document to evaluate it on
+        Raises:
+            XPathSyntaxError: When the expression is invalid
+        """
+        compiled_xpath = cls._compiled_xpaths.get(xpath)
+        with cls._compiled_xpaths_lock:
+            if compiled_xpath is not None:
+                Scraper._compiled_xpaths_hits += 1
+                return compiled_xpath
+            Scraper._compiled_xpaths_misses += 1
+        # Compiling twice in a race is harmless, both results are equivalent
+        compiled_xpath = etree.XPath(xpath)
+        cls._compiled_xpaths[xpath] = compiled_xpath
+        return compiled_xpath
+
+    @classmethod
+    def xpath_cache_info(cls) -> typing.Dict[str, int]:
+        """Get statistics of the compiled XPath cache.
+
+        Returns:
+            A dict containing the amount of cache hits, misses and cached expressions
+        """
+        return {
+            'hits': cls._compiled_xpaths_hits,
+            'misses': cls._compiled_xpaths_misses,
+            'size': len(cls._compiled_xpaths)
+        }
+
     def select(self, xpath: str, document: html.HtmlElement = None) -> typing.Union[
         bool, float, str, typing.List[html.HtmlElement]]:
         """Perform a selection on a given HTML document.
@@ -89,7 +275,7 @@ class Scraper(object):
             # Implies that self._current_document is not None
             document = self._current_document
         try:
-            result = document.xpath(xpath)
+            result = self.compile(xpath)(document)
         except (XPathEvalError, XPathSyntaxError) as err:
             raise ScraperException(xpath) from err
         return result
@@ -186,42 +372,100 @@ class Scraper(object):
             raise ValueError('No XPath(s) for selection provided')
         if not url:
             raise ValueError('No URL provided to start navigation at')
-        document = self.fetch(url)
-        link = None  # type: str
-        for xpath in xpaths:
-            selection = self.select(xpath, document)
-            if isinstance(selection, str):
-                # Selection is string (most likely an URL)
-                link = selection
-            elif isinstance(selection, html.HtmlElement):
-                # Selection is an HTML element that SHOULD contain a href attribute
-                try:
-                    link = selection.get('href')
-                except KeyError as err:
-                    raise ScraperException from err
-            elif isinstance(selection, list):
-                # Selection is a list of something
-                if not len(selection):
-                    raise NoSuchElementException(xpath)
-                elem = selection[0]
-                if isinstance(elem, str):
-                    link = elem
-                elif isinstance(elem, html.HtmlElement):
+        # Timed as a whole, including the time the caller takes between documents
+        with metrics.timer('navigate'):
+            document = self.fetch(url)
+            link = None  # type: str
+            for xpath in xpaths:
+                selection = self.select(xpath, document)
+                if isinstance(selection, str):
+                    # Selection is string (most likely an URL)
+                    link = selection
+                elif isinstance(selection, html.HtmlElement):
+                    # Selection is an HTML element that SHOULD contain a href attribute
                     try:
-                        link = elem.get('href')
+                        link = selection.get('href')
                     except KeyError as err:
                         raise ScraperException from err
+                elif isinstance(selection, list):
+                    # Selection is a list of something
+                    if not len(selection):
+                        raise NoSuchElementException(xpath)
+                    elem = selection[0]
+                    if isinstance(elem, str):
+                        link = elem
+                    elif isinstance(elem, html.HtmlElement):
+                        try:
+                            link = elem.get('href')
+                        except KeyError as err:
+                            raise ScraperException from err
+                    else:
+                        # Every other type cannot be used for navigation
+                        raise ScraperException('Cannot perform navigation with result of type {} from XPath "{}"'
+                                               .format(type(selection), xpath))
                 else:
                     # Every other type cannot be used for navigation
                     raise ScraperException('Cannot perform navigation with result of type {} from XPath "{}"'
                                            .format(type(selection), xpath))
-            else:
-                # Every other type cannot be used for navigation
-                raise ScraperException('Cannot perform navigation with result of type {} from XPath "{}"'
-                                       .format(type(selection), xpath))
-            document = self.fetch(link)
-            yield link, document
-        return link, document
+                document = self.fetch(link)
+                yield link, document
+            return link, document
+
+    def cached_destination(self, xpaths: typing.List[str], url: str) -> typing.Optional[str]:
+        """Get the final URL a navigation resolved to earlier in the current session.
+
+        Links on some pages carry session-specific tokens, which is why destinations
+        are only valid for the session they were resolved in.
+
+        Args:
+            xpaths: The XPath expressions of the navigation
+            url: The URL the navigation started at
+        Returns:
+            The navigation's final URL or None when it is not known for the current session
+        """
+        session_id, destination = self._destinations.get((url, tuple(xpaths)), (None, None))
+        if session_id is None or session_id != self.cookies.get('JSESSIONID'):
+            return None
+        return destination
+
+    def remember_destination(self, xpaths: typing.List[str], url: str, destination: str) -> ():
+        """Remember the final URL a navigation resolved to in the current session.
+
+        Args:
+            xpaths: The XPath expressions of the navigation
+            url: The URL the navigation started at
+            destination: The navigation's final URL
+        """
+        self._destinations[(url, tuple(xpaths))] = (self.cookies.get('JSESSIONID'), destination)
+
+    def forget_destination(self, xpaths: typing.List[str], url: str) -> ():
+        """Forget the final URL of a navigation, e.g. because it doesn't lead to the expected page anymore.
+
+        Args:
+            xpaths: The XPath expressions of the navigation
+            url: The URL the navigation started at
+        """
+        self._destinations.pop((url, tuple(xpaths)), None)
+
+    @property
+    def destinations(self) -> typing.List[typing.Tuple[str, typing.List[str], str, str]]:
+        """All remembered navigations as tuples of start URL, XPaths, session ID and final URL."""
+        return [(url, list(xpaths), session_id, destination)
+                for (url, xpaths), (session_id, destination) in self._destinations.items()]
+
+    @destinations.setter
+    def destinations(self, destinations: typing.Iterable[typing.Tuple[str, typing.List[str], str, str]]) -> ():
+        for url, xpaths, session_id, destination in destinations:
+            self._destinations[(url, tuple(xpaths))] = (session_id, destination)
+
+    def transfer_stats(self) -> typing.Optional[typing.Dict[str, int]]:
+        """Get the transfer statistics of the session's adapter.
+
+        Returns:
+            The statistics (see TunedHTTPAdapter.stats) or None when the session doesn't use a TunedHTTPAdapter
+        """
+        adapter = self.session.get_adapter('https://')
+        return adapter.stats() if isinstance(adapter, transport.TunedHTTPAdapter) else None
 
     @property
     def status(self) -> typing.Optional[float]:
@@ -245,3 +489,8 @@ class Scraper(object):
 
     def __repr__(self) -> str:
         return '<{}(location={}, status={})>'.format(self.__class__, self.location, self.status)
+
+
+# All non-trivial expressions are known upfront
+for _selector in Selectors:
+    Scraper.compile(_selector.value)
@@ -4,6 +4,7 @@ import enum
 class Selectors(enum.Enum):
     """Holds all non-trivial XPath expressions."""
     LOGIN_ACTION_LINK = '//*[@id="wrapper"]/div[3]/a[2]'
+    LOGIN_PASSWORD_INPUT = '//form//input[@type = "password"]'
     EXAM_ADMINISTRATION_LINK = '//a[text() = "Prüfungsverwaltung" or text() = "Administration of exams"]'
     EXAMS_EXTRACT_LINK = '//a[text() = "Notenspiegel" or text() = "Exams Extract"]'
     SHOW_ACCOMPLISHMENTS_LINK = '//a[@title = "Leistungen anzeigen"]'
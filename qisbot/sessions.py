@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import typing
+import logging
+
+import requests.cookies
+
+from qisbot.exceptions import PersistenceException
+
+
+class SessionStore(object):
+    """Keeps a session's cookies on disk, so that subsequent runs can reuse a live server session.
+
+    The store is written with permissions that only allow the current user to read it,
+    as its cookies grant access to the QIS account just like the password does.
+    """
+
+    def __init__(self, path: str):
+        """Initialize a new instance.
+
+        Args:
+            path: Path to the file to store the session in
+        Raises:
+            ValueError: When no path was provided
+        """
+        if not path:
+            raise ValueError('path must not be None or empty')
+        self._path = path
+        # Navigation destinations of the last restored session (see Scraper.destinations)
+        self.destinations = []  # type: typing.List[typing.Tuple[str, typing.List[str], str, str]]
+
+    def save(self, cookies: requests.cookies.RequestsCookieJar, validated_at: float = None,
+             destinations: typing.List[typing.Tuple[str, typing.List[str], str, str]] = None) -> ():
+        """Save the given cookies, replacing any previously stored session.
+
+        Args:
+            cookies: The cookies of the session
+            validated_at: Time (as returned by time.time) the session was last known to be
+                logged in. When None, the current time is used.
+            destinations: Navigation destinations resolved in the session (see Scraper.destinations)
+        Raises:
+            PersistenceException: When writing the store failed
+        """
+        state = {
+            'validated_at': time.time() if validated_at is None else validated_at,
+            'cookies': [self._dump_cookie(cookie) for cookie in cookies],
+            'destinations': destinations or []
+        }
+        temp_path = '{}.tmp'.format(self._path)
+        try:
+            # Create the file with restricted permissions right away instead of chmod-ing it afterwards
+            handle = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(handle, 'w') as store_file:
+                json.dump(state, store_file)
+            os.replace(temp_path, self._path)
+        except OSError as err:
+            raise PersistenceException('Unable to save session to {}'.format(self._path)) from err
+
+    def restore(self, cookies: requests.cookies.RequestsCookieJar, max_age: float = None) -> bool:
+        """Restore a stored session into the given cookie jar.
+
+        The session's navigation destinations are made available as self.destinations.
+
+        Args:
+            cookies: The cookie jar to restore the session's cookies into
+            max_age: Maximum time in seconds since the session was last validated.
+                Older sessions have most likely expired server-side and are not restored.
+        Returns:
+            True when a session was restored, otherwise False
+        """
+        try:
+            with open(self._path, 'r') as store_file:
+                state = json.load(store_file)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as ex:
+            logging.warning('Ignoring unreadable session store {}: {}'.format(self._path, ex))
+            return False
+        if max_age is not None and time.time() - state.get('validated_at', 0) > max_age:
+            return False
+        for cookie in state.get('cookies', []):
+            cookies.set_cookie(requests.cookies.create_cookie(**cookie))
+        self.destinations = [tuple(destination) for destination in state.get('destinations', [])]
+        return True
+
+    def clear(self) -> ():
+        """Remove the stored session."""
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _dump_cookie(cookie) -> typing.Dict[str, typing.Any]:
+        """Convert a cookie to the keyword arguments of requests.cookies.create_cookie."""
+        rest = {}
+        if cookie.has_nonstandard_attr('HttpOnly'):
+            rest['HttpOnly'] = cookie.get_nonstandard_attr('HttpOnly')
+        return {
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path,
+            'secure': cookie.secure,
+            'expires': cookie.expires,
+            'rest': rest
+        }
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __repr__(self) -> str:
+        return '<{}(path={})>'.format(self.__class__.__name__, self.path)
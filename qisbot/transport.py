@@ -0,0 +1,115 @@
+import typing
+import threading
+
+import requests
+import requests.adapters
+
+
+class TunedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """An HTTPAdapter with pool sizes matched to the amount of concurrent requests, which records transfer statistics.
+
+    Connection pools live in the adapter while cookies live in the session, so a single
+    adapter can be mounted on the sessions of many accounts to share their connections
+    without sharing their logins.
+    """
+
+    def __init__(self, pool_connections: int = 1, pool_maxsize: int = 2, pool_block: bool = False):
+        """Initialize a new instance.
+
+        Args:
+            pool_connections: Amount of hosts to keep a connection pool for
+            pool_maxsize: Amount of connections kept open per host, should match the amount of concurrent requests
+            pool_block: Wait for a free connection instead of opening (and then discarding) an extra one
+        Raises:
+            ValueError: When pool_connections or pool_maxsize is not positive
+        """
+        if pool_connections < 1:
+            raise ValueError('pool_connections must be at least 1')
+        elif pool_maxsize < 1:
+            raise ValueError('pool_maxsize must be at least 1')
+        # Retries are up to the Scraper, which knows which requests are safe to retry
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0,
+                         pool_block=pool_block)
+        self._stats_lock = threading.Lock()
+        self._responses = 0
+        self._compressed_responses = 0
+        self._wire_bytes = 0
+        self._content_bytes = 0
+
+    def record(self, response: requests.Response) -> ():
+        """Record the transfer of a response, reading its content if that didn't happen yet.
+
+        Args:
+            response: The response to record
+        """
+        content_bytes = len(response.content or b'')
+        # The raw response knows how many (possibly compressed) bytes went over the wire
+        tell = getattr(response.raw, 'tell', None)
+        wire_bytes = tell() if callable(tell) else content_bytes
+        compressed = response.headers.get('Content-Encoding', '').lower() in ('gzip', 'deflate')
+        with self._stats_lock:
+            self._responses += 1
+            self._compressed_responses += int(compressed)
+            self._wire_bytes += wire_bytes
+            self._content_bytes += content_bytes
+
+    def stats(self) -> typing.Dict[str, int]:
+        """Get statistics of all transfers made through this adapter.
+
+        Returns:
+            A dict containing the amount of responses, how many of them were compressed, the bytes
+            transferred over the wire and after decompression, and the amount of connections opened
+            and requests sent, whose difference is the amount of times a connection was reused
+        """
+        connections = requests_sent = 0
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+        with self._stats_lock:
+            return {
+                'responses': self._responses,
+                'compressed_responses': self._compressed_responses,
+                'wire_bytes': self._wire_bytes,
+                'content_bytes': self._content_bytes,
+                'connections': connections,
+                'requests': requests_sent,
+                'reused_connections': max(requests_sent - connections, 0)
+            }
+
+
+def mount(session: requests.Session, adapter: TunedHTTPAdapter) -> requests.Session:
+    """Make a session send all of its requests through an adapter and record them.
+
+    Also makes sure the session keeps connections alive and accepts compressed responses.
+
+    Args:
+        session: The session to configure
+        adapter: The adapter to use, possibly shared with other sessions
+    Returns:
+        The session
+    """
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    accepted_encodings = [encoding.strip() for encoding in session.headers.get('Accept-Encoding', '').split(',')]
+    for encoding in ('gzip', 'deflate'):
+        if encoding not in accepted_encodings:
+            accepted_encodings.append(encoding)
+    session.headers['Accept-Encoding'] = ', '.join(encoding for encoding in accepted_encodings if encoding)
+    session.headers['Connection'] = 'keep-alive'
+    # Response hooks also see every response of a redirect chain
+    session.hooks['response'].append(lambda response, *args, **kwargs: adapter.record(response))
+    return session
+
+
+def session(adapter: TunedHTTPAdapter = None) -> requests.Session:
+    """Create a new session that uses a tuned adapter.
+
+    Args:
+        adapter: The adapter to use. When None, the session gets an adapter of its own.
+    Returns:
+        The new session
+    """
+    return mount(requests.Session(), adapter or TunedHTTPAdapter())
@@ -1,14 +1,13 @@
 #!/usr/bin/env python
 
 import sys
+import signal
 import os.path
 import logging
 import logging.config
 import argparse
 
-from qisbot.bot import Bot
-from qisbot.notifies.email import test_connection
-
+# Every command imports what it needs itself, so that none of them waits for the imports of all the others
 _root_path = os.path.join(os.path.abspath(os.path.dirname(__file__)))
 
 
@@ -23,6 +22,23 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument('--force-refresh', '-f', default=False, action='store_true',
                         help='Force a refresh of exams extract')
     parser.add_argument('--test-email', default=False, action='store_true', help='Test the email configuration')
+    parser.add_argument('--accounts', type=str, nargs='+', metavar='CONFIG',
+                        help='Refresh the exams extracts of multiple accounts, one configuration file per account')
+    parser.add_argument('--workers', '-w', type=int, default=4,
+                        help='Maximum amount of accounts to refresh concurrently (used with --accounts)')
+    parser.add_argument('--daemon', default=False, action='store_true',
+                        help='Keep running and refresh the exams extracts on an adaptive schedule')
+    parser.add_argument('--export', type=str, choices=['csv', 'ndjson', 'table'],
+                        help='Export the exams of all accounts from the database, without refreshing them')
+    parser.add_argument('--output', '-o', type=str, help='File to export to instead of stdout (used with --export)')
+    parser.add_argument('--analytics', default=False, action='store_true',
+                        help='Print grade analytics of all accounts as JSON, without refreshing them')
+    parser.add_argument('--account', type=str,
+                        help='Only export or analyze the exams of this account (used with --export and --analytics)')
+    parser.add_argument('--semester', type=str, help='Only export the exams of this semester (used with --export)')
+    parser.add_argument('--status', type=str, help='Only export the exams with this status (used with --export)')
+    parser.add_argument('--stats', nargs='?', const='text', choices=['text', 'json', 'prometheus'],
+                        help='Print how long the phases of the run took (default format: text)')
     parser.add_argument('--log-config', type=str, default=os.path.join(_root_path, 'logging.ini'),
                         help='Path to the logging configuration file')
     return parser.parse_args()
@@ -40,19 +56,118 @@ def setup_logging(args: argparse.Namespace):
         logging.info('Using basic logging configuration. Logging to {}'.format(logfile_path))
 
 
+def print_stats(args: argparse.Namespace):
+    from qisbot import metrics
+    stats_format = getattr(args, 'stats')
+    if stats_format == 'json':
+        print(metrics.registry.to_json())
+    elif stats_format == 'prometheus':
+        print(metrics.registry.to_prometheus(), end='')
+    elif stats_format:
+        print(metrics.registry.breakdown())
+
+
+def refresh_accounts(args: argparse.Namespace) -> int:
+    from qisbot import ratelimit
+    from qisbot.runner import MultiAccountRunner
+    runner = MultiAccountRunner(getattr(args, 'accounts'), getattr(args, 'database'),
+                                max_workers=getattr(args, 'workers'))
+    results = runner.run()
+    runner.shutdown()
+    logging.info('Rate limiter: {}'.format(ratelimit.limiter.stats()))
+    logging.info('Transfers: {}'.format(runner.transfer_stats()))
+    for result in results:
+        if result.succeeded:
+            print('[*] {}: {} new, {} changed ({:.2f}s)'.format(result.account, len(result.new_exams),
+                                                               len(result.changed_exams), result.duration))
+        else:
+            print('[x] {}: {}'.format(result.account or result.config_path, result.error))
+    print_stats(args)
+    return 0 if all(result.succeeded for result in results) else 1
+
+
+def run_daemon(args: argparse.Namespace) -> int:
+    from qisbot.daemon import Daemon
+    from qisbot.runner import MultiAccountRunner
+    runner = MultiAccountRunner(getattr(args, 'accounts') or [getattr(args, 'config')], getattr(args, 'database'),
+                                max_workers=getattr(args, 'workers'))
+    daemon = Daemon(runner)
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: daemon.stop())
+    logging.info('Starting daemon for {} account(s)'.format(len(runner.config_paths)))
+    daemon.run_forever()
+    return 0
+
+
+def export_exams(args: argparse.Namespace) -> int:
+    from qisbot import export
+    from qisbot.persistence import DatabaseManager
+    db_manager = DatabaseManager(getattr(args, 'database'))
+    filters = {name: getattr(args, name) for name in ('account', 'semester', 'status')}
+    try:
+        if getattr(args, 'output'):
+            with open(getattr(args, 'output'), 'w', newline='', encoding='utf-8') as output:
+                count = export.export(db_manager, output, getattr(args, 'export'), **filters)
+        else:
+            count = export.export(db_manager, sys.stdout, getattr(args, 'export'), **filters)
+    finally:
+        db_manager.close()
+    logging.info('Exported {} exam(s)'.format(count))
+    return 0
+
+
+def print_analytics(args: argparse.Namespace) -> int:
+    import json
+    from qisbot import analytics
+    from qisbot.persistence import DatabaseManager
+    db_manager = DatabaseManager(getattr(args, 'database'))
+    try:
+        if getattr(args, 'account'):
+            report = analytics.account_report(db_manager, getattr(args, 'account'))
+        else:
+            report = analytics.cohort_report(db_manager)
+    finally:
+        db_manager.close()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def check_email_configuration(args: argparse.Namespace) -> int:
+    from qisbot.config import QisConfiguration
+    from qisbot.notifies.email import test_connection
+    if test_connection(QisConfiguration(getattr(args, 'config'))):
+        print('[*] I was able to perform a login using the provided E-Mail configuration.')
+        return 0
+    print('[x] I wasn\'t able to login using the provided E-Mail configuration.')
+    return 2
+
+
 if __name__ == '__main__':
     arguments = parse_arguments()
-    bot = Bot(config_path=getattr(arguments, 'config'), database_path=getattr(arguments, 'database'))
-    setup_logging(arguments)
+    if getattr(arguments, 'daemon'):
+        setup_logging(arguments)
+        sys.exit(run_daemon(arguments))
+    if getattr(arguments, 'accounts'):
+        setup_logging(arguments)
+        sys.exit(refresh_accounts(arguments))
+    if getattr(arguments, 'export'):
+        setup_logging(arguments)
+        sys.exit(export_exams(arguments))
+    if getattr(arguments, 'analytics'):
+        setup_logging(arguments)
+        sys.exit(print_analytics(arguments))
     if getattr(arguments, 'test_email'):
-        if test_connection(bot.config):
-            print('[*] I was able to perform a login using the provided E-Mail configuration.')
-            sys.exit(0)
-        else:
-            print('[x] I wasn\'t able to login using the provided E-Mail configuration.')
-            sys.exit(2)
+        setup_logging(arguments)
+        sys.exit(check_email_configuration(arguments))
+    from qisbot.bot import Bot
+    bot = Bot(config_path=getattr(arguments, 'config'), database_path=getattr(arguments, 'database'),
+              adopt_unowned_exams=True)
+    setup_logging(arguments)
     if getattr(arguments, 'force_refresh'):
         # This will just perform any actions provided by subscribers of new/changed exam events
         bot.refresh_exams_extract()
     if getattr(arguments, 'print'):
         bot.print_exams_extract(force_refresh=getattr(arguments, 'force_refresh'))
+    # Notifications are sent in the background, don't exit before they are
+    bot.shutdown()
+    print_stats(arguments)
@@ -0,0 +1,18 @@
+from qisbot import models
+
+
+def make_exam(exam_id, **values) -> models.Exam:
+    """Create an exam with an ID, a name derived from it and the given values, all other values are None.
+
+    Args:
+        exam_id: The exam's ID, converted to a string as QIS shows it
+        values: Values of ExamData fields, keyed by field name
+    Returns:
+        The exam
+    """
+    exam = models.Exam()
+    exam.id = str(exam_id)
+    exam.name = 'Exam {}'.format(exam_id)
+    for name, value in values.items():
+        setattr(exam, name, value)
+    return exam
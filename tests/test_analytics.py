@@ -0,0 +1,131 @@
+import unittest
+import functools
+
+from qisbot import analytics
+from qisbot import persistence
+from tests import helpers
+
+
+# Exams of the current semester worth 5 ECTS, which the student registered for, unless told otherwise
+make_exam = functools.partial(helpers.make_exam, attempt='1', semester='SoSe 17', ects='5,0', status='angemeldet')
+
+
+class TestExamArrays(unittest.TestCase):
+    def setUp(self):
+        self.arrays = analytics.ExamArrays([
+            make_exam(1, semester='WiSe 16/17', grade='1,7', status='bestanden'),
+            make_exam(2, grade='5,0', status='nicht bestanden'),
+            make_exam(3, ects='7,5', status='bestanden'),
+            make_exam(4, ects=None)
+        ])
+
+    def test_parsing(self):
+        self.assertEqual(len(self.arrays), 4)
+        self.assertEqual(self.arrays.grades[0], 1.7)
+        self.assertEqual(self.arrays.ects[2], 7.5)
+        self.assertEqual(list(self.arrays.passed), [True, False, True, False])
+        self.assertEqual(list(self.arrays.failed), [False, True, False, False])
+
+    def test_semester_sums(self):
+        semesters, sums = self.arrays.semester_sums()
+        self.assertEqual(semesters, ['SoSe 17', 'WiSe 16/17'])
+        sums = dict(zip(analytics.AGGREGATES, sums[:, 0]))
+        self.assertEqual(sums['exams'], 3)
+        self.assertEqual(sums['passed'], 1)
+        self.assertEqual(sums['failed'], 1)
+        self.assertEqual(sums['ects_earned'], 7.5)
+        # Passed without a grade and failed exams don't count towards the GPA
+        self.assertEqual(sums['graded_ects'], 0)
+
+    def test_grade_counts(self):
+        self.assertEqual(self.arrays.grade_counts(), {1.7: 1, 5.0: 1})
+
+    def test_no_exams(self):
+        arrays = analytics.ExamArrays([])
+        self.assertEqual(arrays.semester_sums()[0], [])
+        self.assertEqual(arrays.grade_counts(), {})
+
+
+class TestAggregateChanges(unittest.TestCase):
+    def test_changed_exam(self):
+        before = [make_exam(1)]
+        after = [make_exam(1, grade='2,0', status='bestanden')]
+        semester_changes, grade_count_changes = analytics.aggregate_changes(before, after)
+        self.assertEqual(semester_changes, {'SoSe 17': [0, 1, 0, 5.0, 5.0, 10.0]})
+        self.assertEqual(grade_count_changes, {2.0: 1})
+
+    def test_unchanged_semesters_are_left_out(self):
+        self.assertEqual(analytics.aggregate_changes([make_exam(1, semester='SoSe 17')],
+                                                     [make_exam(1, semester='WiSe 17/18')])[0],
+                         {'SoSe 17': [-1, 0, 0, 0, 0, 0], 'WiSe 17/18': [1, 0, 0, 0, 0, 0]})
+        self.assertEqual(analytics.aggregate_changes([make_exam(1)], [make_exam(1)]), ({}, {}))
+
+
+class TestReports(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+        self.db_manager.apply_exam_changes('alice', [
+            make_exam(1, semester='WiSe 16/17', grade='1,7', status='bestanden'),
+            make_exam(2, grade='5,0', status='nicht bestanden'),
+            make_exam(3, ects='10,0')
+        ], [])
+
+    def tearDown(self):
+        self.db_manager.close()
+
+    def assertAggregatesRebuildable(self, account: str):
+        """Incrementally maintained aggregates must equal those calculated from scratch."""
+        aggregates = self.db_manager.fetch_aggregates(account)
+        grade_counts = self.db_manager.fetch_grade_counts(account)
+        self.db_manager._rebuild_aggregates(account)
+        self.assertEqual(self.db_manager.fetch_aggregates(account), aggregates)
+        self.assertEqual(self.db_manager.fetch_grade_counts(account), grade_counts)
+
+    def test_account_report(self):
+        report = analytics.account_report(self.db_manager, 'alice')
+        self.assertEqual(report['exams'], 3)
+        self.assertEqual(report['pass_rate'], 0.5)
+        self.assertEqual(report['ects_earned'], 5.0)
+        # Chronologically, not alphabetically
+        self.assertEqual(report['ects_per_semester'], [('WiSe 16/17', 5.0), ('SoSe 17', 0.0)])
+        self.assertAlmostEqual(report['gpa'], 1.7)
+        self.assertEqual(report['grade_distribution'], [(1.7, 1), (5.0, 1)])
+
+    def test_incremental_changes(self):
+        self.db_manager.apply_exam_changes('alice', [make_exam(4, grade='1,0', status='bestanden')],
+                                           [make_exam(3, ects='10,0', grade='2,3', status='bestanden')])
+        self.db_manager.update_exam('2', {'grade': '4,0', 'status': 'bestanden'}, account='alice')
+        report = analytics.account_report(self.db_manager, 'alice')
+        self.assertEqual((report['exams'], report['passed'], report['failed']), (4, 4, 0))
+        self.assertEqual(report['ects_earned'], 25.0)
+        self.assertAlmostEqual(report['gpa'], (1.7 * 5 + 4.0 * 5 + 2.3 * 10 + 1.0 * 5) / 25)
+        self.assertEqual(report['grade_distribution'], [(1.0, 1), (1.7, 1), (2.3, 1), (4.0, 1)])
+        self.assertAggregatesRebuildable('alice')
+
+    def test_exam_listed_twice(self):
+        self.db_manager.apply_exam_changes('alice', [make_exam(4)], [make_exam(4, grade='1,0', status='bestanden')])
+        self.assertEqual(analytics.account_report(self.db_manager, 'alice')['exams'], 4)
+        self.assertAggregatesRebuildable('alice')
+
+    def test_failed_changes_are_not_aggregated(self):
+        with self.assertRaises(persistence.PersistenceException):
+            self.db_manager.apply_exam_changes('alice', [make_exam(5, grade='1,0'), make_exam(1)], [])
+        self.assertAggregatesRebuildable('alice')
+
+    def test_cohort_report(self):
+        self.db_manager.apply_exam_changes('bob', [make_exam(1, grade='1,0', status='bestanden')], [])
+        report = analytics.cohort_report(self.db_manager)
+        self.assertEqual(report['accounts'], 2)
+        self.assertEqual(report['exams'], 4)
+        self.assertEqual(report['ects_per_semester'], [('WiSe 16/17', 5.0), ('SoSe 17', 5.0)])
+        self.assertAlmostEqual(report['gpa'], 1.35)
+        self.assertAlmostEqual(report['gpa_mean'], 1.35)
+        self.assertEqual((report['gpa_best'], report['gpa_worst']), (1.0, 1.7))
+
+    def test_empty(self):
+        report = analytics.cohort_report(persistence.DatabaseManager(':memory:'))
+        self.assertEqual((report['accounts'], report['exams'], report['gpa']), (0, 0, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from lxml import html
+
+from qisbot import bot
+from qisbot import events
+from qisbot import models
+from qisbot.exceptions import QisNotLoggedInException
+
+_config = """[QIS]
+username = alice
+password = secret
+baseUrl = http://doesnt-even-matt.er/
+
+[NOTIFICATIONS]
+workers = 0
+"""
+
+
+def make_exams_table(*rows: tuple) -> html.HtmlElement:
+    """Build an exams extract table with one row per tuple of ExamData values."""
+    cells_per_row = []
+    for row in rows:
+        cells = ''.join('<td>{}</td>'.format(value) for value in row)
+        cells_per_row.append('<tr>{}</tr>'.format(cells))
+    return html.fromstring('<table><tr><th>Header</th></tr>{}</table>'.format(''.join(cells_per_row)))
+
+
+def make_row(exam_id: str, grade: str = '&nbsp;', status: str = 'angemeldet') -> tuple:
+    values = [exam_id, 'Exam {}'.format(exam_id), '', '', '1', '', 'WiSe 16/17', '01.02.2017', grade, '', '5,0',
+              status, '']
+    return tuple(value or '&nbsp;' for value in values)
+
+
+class BotTestCase(unittest.TestCase):
+    """Provides a Bot with a temporary configuration & database and a mocked QIS."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        config_path = os.path.join(self.directory, 'qisbot.ini')
+        with open(config_path, 'w') as config_file:
+            config_file.write(_config)
+        self.bot = bot.Bot(config_path, os.path.join(self.directory, 'qisbot.db'))
+        self.is_logged_in_patch = mock.patch('qisbot.qis.Qis.is_logged_in', new_callable=mock.PropertyMock)
+        self.is_logged_in_patch.start().return_value = True
+        self.bot.qis.fetch_exams_extract_table = mock.MagicMock()
+        self.notify_patch = mock.patch('zope.event.notify')
+        self.notify_mock = self.notify_patch.start()
+
+    def refresh(self, *rows: tuple):
+        self.bot.qis.fetch_exams_extract_table.return_value = make_exams_table(*rows)
+        return self.bot.refresh_exams_extract()
+
+    def tearDown(self):
+        self.notify_patch.stop()
+        self.is_logged_in_patch.stop()
+        shutil.rmtree(self.directory)
+
+
+class TestRefreshExamsExtract(BotTestCase):
+    def test_new_exams(self):
+        emitted_events = self.refresh(make_row('1000'), make_row('2000'))
+        self.assertEqual(len(emitted_events), 2)
+        self.assertTrue(all(isinstance(event, events.NewExamEvent) for event in emitted_events))
+        # One event per exam, followed by a single event for the whole refresh
+        self.assertEqual(self.notify_mock.call_count, 3)
+        completed_event = self.notify_mock.call_args[0][0]
+        self.assertIsInstance(completed_event, events.RefreshCompletedEvent)
+        self.assertEqual(completed_event.exam_events, emitted_events)
+        self.assertEqual(len(self.bot.exams_extract_dataset()), 2)
+
+    def test_changed_exam(self):
+        self.refresh(make_row('1000'))
+        emitted_events = self.refresh(make_row('1000', grade='1,7', status='bestanden'))
+        self.assertEqual(len(emitted_events), 1)
+        self.assertIsInstance(emitted_events[0], events.ExamChangedEvent)
+        self.assertEqual(emitted_events[0].changes['grade'], (None, '1,7'))
+        self.assertEqual(emitted_events[0].changes['status'], ('angemeldet', 'bestanden'))
+
+    def test_only_mismatches_are_diffed(self):
+        self.refresh(make_row('1000'), make_row('2000'))
+        with mock.patch('qisbot.models.compare_exams', wraps=bot.models.compare_exams) as compare_mock:
+            emitted_events = self.refresh(make_row('1000'), make_row('2000', grade='1,0', status='bestanden'))
+        self.assertEqual(len(emitted_events), 1)
+        self.assertEqual(emitted_events[0].new_exam.id, '2000')
+        self.assertEqual(compare_mock.call_count, 1)
+
+    def test_duplicate_rows(self):
+        emitted_events = self.refresh(make_row('1000'), make_row('1000', grade='2,0', status='bestanden'))
+        self.assertEqual([type(event) for event in emitted_events], [events.NewExamEvent, events.ExamChangedEvent])
+        dataset = self.bot.exams_extract_dataset()
+        self.assertEqual(len(dataset), 1)
+        self.assertEqual(dataset['grade'], ['2,0'])
+
+    def test_session_lost(self):
+        table = make_exams_table(make_row('1000'))
+        self.bot.qis.fetch_exams_extract_table.side_effect = [QisNotLoggedInException('lost'), table]
+        with mock.patch('qisbot.qis.Qis.login') as login_mock:
+            emitted_events = self.bot.refresh_exams_extract()
+        # Logged in again and retried once
+        self.assertEqual(login_mock.call_count, 1)
+        self.assertEqual(len(emitted_events), 1)
+
+    def test_notify_after_commit(self):
+        with mock.patch('qisbot.persistence.DatabaseManager.apply_exam_changes', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.refresh(make_row('1000'))
+        self.assertFalse(self.notify_mock.called)
+
+    def test_unchanged_extract(self):
+        self.refresh(make_row('1000'))
+        with mock.patch('qisbot.models.map_to_exam') as map_mock:
+            self.assertEqual(self.refresh(make_row('1000')), [])
+            self.assertFalse(map_mock.called)
+
+
+class TestExamsExtractDataset(BotTestCase):
+    def test_all_columns(self):
+        self.refresh(make_row('1000'), make_row('2000', grade='1,7', status='bestanden'))
+        dataset = self.bot.exams_extract_dataset()
+        self.assertEqual(dataset.headers, list(models.ExamData.__members__.keys()))
+        self.assertEqual(dataset['id'], ['1000', '2000'])
+        self.assertEqual(dataset['grade'], ['', '1,7'])
+        self.assertEqual(dataset['special'], ['', ''])
+
+    def test_omit_empty(self):
+        self.refresh(make_row('1000'), make_row('2000', grade='1,7', status='bestanden'))
+        dataset = self.bot.exams_extract_dataset(omit_empty=True)
+        # Adjacent empty columns (special, ruling) are all omitted
+        self.assertEqual(dataset.headers, ['id', 'name', 'attempt', 'semester', 'date', 'grade', 'ects', 'status'])
+        self.assertEqual(dataset['grade'], ['', '1,7'])
@@ -0,0 +1,118 @@
+import time
+import unittest
+from unittest import mock
+
+from qisbot import daemon
+from qisbot import events
+from qisbot import runner
+
+# Some time in January, outside of the default exam-result season
+_off_season = time.mktime((2017, 1, 15, 12, 0, 0, 0, 0, -1))
+# Some time in February, during the default exam-result season
+_in_season = time.mktime((2017, 2, 15, 12, 0, 0, 0, 0, -1))
+
+
+def make_scheduler(**kwargs) -> daemon.AdaptiveScheduler:
+    kwargs.setdefault('jitter', 0)
+    return daemon.AdaptiveScheduler(**kwargs)
+
+
+class TestAdaptiveScheduler(unittest.TestCase):
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            daemon.AdaptiveScheduler(interval=0)
+        with self.assertRaises(ValueError):
+            daemon.AdaptiveScheduler(min_interval=600, season_interval=300)
+        with self.assertRaises(ValueError):
+            daemon.AdaptiveScheduler(backoff=0.5)
+        with self.assertRaises(ValueError):
+            daemon.AdaptiveScheduler(jitter=1)
+
+    def test_season(self):
+        scheduler = make_scheduler()
+        self.assertEqual(scheduler.next_delay(_off_season), 900)
+        self.assertEqual(scheduler.next_delay(_in_season), 300)
+
+    def test_speeds_up_after_change(self):
+        scheduler = make_scheduler()
+        scheduler.record(True, now=_off_season)
+        self.assertEqual(scheduler.next_delay(_off_season + 60), 120)
+        self.assertEqual(scheduler.next_delay(_off_season + 3600), 900)
+
+    def test_backs_off_when_quiet(self):
+        scheduler = make_scheduler(backoff=2)
+        for _ in range(3):
+            scheduler.record(False)
+        self.assertEqual(scheduler.next_delay(_off_season), 7200)
+        # The season interval doesn't back off further than the regular interval
+        self.assertEqual(scheduler.next_delay(_in_season), 900)
+        for _ in range(10):
+            scheduler.record(False)
+        self.assertEqual(scheduler.next_delay(_off_season), 21600)
+        scheduler.record(True, now=_off_season)
+        self.assertEqual(scheduler.quiet_refreshes, 0)
+
+    def test_long_quiet_period(self):
+        scheduler = make_scheduler()
+        scheduler.quiet_refreshes = 100000
+        self.assertEqual(scheduler.next_delay(_off_season), 21600)
+        self.assertEqual(scheduler.next_delay(_in_season), 900)
+        scheduler = make_scheduler(backoff=1)
+        scheduler.quiet_refreshes = 100000
+        self.assertEqual(scheduler.next_delay(_off_season), 900)
+
+    def test_jitter(self):
+        scheduler = make_scheduler(jitter=0.5)
+        delays = {scheduler.next_delay(_off_season) for _ in range(20)}
+        self.assertGreater(len(delays), 1)
+        self.assertTrue(all(450 <= delay <= 1350 for delay in delays))
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.runner = mock.Mock(spec=runner.MultiAccountRunner)
+        self.runner.config_paths = ['alice.ini', 'bob.ini']
+        self.schedulers = {config_path: make_scheduler() for config_path in self.runner.config_paths}
+        self.daemon = daemon.Daemon(self.runner, self.schedulers)
+
+    def test_initial_offsets(self):
+        started_at = time.time()
+        self.schedulers = {'account{}.ini'.format(number): make_scheduler() for number in range(20)}
+        self.runner.config_paths = list(self.schedulers.keys())
+        due_at = daemon.Daemon(self.runner, self.schedulers)._due_at
+        # Spread out within the first interval instead of all at once
+        self.assertTrue(all(started_at <= value <= time.time() + 900 for value in due_at.values()))
+        self.assertGreater(len(set(due_at.values())), 1)
+
+    def test_run_once(self):
+        self.runner.run.return_value = [
+            runner.AccountResult('alice.ini', account='alice', emitted_events=[events.NewExamEvent(None, None)]),
+            runner.AccountResult('bob.ini', account='bob', error=IOError('nope'))
+        ]
+        self.assertEqual(self.daemon.run_once(now=time.time() - 1), [])
+        results = self.daemon.run_once(now=time.time() + 900)
+        self.runner.run.assert_called_once_with(['alice.ini', 'bob.ini'])
+        self.assertEqual(len(results), 2)
+        self.assertIsNotNone(self.schedulers['alice.ini'].last_change_at)
+        self.assertEqual(self.schedulers['bob.ini'].quiet_refreshes, 1)
+        # Nothing is due right after the refresh
+        self.assertEqual(self.daemon.run_once(), [])
+        self.assertEqual(self.runner.run.call_count, 1)
+        self.assertGreater(self.daemon.next_due_at, time.time())
+
+    def test_scheduled_from_own_completion(self):
+        started_at = time.time()
+        self.runner.run.return_value = [
+            runner.AccountResult('alice.ini', account='alice', finished_at=started_at + 10),
+            runner.AccountResult('bob.ini', account='bob', finished_at=started_at + 50)
+        ]
+        self.daemon.run_once(now=started_at + 900)
+        delays = {config_path: scheduler.next_delay(started_at) for config_path, scheduler in self.schedulers.items()}
+        self.assertEqual(self.daemon._due_at['alice.ini'], started_at + 10 + delays['alice.ini'])
+        self.assertEqual(self.daemon._due_at['bob.ini'], started_at + 50 + delays['bob.ini'])
+
+    def test_stop(self):
+        self.runner.run.return_value = []
+        self.daemon.stop()
+        self.daemon.run_forever()
+        self.assertTrue(self.runner.shutdown.called)
@@ -0,0 +1,115 @@
+import time
+import threading
+import unittest
+
+import zope.event
+import zope.event.classhandler
+
+from qisbot import dispatch
+from qisbot import events
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.handled = []
+        self.release = threading.Event()
+        zope.event.subscribers.append(self.handler)
+
+    def handler(self, event: events.BaseEvent):
+        if getattr(event, 'blocking', False):
+            self.release.wait(5)
+        if getattr(event, 'failing', False):
+            raise RuntimeError('failing handler')
+        self.handled.append(event)
+
+    @staticmethod
+    def make_event(**attributes) -> events.BaseEvent:
+        event = events.BaseEvent(None)
+        for name, value in attributes.items():
+            setattr(event, name, value)
+        return event
+
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            dispatch.NotificationDispatcher(workers=-1)
+        with self.assertRaises(ValueError):
+            dispatch.NotificationDispatcher(handler_timeout=0)
+        with self.assertRaises(ValueError):
+            dispatch.NotificationDispatcher(max_abandoned=0)
+
+    def test_synchronous(self):
+        dispatcher = dispatch.NotificationDispatcher(workers=0)
+        event = self.make_event()
+        dispatcher.notify(event)
+        self.assertEqual(self.handled, [event])
+
+    def test_notify_does_not_block(self):
+        dispatcher = dispatch.NotificationDispatcher(workers=1)
+        dispatcher.notify(self.make_event(blocking=True))
+        self.assertEqual(dispatcher.pending, 1)
+        self.assertFalse(dispatcher.wait(timeout=0.05))
+        self.release.set()
+        self.assertTrue(dispatcher.shutdown(timeout=5))
+        self.assertEqual(len(self.handled), 1)
+
+    def test_handler_timeout(self):
+        dispatcher = dispatch.NotificationDispatcher(workers=1, handler_timeout=0.05)
+        dispatcher.notify(self.make_event(blocking=True))
+        event = self.make_event()
+        dispatcher.notify(event)
+        # The blocked handler is abandoned, the next event is handled regardless
+        self.assertTrue(dispatcher.wait(timeout=5))
+        self.assertIn(event, self.handled)
+        self.release.set()
+
+    def test_handler_threads_are_reused(self):
+        dispatcher = dispatch.NotificationDispatcher(workers=1)
+        dispatcher.notify(self.make_event())
+        self.assertTrue(dispatcher.wait(timeout=5))
+        threads_before = threading.active_count()
+        for _ in range(9):
+            dispatcher.notify(self.make_event())
+        self.assertTrue(dispatcher.wait(timeout=5))
+        self.assertEqual(len(self.handled), 10)
+        self.assertLessEqual(threading.active_count(), threads_before)
+        self.assertTrue(dispatcher.shutdown(timeout=5))
+
+    def test_abandoned_handlers_are_capped(self):
+        dispatcher = dispatch.NotificationDispatcher(workers=1, handler_timeout=0.05, max_abandoned=2)
+        for _ in range(4):
+            dispatcher.notify(self.make_event(blocking=True))
+        with self.assertLogs(level='ERROR') as logs:
+            self.assertTrue(dispatcher.wait(timeout=5))
+        self.assertEqual(dispatcher.abandoned, 2)
+        self.assertEqual(len([line for line in logs.output if 'Skipped' in line]), 2)
+        # Abandoned handlers end once they return
+        self.release.set()
+        self.assertTrue(dispatcher.shutdown(timeout=5))
+        for _ in range(100):
+            if not dispatcher.abandoned:
+                break
+            time.sleep(0.01)
+        self.assertEqual(dispatcher.abandoned, 0)
+        self.assertEqual(len(self.handled), 2)
+
+    def test_failing_handler(self):
+        dispatcher = dispatch.NotificationDispatcher(workers=2)
+        dispatcher.notify(self.make_event(failing=True))
+        event = self.make_event()
+        dispatcher.notify(event)
+        self.assertTrue(dispatcher.shutdown(timeout=5))
+        self.assertEqual(self.handled, [event])
+
+    def test_notify_after_shutdown(self):
+        dispatcher = dispatch.NotificationDispatcher(workers=1)
+        dispatcher.shutdown()
+        with self.assertRaises(RuntimeError):
+            dispatcher.notify(self.make_event())
+
+    def test_handlers_for(self):
+        self.assertIn(self.handler, dispatch.handlers_for(self.make_event()))
+        self.assertNotIn(zope.event.classhandler.dispatch, dispatch.handlers_for(self.make_event()))
+
+    def tearDown(self):
+        self.release.set()
+        zope.event.subscribers.remove(self.handler)
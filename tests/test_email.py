@@ -0,0 +1,106 @@
+import smtplib
+import unittest
+from unittest import mock
+
+import zope.event.classhandler
+
+from qisbot import events
+from qisbot.notifies import email
+from tests.helpers import make_exam
+
+
+def make_config(digest: bool = True):
+    conf = mock.Mock()
+    conf.notify_email = True
+    conf.email_notify_digest = digest
+    conf.email_notify_host = 'smtp.example.com'
+    conf.email_notify_port = 465
+    conf.email_notify_ssl = True
+    conf.email_notify_username = 'qisbot@example.com'
+    conf.email_notify_password = 'secret'
+    conf.email_notify_destinations = ['student@example.com', 'parent@example.com']
+    return conf
+
+
+def notify(event: events.BaseEvent) -> ():
+    """Run the E-Mail handlers registered for an event (the decorated module attributes aren't the handlers)."""
+    for handler in zope.event.classhandler.registry.get(event.__class__, ()):
+        if handler.__module__ == email.__name__:
+            handler(event)
+
+
+class TestSMTPConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = email.SMTPConnectionPool()
+        self.smtp_patch = mock.patch('smtplib.SMTP_SSL')
+        self.smtp_mock = self.smtp_patch.start()
+        self.smtp_mock.side_effect = lambda *args: mock.Mock()
+
+    def tearDown(self):
+        self.smtp_patch.stop()
+
+    def test_connection_is_reused(self):
+        conf = make_config()
+        for _ in range(3):
+            self.pool.sendmail(conf, conf.email_notify_destinations, 'message')
+        self.assertEqual(self.smtp_mock.call_count, 1)
+        self.assertEqual(self.pool.idle_connections, 1)
+
+    def test_expired_connection_is_replaced(self):
+        conf = make_config()
+        self.pool.max_idle = 0
+        self.pool.sendmail(conf, conf.email_notify_destinations, 'message')
+        self.pool.sendmail(conf, conf.email_notify_destinations, 'message')
+        self.assertEqual(self.smtp_mock.call_count, 2)
+        self.assertEqual(self.pool.idle_connections, 1)
+
+    def test_reconnect_after_disconnect(self):
+        conf = make_config()
+        self.pool.sendmail(conf, conf.email_notify_destinations, 'message')
+        with self.pool.connection(conf) as conn:
+            conn.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+        self.pool.sendmail(conf, conf.email_notify_destinations, 'message')
+        self.assertEqual(self.smtp_mock.call_count, 2)
+        self.assertEqual(self.pool.idle_connections, 1)
+
+    def test_close(self):
+        conf = make_config()
+        self.pool.sendmail(conf, conf.email_notify_destinations, 'message')
+        with self.pool.connection(conf) as conn:
+            pass
+        self.pool.close()
+        self.assertEqual(self.pool.idle_connections, 0)
+        self.assertTrue(conn.quit.called)
+
+
+class TestDigest(unittest.TestCase):
+    def setUp(self):
+        self.sendmail_patch = mock.patch.object(email.connection_pool, 'sendmail')
+        self.sendmail_mock = self.sendmail_patch.start()
+
+    def tearDown(self):
+        self.sendmail_patch.stop()
+
+    def test_single_message_per_refresh(self):
+        conf = make_config()
+        old_exam, new_exam = make_exam('2000'), make_exam('2000')
+        new_exam.grade = '1,3'
+        exam_events = [events.NewExamEvent(conf, make_exam('1000')),
+                       events.ExamChangedEvent(conf, old_exam, new_exam, {'grade': (None, '1,3')})]
+        for exam_event in exam_events:
+            notify(exam_event)
+        self.assertFalse(self.sendmail_mock.called)
+        notify(events.RefreshCompletedEvent(conf, exam_events))
+        self.assertEqual(self.sendmail_mock.call_count, 1)
+        _, destinations, message = self.sendmail_mock.call_args[0]
+        self.assertEqual(destinations, conf.email_notify_destinations)
+        self.assertIn('Exam 1000', message)
+        self.assertIn('Exam 2000', message)
+
+    def test_no_digest_when_disabled(self):
+        conf = make_config(digest=False)
+        exam_event = events.NewExamEvent(conf, make_exam('1000'))
+        notify(events.RefreshCompletedEvent(conf, [exam_event]))
+        self.assertFalse(self.sendmail_mock.called)
+        notify(exam_event)
+        self.assertEqual(self.sendmail_mock.call_count, 1)
@@ -0,0 +1,48 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from qisbot import bot
+from qisbot import events
+from benchmarks.mock_qis import MockQisServer
+
+_config_template = """[QIS]
+username = alice
+password = {password}
+baseUrl = {base_url}
+
+[NOTIFICATIONS]
+workers = 0
+"""
+
+
+class TestRefreshAgainstMockQis(unittest.TestCase):
+    """Refresh exams extracts from a local stand-in for QIS, through the real login and navigation."""
+
+    def setUp(self):
+        self.server = MockQisServer(exams_per_account=10, graded_ratio=0.5, change_interval=0.2).start()
+        self.directory = tempfile.mkdtemp()
+        config_path = os.path.join(self.directory, 'qisbot.ini')
+        with open(config_path, 'w') as config_file:
+            config_file.write(_config_template.format(password=self.server.password, base_url=self.server.base_url))
+        self.bot = bot.Bot(config_path, os.path.join(self.directory, 'qisbot.db'))
+
+    def tearDown(self):
+        self.bot.shutdown()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_refresh(self):
+        emitted_events = self.bot.refresh_exams_extract()
+        self.assertEqual(len(emitted_events), 10)
+        self.assertTrue(all(isinstance(event, events.NewExamEvent) for event in emitted_events))
+        requests_after_login = self.server.stats()['requests']
+        time.sleep(0.25)
+        emitted_events = self.bot.refresh_exams_extract()
+        self.assertTrue(emitted_events)
+        self.assertTrue(all(isinstance(event, events.ExamChangedEvent) for event in emitted_events))
+        # The session and the exams extract's location are reused
+        self.assertEqual(self.server.stats()['logins'], 1)
+        self.assertEqual(self.server.stats()['requests'], requests_after_login + 1)
@@ -0,0 +1,145 @@
+import io
+import csv
+import json
+import unittest
+import tracemalloc
+
+from qisbot import export
+from qisbot import persistence
+from tests.helpers import make_exam
+
+
+class _Discard(io.TextIOBase):
+    """Forgets everything written to it, so that only the memory used by exporting counts."""
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+        self.db_manager.apply_exam_changes('bob', [make_exam(2000, semester='SoSe 17', status='bestanden')], [])
+        self.db_manager.apply_exam_changes('alice', [
+            make_exam(1001, semester='WiSe 16/17', grade='1,3', status='bestanden'),
+            make_exam(1000, semester='SoSe 17', status='angemeldet')
+        ], [])
+
+    def tearDown(self):
+        self.db_manager.close()
+
+    def test_csv(self):
+        output = io.StringIO()
+        self.assertEqual(export.export(self.db_manager, output, 'csv'), 3)
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual(rows[0], export.COLUMNS)
+        # Ordered by account and ID, empty values stay empty
+        self.assertEqual([(row[0], row[1]) for row in rows[1:]], [('alice', '1000'), ('alice', '1001'),
+                                                                  ('bob', '2000')])
+        self.assertEqual(rows[2][export.COLUMNS.index('grade')], '1,3')
+        self.assertEqual(rows[1][export.COLUMNS.index('grade')], '')
+
+    def test_ndjson(self):
+        output = io.StringIO()
+        self.assertEqual(export.export(self.db_manager, output, 'ndjson', account='alice'), 2)
+        objects = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([exam['id'] for exam in objects], [1000, 1001])
+        self.assertEqual(objects[1]['semester'], 'WiSe 16/17')
+        self.assertIsNone(objects[0]['grade'])
+
+    def test_table(self):
+        output = io.StringIO()
+        self.assertEqual(export.export(self.db_manager, output, 'table', semester='SoSe 17'), 2)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('account  id    name       special'))
+        self.assertTrue(lines[1].startswith('-------  ----  ---------  -------'))
+        self.assertTrue(lines[2].startswith('alice    1000  Exam 1000'))
+        # Every column starts at the same position in every line
+        self.assertEqual(lines[0].index('semester'), lines[3].index('SoSe 17'))
+
+    def test_filters_are_combined(self):
+        self.assertEqual(export.export(self.db_manager, io.StringIO(), 'csv', semester='SoSe 17',
+                                       status='bestanden'), 1)
+        self.assertEqual(export.export(self.db_manager, io.StringIO(), 'csv', account='carol'), 0)
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            export.export(self.db_manager, io.StringIO(), 'xlsx')
+
+    def test_memory_does_not_grow_with_exams(self):
+        def peak_memory(statement) -> int:
+            tracemalloc.start()
+            try:
+                statement()
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        def export_carol() -> int:
+            return peak_memory(lambda: export.export(self.db_manager, _Discard(), 'csv', account='carol'))
+
+        self.db_manager.apply_exam_changes('carol', [make_exam(exam_id, grade='2,0') for exam_id in range(1000)], [])
+        # Warm up, the first export allocates caches that later ones reuse
+        export_carol()
+        small_peak = export_carol()
+        self.db_manager.apply_exam_changes('carol', [make_exam(exam_id, grade='2,0')
+                                                     for exam_id in range(1000, 20000)], [])
+        large_peak = export_carol()
+        self.assertLess(large_peak, small_peak * 1.5)
+        self.assertLess(large_peak * 10, peak_memory(lambda: self.db_manager.fetch_all_exams(account='carol')))
+
+
+class TestColumnarTable(unittest.TestCase):
+    def setUp(self):
+        self.table = export.ColumnarTable(['id', 'grade', 'status'])
+
+    def test_columns_are_materialized_on_first_value(self):
+        self.table.append([1000, None, ''])
+        self.table.append([2000, '1,3', None])
+        self.assertEqual(self.table.empty_columns, ['status'])
+        self.assertEqual(self.table._values[2], None)
+        dataset = self.table.to_dataset()
+        self.assertEqual(dataset.headers, ['id', 'grade', 'status'])
+        self.assertEqual(dataset['id'], ['1000', '2000'])
+        self.assertEqual(dataset['grade'], ['', '1,3'])
+        self.assertEqual(dataset['status'], ['', ''])
+
+    def test_omit_empty(self):
+        self.table.append([1000, None, 'angemeldet'])
+        dataset = self.table.to_dataset(omit_empty=True)
+        self.assertEqual(dataset.headers, ['id', 'status'])
+        self.assertEqual(dataset[0], ('1000', 'angemeldet'))
+
+    def test_row_length(self):
+        with self.assertRaises(ValueError):
+            self.table.append([1000, None])
+
+
+class TestIterExamRows(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+        self.db_manager.apply_exam_changes('alice', [make_exam(exam_id) for exam_id in range(10)], [])
+
+    def tearDown(self):
+        self.db_manager.close()
+
+    def test_batches(self):
+        rows = self.db_manager.iter_exam_rows(account='alice', batch_size=3)
+        self.assertEqual([row[1] for row in rows], list(range(10)))
+
+    def test_writes_in_between(self):
+        rows = self.db_manager.iter_exam_rows(account='alice', batch_size=2)
+        self.assertEqual(next(rows)[1], 0)
+        self.db_manager.apply_exam_changes('bob', [make_exam(1)], [])
+        self.assertEqual(len(list(rows)), 9)
+
+    def test_column_widths(self):
+        widths = self.db_manager.fetch_column_widths(account='alice')
+        self.assertEqual(widths['account'], 5)
+        self.assertEqual(widths['name'], len('Exam 0'))
+        self.assertEqual(widths['grade'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import threading
+
+from qisbot import lazy
+
+_slow_module = """import time
+time.sleep(0.2)
+value = 42
+"""
+
+
+class TestLazyImport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'qisbot_lazy_test_module.py'), 'w') as module_file:
+            module_file.write(_slow_module)
+        sys.path.insert(0, self.directory)
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        sys.modules.pop('qisbot_lazy_test_module', None)
+        shutil.rmtree(self.directory)
+
+    def test_imports_on_first_access(self):
+        module = lazy.lazy_import('qisbot_lazy_test_module')
+        self.assertNotIn('qisbot_lazy_test_module', sys.modules)
+        self.assertEqual(module.value, 42)
+        self.assertIn('qisbot_lazy_test_module', sys.modules)
+
+    def test_missing_module(self):
+        module = lazy.lazy_import('qisbot_no_such_module')
+        with self.assertRaises(ImportError):
+            module.value
+
+    def test_concurrent_first_access(self):
+        module = lazy.lazy_import('qisbot_lazy_test_module')
+        values = []
+
+        def access():
+            values.append(getattr(module, 'value', None))
+
+        threads = [threading.Thread(target=access) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Nobody gets to see the module before it's completely initialized
+        self.assertEqual(values, [42] * 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import time
+import unittest
+
+from qisbot import metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            metrics.Histogram(())
+        with self.assertRaises(ValueError):
+            metrics.Histogram((1.0, 0.5))
+
+    def test_observe(self):
+        histogram = metrics.Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative_counts(), [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.65)
+        self.assertEqual(histogram.max, 2.0)
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(1.0), 2.0)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+
+    def test_timer(self):
+        with self.assertRaises(KeyError):
+            with self.registry.timer('failing'):
+                raise KeyError()
+        with self.registry.timer('sleeping'):
+            time.sleep(0.01)
+        histograms = self.registry.histograms()
+        self.assertEqual(histograms['failing'].count, 1)
+        self.assertGreaterEqual(histograms['sleeping'].sum, 0.01)
+
+    def test_timed(self):
+        @self.registry.timed('double')
+        def double(value):
+            return value * 2
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double.__name__, 'double')
+        self.assertEqual(self.registry.histograms()['double'].count, 1)
+
+    def test_disabled(self):
+        self.registry.enabled = False
+        self.registry.observe('phase', 1.0)
+        self.assertEqual(self.registry.histograms(), {})
+
+    def test_prometheus(self):
+        self.registry.observe('fetch', 0.2)
+        exported = self.registry.to_prometheus().splitlines()
+        self.assertIn('# TYPE qisbot_phase_duration_seconds histogram', exported)
+        self.assertIn('qisbot_phase_duration_seconds_bucket{phase="fetch",le="0.25"} 1', exported)
+        self.assertIn('qisbot_phase_duration_seconds_bucket{phase="fetch",le="+Inf"} 1', exported)
+        self.assertIn('qisbot_phase_duration_seconds_count{phase="fetch"} 1', exported)
+
+    def test_dict_and_breakdown(self):
+        self.registry.observe('fetch', 0.2)
+        self.registry.observe('parse', 0.01)
+        exported = self.registry.to_dict()
+        self.assertEqual(exported['fetch']['count'], 1)
+        self.assertEqual(exported['fetch']['buckets'][-1], ['+Inf', 1])
+        breakdown = self.registry.breakdown().splitlines()
+        self.assertTrue(breakdown[1].startswith('fetch'))
+        self.assertTrue(breakdown[2].startswith('parse'))
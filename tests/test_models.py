@@ -0,0 +1,75 @@
+import unittest
+
+from lxml import html
+
+from qisbot import models
+
+_values = ('1000', 'Exam', None, None, '1', None, 'WiSe 16/17', '01.02.2017', '1,7', None, '5,0', 'bestanden',
+           None)
+
+
+class TestExam(unittest.TestCase):
+    def test_no_dict(self):
+        exam = models.Exam()
+        self.assertFalse(hasattr(exam, '__dict__'))
+        with self.assertRaises(AttributeError):
+            exam.unknown = 'value'
+
+    def test_defaults(self):
+        self.assertEqual(models.Exam().to_row(), (None,) * len(models.ExamData))
+
+    def test_row_roundtrip(self):
+        exam = models.Exam.from_row(_values)
+        self.assertEqual(exam.grade, '1,7')
+        self.assertEqual(exam.to_row(), _values)
+
+    def test_attributes(self):
+        attributes = models.Exam.from_row(_values).attributes
+        self.assertEqual(list(attributes.keys()), list(models.ExamData.__members__.keys()))
+        self.assertEqual(attributes['status'], 'bestanden')
+
+
+class TestMapToExam(unittest.TestCase):
+    def test_from_sql(self):
+        exam = models.map_to_exam((1000,) + _values[1:])
+        self.assertEqual(exam.id, '1000')
+        self.assertIsNone(exam.special)
+
+    def test_from_html(self):
+        cells = ''.join('<td>{}</td>'.format(value or '&nbsp;') for value in _values)
+        exam = models.map_to_exam(html.fromstring('<table><tr>{}</tr></table>'.format(cells)).find('.//tr'))
+        self.assertEqual(exam.to_row(), _values)
+
+    def test_wrong_amount(self):
+        with self.assertRaises(ValueError):
+            models.map_to_exam(_values[1:])
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            models.map_to_exam({})
+
+
+class TestParsing(unittest.TestCase):
+    def test_parse_decimal(self):
+        self.assertEqual(models.parse_decimal('1,7'), 1.7)
+        self.assertEqual(models.parse_decimal(' 1.234,5 '), 1234.5)
+        self.assertEqual(models.parse_decimal('5'), 5.0)
+        self.assertIsNone(models.parse_decimal(None))
+        self.assertIsNone(models.parse_decimal('\xa0'))
+        self.assertIsNone(models.parse_decimal('bestanden'))
+
+    def test_semester_key(self):
+        self.assertEqual(models.semester_key('SoSe 17'), 20171)
+        self.assertEqual(models.semester_key('WiSe 16/17'), 20162)
+        self.assertEqual(models.semester_key('WS 2016/17'), 20162)
+        self.assertLess(models.semester_key('WiSe 16/17'), models.semester_key('SoSe 17'))
+        self.assertIsNone(models.semester_key('Anerkennung'))
+        self.assertIsNone(models.semester_key(None))
+
+    def test_parse_date(self):
+        self.assertEqual(models.parse_date('24.07.2017'), '2017-07-24')
+        self.assertEqual(models.parse_date(' 1.2.17 '), '2017-02-01')
+        self.assertLess(models.parse_date('31.12.2016'), models.parse_date('01.01.2017'))
+        self.assertIsNone(models.parse_date('32.01.2017'))
+        self.assertIsNone(models.parse_date('2017-07-24'))
+        self.assertIsNone(models.parse_date(None))
@@ -0,0 +1,329 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from qisbot import models
+from qisbot import persistence
+from qisbot.exceptions import PersistenceException
+from tests.helpers import make_exam
+
+
+def remove_database(database_path: str):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+
+
+class TestAccounts(unittest.TestCase):
+    """Exams of different accounts must not interfere with each other."""
+
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+
+    def test_same_id_different_accounts(self):
+        self.db_manager.persist_exam(make_exam('1000', grade='1,0'), account='alice')
+        self.db_manager.persist_exam(make_exam('1000', grade='4,0'), account='bob')
+        self.assertEqual(self.db_manager.fetch_exam('1000', account='alice').grade, '1,0')
+        self.assertEqual(self.db_manager.fetch_exam('1000', account='bob').grade, '4,0')
+        self.assertIsNone(self.db_manager.fetch_exam('1000', account='carol'))
+
+    def test_duplicate_exam(self):
+        self.db_manager.persist_exam(make_exam('1000'), account='alice')
+        with self.assertRaises(PersistenceException):
+            self.db_manager.persist_exam(make_exam('1000'), account='alice')
+
+    def test_update_is_scoped(self):
+        self.db_manager.persist_exam(make_exam('1000'), account='alice')
+        self.db_manager.persist_exam(make_exam('1000'), account='bob')
+        self.db_manager.update_exam('1000', {'grade': '2,3'}, account='bob')
+        self.assertIsNone(self.db_manager.fetch_exam('1000', account='alice').grade)
+        self.assertEqual(self.db_manager.fetch_exam('1000', account='bob').grade, '2,3')
+
+    def test_fetch_all(self):
+        self.db_manager.persist_exam(make_exam('1000'), account='alice')
+        self.db_manager.persist_exam(make_exam('2000'), account='bob')
+        self.assertEqual(len(self.db_manager.fetch_all_exams()), 2)
+        self.assertEqual([exam.id for exam in self.db_manager.fetch_all_exams(account='bob')], ['2000'])
+
+
+class TestBulkChanges(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+        self.db_manager.persist_exam(make_exam('1000', grade='5,0'), account='alice')
+
+    def test_apply(self):
+        self.db_manager.apply_exam_changes('alice', [make_exam('2000'), make_exam('3000')],
+                                           [make_exam('1000', grade='1,0')])
+        exams = self.db_manager.fetch_exams_by_id('alice')
+        self.assertEqual(sorted(exams.keys()), [1000, 2000, 3000])
+        self.assertEqual(exams[1000].grade, '1,0')
+
+    def test_rollback(self):
+        with self.assertRaises(PersistenceException):
+            self.db_manager.apply_exam_changes('alice', [make_exam('2000'), make_exam('1000')],
+                                               [make_exam('1000', grade='1,0')])
+        exams = self.db_manager.fetch_exams_by_id('alice')
+        self.assertEqual(list(exams.keys()), [1000])
+        self.assertEqual(exams[1000].grade, '5,0')
+
+
+class TestRowHashes(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+        self.exam = make_exam('1000', grade='5,0')
+        self.db_manager.persist_exam(self.exam, account='alice')
+
+    def test_hashes(self):
+        self.db_manager.apply_exam_changes('alice', [make_exam('2000')], [])
+        hashes = self.db_manager.fetch_exam_hashes('alice')
+        self.assertEqual(hashes, {1000: self.exam.row_hash, 2000: make_exam('2000').row_hash})
+
+    def test_partial_update_resets_hash(self):
+        self.db_manager.update_exam('1000', {'grade': '1,0'}, account='alice')
+        self.assertEqual(self.db_manager.fetch_exam_hashes('alice'), {1000: None})
+
+    def test_fetch_exams(self):
+        exam_ids = list(range(2000, 3200))
+        self.db_manager.apply_exam_changes('alice', [make_exam(str(exam_id)) for exam_id in exam_ids], [])
+        exams = self.db_manager.fetch_exams('alice', exam_ids + [99999])
+        self.assertEqual(sorted(exams.keys()), exam_ids)
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+        self.db_manager.apply_exam_changes('alice', [make_exam('1000', status='angemeldet')], [],
+                                           run_id='run-1', changed_at=100)
+        self.db_manager.apply_exam_changes('alice', [make_exam('2000')],
+                                           [make_exam('1000', grade='1,7', status='bestanden')],
+                                           changes=[(1000, {'grade': (None, '1,7'),
+                                                            'status': ('angemeldet', 'bestanden')})],
+                                           run_id='run-2', changed_at=200)
+        self.db_manager.apply_exam_changes('bob', [make_exam('1000', grade='1,7')], [], changed_at=300)
+
+    def test_only_changed_fields(self):
+        history = self.db_manager.fetch_history(account='alice', since=100)
+        self.assertEqual(sorted((entry[1], entry[2]) for entry in history),
+                         [(1000, 'grade'), (1000, 'status'), (2000, 'id'), (2000, 'name')])
+        self.assertTrue(all(entry[6] == 'run-2' for entry in history))
+
+    def test_value_across_accounts(self):
+        history = self.db_manager.fetch_history(field='grade', new_value='1,7')
+        self.assertEqual([(entry[0], entry[5]) for entry in history], [('alice', 200), ('bob', 300)])
+
+    def test_exam_at(self):
+        self.assertIsNone(self.db_manager.fetch_exam_at('1000', 50, account='alice'))
+        exam = self.db_manager.fetch_exam_at('1000', 150, account='alice')
+        self.assertEqual((exam.grade, exam.status), (None, 'angemeldet'))
+        exam = self.db_manager.fetch_exam_at('1000', 250, account='alice')
+        self.assertEqual((exam.grade, exam.status), ('1,7', 'bestanden'))
+
+    def test_extract_at(self):
+        self.assertEqual([exam.id for exam in self.db_manager.fetch_exams_extract_at('alice', 150)], ['1000'])
+        self.assertEqual(len(self.db_manager.fetch_exams_extract_at('alice', 250)), 2)
+
+    def test_update_exam(self):
+        self.db_manager.update_exam('2000', {'grade': '2,0', 'name': 'Exam 2000'}, account='alice')
+        self.db_manager.commit()
+        history = self.db_manager.fetch_history(account='alice', exam_id='2000', field='grade')
+        self.assertEqual([(entry[3], entry[4]) for entry in history], [(None, '2,0')])
+        self.assertEqual(len(self.db_manager.fetch_history(account='alice', exam_id='2000', field='name')), 1)
+
+    def test_rollback_with_exams(self):
+        entries = len(self.db_manager.fetch_history(account='alice'))
+        with self.assertRaises(PersistenceException):
+            self.db_manager.apply_exam_changes('alice', [make_exam('3000'), make_exam('1000')], [])
+        self.assertEqual(len(self.db_manager.fetch_history(account='alice')), entries)
+
+    def test_uses_indexes(self):
+        plan = self.db_manager.execute('EXPLAIN QUERY PLAN SELECT * FROM exam_history '
+                                       'WHERE account = ? AND changed_at > ?', ('alice', 0)).fetchall()
+        self.assertIn('exam_history_account', str(plan))
+
+
+class TestTypedColumns(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+        self.db_manager.apply_exam_changes('alice', [
+            make_exam('1000', semester='SoSe 17', date='24.07.2017', grade='1,7', points='85,5', ects='5'),
+            make_exam('2000', semester='WiSe 16/17', date='10.02.2017', grade='1,0', ects='7,5'),
+            make_exam('3000', semester='SoSe 17', grade='bestanden')
+        ], [])
+
+    def typed_values(self, exam_id: str) -> tuple:
+        return self.db_manager.execute('SELECT grade_value, points_value, ects_value, date_value, semester_key '
+                                       'FROM exams WHERE account = ? AND id = ?', ('alice', int(exam_id))).fetchone()
+
+    def test_persist(self):
+        self.assertEqual(self.typed_values('1000'), (1.7, 85.5, 5.0, '2017-07-24', 20171))
+        self.assertEqual(self.typed_values('3000'), (None, None, None, None, 20171))
+
+    def test_update(self):
+        self.db_manager.update_exam('3000', {'grade': '2,3', 'name': 'Renamed'}, account='alice')
+        self.assertEqual(self.typed_values('3000')[0], 2.3)
+        changed = make_exam('1000', semester='WiSe 17/18', grade='1,3')
+        self.db_manager.apply_exam_changes('alice', [], [changed])
+        self.assertEqual(self.typed_values('1000'), (1.3, None, None, None, 20172))
+
+    def test_queries_within_sqlite(self):
+        ects = self.db_manager.execute('SELECT semester_key, SUM(ects_value) FROM exams WHERE account = ? '
+                                       'GROUP BY semester_key ORDER BY semester_key', ('alice',)).fetchall()
+        self.assertEqual(ects, [(20162, 7.5), (20171, 5.0)])
+        plan = self.db_manager.execute('EXPLAIN QUERY PLAN SELECT id FROM exams '
+                                       'WHERE account = ? AND grade_value < ?', ('alice', 2.0)).fetchall()
+        self.assertIn('exams_account_grade_value', str(plan))
+
+    def test_fetch_exams_by_grade(self):
+        self.db_manager.persist_exam(make_exam('1000', grade='1,3'), account='bob')
+        self.assertEqual([exam.id for exam in self.db_manager.fetch_exams_by_grade(account='alice', better_than=2.0)],
+                         ['2000', '1000'])
+        self.assertEqual([exam.id for exam in self.db_manager.fetch_exams_by_grade(worse_than=1.0)], ['1000', '1000'])
+        self.assertEqual(self.db_manager.fetch_exams_by_grade(account='alice', better_than=1.0), [])
+
+
+class TestExtractFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = persistence.DatabaseManager(':memory:')
+
+    def test_fingerprint(self):
+        self.assertIsNone(self.db_manager.fetch_extract_fingerprint('alice'))
+        self.db_manager.update_extract_fingerprint('alice', 'first')
+        self.db_manager.update_extract_fingerprint('alice', 'second')
+        self.assertEqual(self.db_manager.fetch_extract_fingerprint('alice'), 'second')
+        self.assertIsNone(self.db_manager.fetch_extract_fingerprint('bob'))
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        handle, self.database_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+
+    def test_latest_version(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual(db_manager.schema_version, len(db_manager.migrations))
+        db_manager.persist_exam(make_exam('1000'), account='alice')
+        db_manager.close()
+        # Reopening doesn't apply any migration twice
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual(db_manager.schema_version, len(db_manager.migrations))
+        self.assertIsNotNone(db_manager.fetch_exam('1000', account='alice'))
+
+    def test_indexes(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        indexes = [row[1] for row in db_manager.execute('PRAGMA index_list(exams)').fetchall()]
+        self.assertIn('exams_account_semester', indexes)
+        self.assertIn('exams_account_status', indexes)
+        self.assertIn('exams_account_semester_key', indexes)
+
+    def test_wal(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual(db_manager.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_failed_migration(self):
+        def failing_migration():
+            db_manager.execute('CREATE TABLE partial (value TEXT)')
+            db_manager.execute('INSERT INTO missing VALUES (1)')
+
+        db_manager = persistence.DatabaseManager(self.database_path)
+        version = db_manager.schema_version
+        migrations = db_manager.migrations + [failing_migration]
+        with mock.patch('qisbot.persistence.DatabaseManager.migrations', new_callable=mock.PropertyMock) as m:
+            m.return_value = migrations
+            with self.assertRaises(PersistenceException):
+                db_manager._migrate()
+        self.assertEqual(db_manager.schema_version, version)
+        self.assertEqual(db_manager.execute('PRAGMA table_info(partial)').fetchall(), [])
+
+    def test_failed_migration_is_retried(self):
+        def failing_migration(db_manager: persistence.DatabaseManager):
+            # Fails after part of the migration's statements were executed
+            db_manager.execute('ALTER TABLE exams ADD COLUMN grade_value REAL')
+            db_manager.execute('CREATE INDEX exams_account_grade_value ON exams (account, grade_value)')
+            db_manager.execute('INSERT INTO missing VALUES (1)')
+
+        with mock.patch.object(persistence.DatabaseManager, '_migrate_typed_columns', failing_migration):
+            with self.assertRaises(PersistenceException):
+                persistence.DatabaseManager(self.database_path)
+        # None of the failed migration's changes were kept, so that it is applied when reopening
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual(db_manager.schema_version, len(db_manager.migrations))
+        indexes = [row[1] for row in db_manager.execute('PRAGMA index_list(exams)').fetchall()]
+        self.assertIn('exams_account_grade_value', indexes)
+
+    def test_no_implicit_transaction_afterwards(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual(db_manager._connection.isolation_level, '')
+
+    def tearDown(self):
+        remove_database(self.database_path)
+
+
+class TestLegacySchema(unittest.TestCase):
+    """Databases created before exams were scoped by account have to be upgraded."""
+
+    def setUp(self):
+        handle, self.database_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        connection = sqlite3.connect(self.database_path)
+        columns = ', '.join('{} {}'.format(name, 'INTEGER PRIMARY KEY' if name == 'id' else 'TEXT')
+                            for name in models.ExamData.__members__.keys())
+        connection.execute('CREATE TABLE exams ({})'.format(columns))
+        connection.execute('INSERT INTO exams (id, name, grade) VALUES (1000, \'Legacy\', \'1,3\')')
+        connection.commit()
+        connection.close()
+
+    def test_row_hashes(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        exam = db_manager.fetch_exam('1000')
+        self.assertEqual(db_manager.fetch_exam_hashes(''), {1000: exam.row_hash})
+
+    def test_upgrade_and_adopt(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual(db_manager.fetch_exam('1000').name, 'Legacy')
+        self.assertEqual(db_manager.adopt_unowned_exams('alice'), 1)
+        self.assertIsNone(db_manager.fetch_exam('1000'))
+        self.assertEqual(db_manager.fetch_exam('1000', account='alice').grade, '1,3')
+        # Nothing is left to adopt, nor written
+        with mock.patch.object(db_manager, 'commit') as commit_mock:
+            self.assertEqual(db_manager.adopt_unowned_exams('bob'), 0)
+        self.assertFalse(commit_mock.called)
+
+    def test_aggregates_are_adopted(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual(db_manager.fetch_grade_counts(), [('', 1.3, 1)])
+        db_manager.adopt_unowned_exams('alice')
+        self.assertEqual(db_manager.fetch_grade_counts(), [('alice', 1.3, 1)])
+        self.assertEqual([row[:3] for row in db_manager.fetch_aggregates()], [('alice', '', 1)])
+
+    def test_typed_columns_are_filled(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        self.assertEqual([exam.name for exam in db_manager.fetch_exams_by_grade(better_than=2.0)], ['Legacy'])
+
+    def tearDown(self):
+        remove_database(self.database_path)
+
+
+class TestRowHashColumn(unittest.TestCase):
+    """Tables scoped by account, but without row hashes get the column added."""
+
+    def setUp(self):
+        handle, self.database_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        connection = sqlite3.connect(self.database_path)
+        columns = ', '.join('{} {}'.format(name, 'INTEGER NOT NULL' if name == 'id' else 'TEXT')
+                            for name in models.ExamData.__members__.keys())
+        connection.execute('CREATE TABLE exams ({}, account TEXT NOT NULL DEFAULT \'\', '
+                           'PRIMARY KEY (account, id))'.format(columns))
+        connection.execute('INSERT INTO exams (id, name, account) VALUES (1000, \'Exam\', \'alice\')')
+        connection.commit()
+        connection.close()
+
+    def test_upgrade(self):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        exam = db_manager.fetch_exam('1000', account='alice')
+        self.assertEqual(db_manager.fetch_exam_hashes('alice'), {1000: exam.row_hash})
+
+    def tearDown(self):
+        remove_database(self.database_path)
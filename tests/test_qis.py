@@ -7,6 +7,8 @@ from lxml.html import builder as html_builder
 
 from qisbot import qis
 from qisbot import scraper
+from qisbot import resilience
+from qisbot.exceptions import DeadlineExceededException
 
 
 class TestInitialization(unittest.TestCase):
@@ -62,6 +64,66 @@ class TestIsLoggedIn(unittest.TestCase):
         self.assertTrue(element_text_mock.called)
 
 
+class TestLoginStateCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.logged_in_html = cls._page('Abmelden')
+        cls.logged_out_html = cls._page('Login')
+
+    @staticmethod
+    def _page(login_action: str) -> html.HtmlElement:
+        return html_builder.HTML(html_builder.BODY(html_builder.DIV(
+            html_builder.ATTR({'id': 'wrapper'}),
+            html_builder.DIV(), html_builder.DIV(),
+            html_builder.DIV(html_builder.A('Home'), html_builder.A(html_builder.U(login_action)))
+        )))
+
+    def setUp(self):
+        self.test_scraper = scraper.Scraper()
+        self.test_scraper.cookies.set('JSESSIONID', 'session-1')
+        self.test_scraper.fetch = mock.MagicMock(return_value=self.logged_in_html)
+        self.qis = qis.Qis('http://doesnt-even-matt.er/', custom_scraper=self.test_scraper, login_state_ttl=60)
+
+    def test_probe_is_cached(self):
+        self.assertTrue(self.qis.is_logged_in)
+        self.assertTrue(self.qis.is_logged_in)
+        self.assertEqual(self.test_scraper.fetch.call_count, 1)
+
+    def test_expired(self):
+        self.qis.login_state_ttl = 0
+        self.assertTrue(self.qis.is_logged_in)
+        self.assertTrue(self.qis.is_logged_in)
+        self.assertEqual(self.test_scraper.fetch.call_count, 2)
+
+    def test_other_session(self):
+        self.assertTrue(self.qis.is_logged_in)
+        self.test_scraper.cookies.set('JSESSIONID', 'session-2')
+        self.assertTrue(self.qis.is_logged_in)
+        self.assertEqual(self.test_scraper.fetch.call_count, 2)
+
+    def test_observed_logout(self):
+        self.assertTrue(self.qis.is_logged_in)
+        # Any page fetched afterwards reveals that the session was lost
+        for hook in self.test_scraper.fetch_hooks:
+            hook(requests.Response(), self.logged_out_html)
+        self.assertFalse(self.qis.is_logged_in)
+        self.assertEqual(self.test_scraper.fetch.call_count, 1)
+
+    def test_observed_login_form(self):
+        login_form_html = html_builder.HTML(html_builder.BODY(html_builder.FORM(
+            html_builder.INPUT(html_builder.ATTR({'type': 'password', 'name': 'password'})))))
+        for hook in self.test_scraper.fetch_hooks:
+            hook(requests.Response(), login_form_html)
+        self.assertFalse(self.qis.is_logged_in)
+        self.assertFalse(self.test_scraper.fetch.called)
+
+    def test_invalidate(self):
+        self.assertTrue(self.qis.is_logged_in)
+        self.qis.invalidate_login_state()
+        self.assertTrue(self.qis.is_logged_in)
+        self.assertEqual(self.test_scraper.fetch.call_count, 2)
+
+
 class TestLogin(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -148,6 +210,26 @@ class TestLogin(unittest.TestCase):
             self.qis.login(self.username, self.password)
         self.assertIsInstance(context.exception.__cause__, requests.HTTPError)
 
+    @mock.patch('requests.Session.post')
+    def test_half_open_circuit(self, post_mock: mock.Mock):
+        self.test_scraper.fetch = mock.MagicMock(return_value=self.login_html)
+        breaker = resilience.breaker_for('testacti.on')
+        with mock.patch('time.monotonic', return_value=100):
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+        with mock.patch('time.monotonic', return_value=100 + breaker.reset_timeout):
+            # A passed deadline releases the trial, so that the next login attempt is let through
+            with mock.patch.object(self.test_scraper, 'request_timeout', side_effect=DeadlineExceededException()):
+                with self.assertRaises(DeadlineExceededException):
+                    self.qis.login(self.username, self.password)
+            # The host answered, even though the login is refused
+            response = requests.Response()
+            response.status_code = 403
+            post_mock.return_value = response
+            with self.assertRaises(qis.QisLoginFailedException):
+                self.qis.login(self.username, self.password)
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.CLOSED)
+
     @mock.patch('requests.Session.post')
     def test_login_failed(self, post_mock: mock.Mock):
         self.test_scraper.fetch = mock.MagicMock(return_value=self.login_html)
@@ -164,5 +246,69 @@ class TestLogin(unittest.TestCase):
 
 
 class TestFetchExamsExtract(unittest.TestCase):
-    # TODO
-    pass
+    @classmethod
+    def setUpClass(cls):
+        cls.exams_extract_html = html_builder.HTML(html_builder.BODY(
+            html_builder.DIV(html_builder.CLASS('abstand_pruefinfo')),
+            html_builder.FORM(
+                html_builder.TABLE(),
+                html_builder.TABLE(html_builder.TR(html_builder.TD('1000')), html_builder.TR(html_builder.TD('2000')))
+            )
+        ))
+        cls.other_html = html_builder.HTML(html_builder.BODY())
+
+    def setUp(self):
+        self.test_scraper = scraper.Scraper()
+        self.test_scraper.cookies.set('JSESSIONID', 'session-1')
+        self.test_scraper.fetch = mock.MagicMock(return_value=self.exams_extract_html)
+        self.test_scraper.navigate = mock.MagicMock(
+            side_effect=lambda xpaths, url: iter([('http://ee.link/?asi=1', self.exams_extract_html)]))
+        self.qis = qis.Qis('http://doesnt-even-matt.er/', custom_scraper=self.test_scraper)
+        self.is_logged_in_patch = mock.patch('qisbot.qis.Qis.is_logged_in', new_callable=mock.PropertyMock)
+        self.is_logged_in_patch.start().return_value = True
+
+    def test_rows(self):
+        self.assertEqual(len(self.qis.fetch_exams_extract()), 2)
+
+    def test_navigation_is_cached(self):
+        self.qis.fetch_exams_extract()
+        self.qis.fetch_exams_extract()
+        self.assertEqual(self.test_scraper.navigate.call_count, 1)
+        self.test_scraper.fetch.assert_called_once_with('http://ee.link/?asi=1')
+
+    def test_cache_is_per_session(self):
+        self.qis.fetch_exams_extract()
+        self.test_scraper.cookies.set('JSESSIONID', 'session-2')
+        self.qis.fetch_exams_extract()
+        self.assertEqual(self.test_scraper.navigate.call_count, 2)
+        self.assertFalse(self.test_scraper.fetch.called)
+
+    def test_stale_destination(self):
+        self.qis.fetch_exams_extract()
+        # The cached URL doesn't lead to the exams extract anymore
+        self.test_scraper.fetch.return_value = self.other_html
+        self.assertEqual(len(self.qis.fetch_exams_extract()), 2)
+        self.assertEqual(self.test_scraper.navigate.call_count, 2)
+
+    def test_session_lost(self):
+        self.qis.fetch_exams_extract()
+
+        def fetch_login_page(url: str) -> html.HtmlElement:
+            # What the scraper's fetch hook does when it sees the login page
+            self.qis._remember_login_state(False)
+            return self.other_html
+
+        self.test_scraper.fetch.side_effect = fetch_login_page
+        with self.assertRaises(qis.QisNotLoggedInException):
+            self.qis.fetch_exams_extract()
+        # Navigating from the login page wouldn't lead to the exams extract
+        self.assertEqual(self.test_scraper.navigate.call_count, 1)
+
+    def test_not_exams_extract(self):
+        self.test_scraper.navigate.side_effect = lambda xpaths, url: iter([('http://other.link/', self.other_html)])
+        with self.assertRaises(qis.UnexpectedStateException):
+            self.qis.fetch_exams_extract()
+        self.assertEqual(self.test_scraper.destinations, [])
+
+    def tearDown(self):
+        self.is_logged_in_patch.stop()
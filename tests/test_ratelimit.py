@@ -0,0 +1,86 @@
+import time
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from qisbot import ratelimit
+from qisbot import scraper
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            ratelimit.RateLimiter(rate=0)
+        with self.assertRaises(ValueError):
+            ratelimit.RateLimiter(burst=0)
+        with self.assertRaises(ValueError):
+            ratelimit.RateLimiter(max_in_flight=0)
+
+    def test_burst(self):
+        limiter = ratelimit.RateLimiter(rate=1, burst=3, max_in_flight=None)
+        for _ in range(3):
+            with limiter.request('http://qis.example.com/page'):
+                pass
+        self.assertEqual(limiter.stats()['delayed_requests'], 0)
+
+    def test_rate(self):
+        limiter = ratelimit.RateLimiter(rate=20, burst=1, max_in_flight=None)
+        started_at = time.monotonic()
+        for _ in range(3):
+            with limiter.request('http://qis.example.com/page'):
+                pass
+        # The first request uses the burst, the others have to wait for a token each
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.09)
+        stats = limiter.stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['delayed_requests'], 2)
+        self.assertGreater(stats['max_wait'], 0)
+        limiter.reset_stats()
+        self.assertEqual(limiter.stats()['requests'], 0)
+
+    def test_hosts_are_independent(self):
+        limiter = ratelimit.RateLimiter(rate=0.001, burst=1, max_in_flight=None)
+        with limiter.request('http://qis.example.com/page'):
+            pass
+        with limiter.request('http://other.example.com/page'):
+            pass
+        self.assertEqual(limiter.stats()['delayed_requests'], 0)
+
+    def test_max_in_flight(self):
+        limiter = ratelimit.RateLimiter(rate=None, max_in_flight=1)
+        entered = threading.Event()
+        waited = []
+
+        def request():
+            with limiter.request('http://qis.example.com/page') as seconds:
+                waited.append(seconds)
+
+        with limiter.request('http://qis.example.com/page'):
+            entered.set()
+            thread = threading.Thread(target=request)
+            thread.start()
+            time.sleep(0.05)
+            self.assertEqual(waited, [])
+            self.assertEqual(limiter.stats()['in_flight'], 1)
+        thread.join(1)
+        self.assertEqual(len(waited), 1)
+        self.assertGreater(waited[0], 0)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+
+class TestScraperRateLimiting(unittest.TestCase):
+    @mock.patch('requests.Session.get')
+    def test_fetch_is_limited(self, session_get_mock: mock.Mock):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'<html><body><p>Hi</p></body></html>'
+        session_get_mock.return_value = response
+        limiter = ratelimit.RateLimiter()
+        page_scraper = scraper.Scraper(rate_limiter=limiter)
+        page_scraper.fetch('http://qis.example.com/page')
+        self.assertEqual(limiter.stats()['requests'], 1)
+
+    def test_shared_by_default(self):
+        self.assertIs(scraper.Scraper().rate_limiter, scraper.Scraper().rate_limiter)
@@ -0,0 +1,93 @@
+import time
+import unittest
+from unittest import mock
+
+from qisbot import resilience
+from qisbot.exceptions import CircuitOpenException
+from qisbot.exceptions import DeadlineExceededException
+
+
+class TestDeadline(unittest.TestCase):
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            resilience.Deadline(0)
+
+    def test_timeout(self):
+        deadline = resilience.Deadline(5)
+        self.assertEqual(deadline.timeout(1), 1)
+        self.assertLessEqual(deadline.timeout(30), 5)
+        self.assertLessEqual(deadline.timeout(None), 5)
+        self.assertFalse(deadline.expired)
+
+    def test_expired(self):
+        deadline = resilience.Deadline(0.01)
+        time.sleep(0.02)
+        self.assertTrue(deadline.expired)
+        with self.assertRaises(DeadlineExceededException):
+            deadline.timeout(1)
+
+
+class TestBackoffDelay(unittest.TestCase):
+    def test_bounds(self):
+        for attempt in range(10):
+            delay = resilience.backoff_delay(attempt, base=0.5, cap=4)
+            self.assertTrue(0 <= delay <= min(4, 0.5 * 2 ** attempt))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            resilience.CircuitBreaker(failure_threshold=0)
+        with self.assertRaises(ValueError):
+            resilience.CircuitBreaker(reset_timeout=0)
+
+    def test_opens_after_threshold(self):
+        breaker = resilience.CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenException):
+            breaker.before_request()
+
+    def test_success_resets_failures(self):
+        breaker = resilience.CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.CLOSED)
+
+    @mock.patch('time.monotonic')
+    def test_trial_request(self, monotonic_mock: mock.Mock):
+        monotonic_mock.return_value = 100
+        breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        breaker.record_failure()
+        monotonic_mock.return_value = 111
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.HALF_OPEN)
+        breaker.before_request()
+        # Only a single trial request is let through
+        with self.assertRaises(CircuitOpenException):
+            breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.OPEN)
+        monotonic_mock.return_value = 122
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.CLOSED)
+
+    @mock.patch('time.monotonic')
+    def test_release_trial(self, monotonic_mock: mock.Mock):
+        monotonic_mock.return_value = 100
+        breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        self.assertFalse(breaker.before_request())
+        breaker.record_failure()
+        monotonic_mock.return_value = 111
+        self.assertTrue(breaker.before_request())
+        breaker.release_trial()
+        # The next request is the trial instead
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.before_request())
+
+    def test_shared_per_host(self):
+        self.assertIs(resilience.breaker_for('qis.example.com'), resilience.breaker_for('qis.example.com'))
+        self.assertIsNot(resilience.breaker_for('qis.example.com'), resilience.breaker_for('other.example.com'))
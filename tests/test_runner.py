@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from qisbot import events
+from qisbot import runner
+from qisbot import persistence
+from qisbot.exceptions import QisNotLoggedInException
+from tests.helpers import make_exam
+
+_config_template = """[QIS]
+username = {username}
+password = secret
+baseUrl = http://doesnt-even-matt.er/
+"""
+
+
+class TestMultiAccountRunner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_paths = []
+        for username in ('alice', 'bob', 'carol'):
+            config_path = os.path.join(self.directory, '{}.ini'.format(username))
+            with open(config_path, 'w') as config_file:
+                config_file.write(_config_template.format(username=username))
+            self.config_paths.append(config_path)
+        self.database_path = os.path.join(self.directory, 'qisbot.db')
+
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            runner.MultiAccountRunner([], self.database_path)
+        with self.assertRaises(ValueError):
+            runner.MultiAccountRunner(self.config_paths, None)
+        with self.assertRaises(ValueError):
+            runner.MultiAccountRunner(self.config_paths, self.database_path, max_workers=0)
+
+    @mock.patch('qisbot.bot.Bot.refresh_exams_extract')
+    def test_results_per_account(self, refresh_mock: mock.Mock):
+        refresh_mock.side_effect = [[events.NewExamEvent(None, None)], QisNotLoggedInException('nope'), []]
+        results = runner.MultiAccountRunner(self.config_paths, self.database_path, max_workers=1).run()
+        self.assertEqual([result.account for result in results], ['alice', 'bob', 'carol'])
+        self.assertEqual(len(results[0].new_exams), 1)
+        self.assertFalse(results[1].succeeded)
+        self.assertIsInstance(results[1].error, QisNotLoggedInException)
+        self.assertTrue(results[2].succeeded)
+
+    @mock.patch('qisbot.bot.Bot.refresh_exams_extract', return_value=[])
+    def test_bots_are_reused(self, _):
+        account_runner = runner.MultiAccountRunner(self.config_paths, self.database_path)
+        account_runner.run()
+        bots = account_runner.bots
+        account_runner.run()
+        self.assertEqual(len(bots), 3)
+        self.assertEqual(sorted(map(id, bots)), sorted(map(id, account_runner.bots)))
+
+    @mock.patch('qisbot.bot.Bot.refresh_exams_extract', return_value=[])
+    def test_run_subset(self, _):
+        results = runner.MultiAccountRunner(self.config_paths, self.database_path).run(self.config_paths[1:2])
+        self.assertEqual([result.account for result in results], ['bob'])
+
+    @mock.patch('qisbot.bot.Bot.refresh_exams_extract', return_value=[])
+    def test_unowned_exams(self, _):
+        db_manager = persistence.DatabaseManager(self.database_path)
+        db_manager.persist_exam(make_exam('1000'))
+        db_manager.close()
+        # It can't be told which of multiple accounts the exams belong to
+        with self.assertLogs(level='WARNING'):
+            account_runner = runner.MultiAccountRunner(self.config_paths, self.database_path)
+        account_runner.run()
+        self.assertEqual(account_runner._db_manager.fetch_unowned_exam_count(), 1)
+        account_runner = runner.MultiAccountRunner(self.config_paths[1:2], self.database_path)
+        account_runner.run()
+        self.assertEqual(account_runner._db_manager.fetch_unowned_exam_count(), 0)
+        self.assertIsNotNone(account_runner._db_manager.fetch_exam('1000', account='bob'))
+
+    @mock.patch('qisbot.ratelimit.limiter')
+    def test_rate_limits_of_first_account(self, limiter_mock: mock.Mock):
+        for config_path, rate in zip(self.config_paths, (2, 3, 2)):
+            with open(config_path, 'a') as config_file:
+                config_file.write('rate_limit = {}\n'.format(rate))
+        with self.assertLogs(level='WARNING') as logs:
+            account_runner = runner.MultiAccountRunner(self.config_paths, self.database_path)
+        self.assertEqual(limiter_mock.configure.call_count, 1)
+        self.assertEqual(limiter_mock.configure.call_args[1]['rate'], 2)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('bob.ini', logs.output[0])
+        # Bots leave the limits alone
+        with mock.patch('qisbot.bot.Bot.refresh_exams_extract', return_value=[]):
+            account_runner.run()
+        self.assertEqual(limiter_mock.configure.call_count, 1)
+
+    def test_broken_config(self):
+        results = runner.MultiAccountRunner([os.path.join(self.directory, 'missing.ini')], self.database_path).run()
+        self.assertFalse(results[0].succeeded)
+        self.assertIsNone(results[0].account)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
@@ -4,9 +4,13 @@ from unittest import mock
 import requests
 from lxml import html
 from lxml.etree import ParseError
+from lxml.etree import XPathSyntaxError
 from lxml.html import builder as html_builder
 
 from qisbot import scraper
+from qisbot import resilience
+from qisbot.exceptions import CircuitOpenException
+from qisbot.exceptions import DeadlineExceededException
 
 
 class TestFetching(unittest.TestCase):
@@ -82,6 +86,135 @@ class TestFetching(unittest.TestCase):
         self.assertIsInstance(context.exception.__cause__, ParseError)
 
 
+class TestConditionalFetching(unittest.TestCase):
+    """Pages whose responses carried validators shall be requested conditionally."""
+
+    def setUp(self):
+        self.scraper = scraper.Scraper()
+
+    @staticmethod
+    def _response(status_code: int, content: bytes = b'', headers: dict = None) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = content
+        response.headers.update(headers or {})
+        return response
+
+    @mock.patch('requests.Session.get')
+    def test_not_modified(self, session_get_mock: mock.Mock):
+        session_get_mock.side_effect = [
+            self._response(200, b'<html><body><p>content</p></body></html>', {'ETag': '"v1"'}),
+            self._response(304)
+        ]
+        first_doc = self.scraper.fetch('http://does-not-matt.er/')
+        second_doc = self.scraper.fetch('http://does-not-matt.er/')
+        self.assertEqual(session_get_mock.call_args[1]['headers'], {'If-None-Match': '"v1"'})
+        self.assertEqual(self.scraper.status, 304)
+        self.assertIs(second_doc, first_doc)
+
+    @mock.patch('requests.Session.get')
+    def test_no_validators(self, session_get_mock: mock.Mock):
+        session_get_mock.return_value = self._response(200, b'<html><body><p>content</p></body></html>')
+        self.scraper.fetch('http://does-not-matt.er/')
+        self.scraper.fetch('http://does-not-matt.er/')
+        self.assertEqual(session_get_mock.call_args[1]['headers'], {})
+
+
+@mock.patch('time.sleep')
+@mock.patch('requests.Session.get')
+class TestRetries(unittest.TestCase):
+    """Transient failures of GET requests shall be retried, while respecting deadlines and circuit breakers."""
+
+    def setUp(self):
+        self.scraper = scraper.Scraper()
+
+    @staticmethod
+    def _response(status_code: int) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = b'<html><body><p>content</p></body></html>'
+        return response
+
+    def test_transient_failures_are_retried(self, session_get_mock: mock.Mock, sleep_mock: mock.Mock):
+        session_get_mock.side_effect = [requests.ConnectionError(), self._response(503), self._response(200)]
+        self.scraper.fetch('http://retried.example.com/')
+        self.assertEqual(self.scraper.status, 200)
+        self.assertEqual(sleep_mock.call_count, 2)
+        self.assertEqual(session_get_mock.call_args[1]['timeout'], self.scraper.timeout)
+
+    def test_retries_exhausted(self, session_get_mock: mock.Mock, _):
+        session_get_mock.return_value = self._response(502)
+        with self.assertRaises(scraper.ScraperException) as context:
+            self.scraper.fetch('http://exhausted.example.com/')
+        self.assertIsInstance(context.exception.__cause__, requests.HTTPError)
+        self.assertEqual(session_get_mock.call_count, self.scraper.retries + 1)
+
+    def test_other_errors_are_not_retried(self, session_get_mock: mock.Mock, sleep_mock: mock.Mock):
+        session_get_mock.return_value = self._response(500)
+        with self.assertRaises(scraper.ScraperException):
+            self.scraper.fetch('http://not-retried.example.com/')
+        self.assertFalse(sleep_mock.called)
+
+    def test_deadline(self, session_get_mock: mock.Mock, _):
+        session_get_mock.return_value = self._response(200)
+        with self.scraper.deadline(5):
+            self.scraper.fetch('http://deadline.example.com/')
+            self.assertTrue(all(timeout <= 5 for timeout in session_get_mock.call_args[1]['timeout']))
+            with self.scraper.deadline(60):
+                self.assertTrue(all(timeout <= 5 for timeout in self.scraper.request_timeout()))
+        self.assertEqual(self.scraper.request_timeout(), self.scraper.timeout)
+
+    def test_no_time_left_for_retry(self, session_get_mock: mock.Mock, sleep_mock: mock.Mock):
+        session_get_mock.side_effect = requests.Timeout()
+        with mock.patch('qisbot.resilience.backoff_delay', return_value=30):
+            with self.assertRaises(DeadlineExceededException):
+                with self.scraper.deadline(1):
+                    self.scraper.fetch('http://no-time-left.example.com/')
+        self.assertFalse(sleep_mock.called)
+
+    def test_circuit_opens(self, session_get_mock: mock.Mock, _):
+        session_get_mock.side_effect = requests.ConnectionError()
+        self.scraper.retries = 0
+        for _ in range(5):
+            with self.assertRaises(scraper.ScraperException):
+                self.scraper.fetch('http://down.example.com/')
+        session_get_mock.reset_mock()
+        with self.assertRaises(CircuitOpenException):
+            self.scraper.fetch('http://down.example.com/')
+        self.assertFalse(session_get_mock.called)
+
+    def test_trial_is_released(self, session_get_mock: mock.Mock, _):
+        breaker = resilience.breaker_for('half-open.example.com')
+        self.scraper.retries = 0
+        with mock.patch('time.monotonic', return_value=100):
+            for _ in range(breaker.failure_threshold):
+                breaker.record_failure()
+        with mock.patch('time.monotonic', return_value=100 + breaker.reset_timeout):
+            # Neither a broken request nor a passed deadline tell whether the host is back
+            session_get_mock.side_effect = requests.exceptions.InvalidURL()
+            with self.assertRaises(scraper.ScraperException):
+                self.scraper.fetch('http://half-open.example.com/')
+            with mock.patch.object(self.scraper, 'request_timeout', side_effect=DeadlineExceededException()):
+                with self.assertRaises(DeadlineExceededException):
+                    self.scraper.fetch('http://half-open.example.com/')
+            session_get_mock.side_effect = None
+            session_get_mock.return_value = self._response(200)
+            self.scraper.fetch('http://half-open.example.com/')
+        self.assertEqual(breaker.state, resilience.CircuitBreaker.CLOSED)
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_ignores_markup(self):
+        first = html.fromstring('<table><tr><td>1000</td><td><a href="?asi=1">Exam</a></td></tr></table>')
+        second = html.fromstring('<table>\n<tr><td> 1000 </td>\n<td><a href="?asi=2">Exam</a></td></tr></table>')
+        self.assertEqual(scraper.fingerprint(first), scraper.fingerprint(second))
+
+    def test_detects_changes(self):
+        first = html.fromstring('<table><tr><td>1000</td><td>1,0</td></tr></table>')
+        second = html.fromstring('<table><tr><td>1000</td><td>1,3</td></tr></table>')
+        self.assertNotEqual(scraper.fingerprint(first), scraper.fingerprint(second))
+
+
 class TestSelection(unittest.TestCase):
     """Test the scraper's ability to select elements on a HTML document."""
 
@@ -154,6 +287,24 @@ class TestSelection(unittest.TestCase):
         self.assertIsInstance(result, list)
         self.assertEqual(len(result), 2)
 
+    def test_compiled_xpath_cache(self):
+        """Every expression shall only be compiled once."""
+        xpath = 'count(//li) + 0'
+        before = scraper.Scraper.xpath_cache_info()
+        self.scraper.number(xpath, self.valid_html)
+        self.scraper.number(xpath, self.valid_html)
+        after = scraper.Scraper.xpath_cache_info()
+        self.assertIs(scraper.Scraper.compile(xpath), scraper.Scraper.compile(xpath))
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertGreaterEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['size'] - before['size'], 1)
+
+    def test_invalid_xpath(self):
+        """When the XPath expression is invalid, a chained ScraperException shall be raised."""
+        with self.assertRaises(scraper.ScraperException) as context:
+            self.scraper.select('//li[', self.valid_html)
+        self.assertIsInstance(context.exception.__cause__, XPathSyntaxError)
+
     def test_find_all_no_list(self):
         """When attempting to get a non-HTML-element-list XPath result, a chained ScraperException shall be raised."""
         with self.assertRaises(scraper.ScraperException) as context:
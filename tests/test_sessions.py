@@ -0,0 +1,62 @@
+import os
+import stat
+import time
+import shutil
+import tempfile
+import unittest
+
+import requests.cookies
+
+from qisbot import sessions
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = sessions.SessionStore(os.path.join(self.directory, 'qisbot.session'))
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.cookies.set('JSESSIONID', 'ABCDEF0123456789', domain='qis.example.org', path='/qisserver')
+
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            sessions.SessionStore(None)
+
+    def test_roundtrip(self):
+        self.store.save(self.cookies)
+        restored = requests.cookies.RequestsCookieJar()
+        self.assertTrue(self.store.restore(restored))
+        self.assertEqual(restored.get('JSESSIONID', domain='qis.example.org', path='/qisserver'),
+                         'ABCDEF0123456789')
+
+    def test_destinations(self):
+        destination = ('http://qis.example.org/', ['//a'], 'ABCDEF0123456789', 'http://qis.example.org/?asi=1')
+        self.store.save(self.cookies, destinations=[destination])
+        store = sessions.SessionStore(self.store.path)
+        self.assertTrue(store.restore(requests.cookies.RequestsCookieJar()))
+        self.assertEqual(store.destinations, [destination])
+
+    def test_permissions(self):
+        self.store.save(self.cookies)
+        mode = stat.S_IMODE(os.stat(self.store.path).st_mode)
+        self.assertEqual(mode & (stat.S_IRWXG | stat.S_IRWXO), 0)
+
+    def test_expired(self):
+        self.store.save(self.cookies, validated_at=time.time() - 3600)
+        restored = requests.cookies.RequestsCookieJar()
+        self.assertFalse(self.store.restore(restored, max_age=1800))
+        self.assertEqual(len(restored), 0)
+
+    def test_missing_and_corrupt(self):
+        self.assertFalse(self.store.restore(requests.cookies.RequestsCookieJar()))
+        with open(self.store.path, 'w') as store_file:
+            store_file.write('{not json')
+        self.assertFalse(self.store.restore(requests.cookies.RequestsCookieJar()))
+
+    def test_clear(self):
+        self.store.save(self.cookies)
+        self.store.clear()
+        self.assertFalse(os.path.exists(self.store.path))
+        self.store.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
@@ -0,0 +1,84 @@
+import os
+import sys
+import shutil
+import typing
+import tempfile
+import unittest
+import subprocess
+
+_root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that only commands talking to QIS or sending notifications need
+_network_modules = ('requests', 'urllib3', 'lxml.etree', 'lxml.html', 'zope.event', 'smtplib', 'qisbot.scraper',
+                    'qisbot.qis', 'qisbot.notifies.email', 'qisbot.notifies.stdout')
+_list_modules = "\nimport sys as _sys\nprint('\\n'.join(_sys.modules))"
+
+
+def run_python(*args: str) -> typing.Tuple[str, str]:
+    """Run a fresh interpreter.
+
+    Args:
+        args: The interpreter's command line arguments
+    Returns:
+        What the interpreter wrote to stdout and stderr
+    """
+    process = subprocess.Popen([sys.executable] + list(args), cwd=_root_path, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        raise AssertionError('Statement failed:\n{}'.format(stderr))
+    return stdout, stderr
+
+
+def cold_start(statement: str, *args: str) -> typing.Set[str]:
+    """Execute a statement in a fresh interpreter.
+
+    Args:
+        statement: The Python statement to execute
+        args: Command line arguments of the statement, available as sys.argv[1:]
+    Returns:
+        The names of all modules imported by the end of the statement
+    """
+    stdout, _ = run_python('-c', statement + _list_modules, *args)
+    return set(stdout.split())
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.directory, 'qisbot.ini')
+        with open(self.config_path, 'w') as config_file:
+            config_file.write('[QIS]\nusername = user\npassword = secret\nbaseUrl = http://localhost/\n\n'
+                              '[NOTIFICATIONS]\nstdout = true\nworkers = 0\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertNotImported(self, modules: typing.Set[str], *names: str):
+        imported = [name for name in names if name in modules]
+        self.assertEqual(imported, [], 'Imported unexpectedly')
+
+    def test_cli_startup(self):
+        modules = cold_start('import runqisbot')
+        self.assertNotImported(modules, 'qisbot.bot', 'tablib', 'numpy', *_network_modules)
+
+    def test_print_needs_no_network(self):
+        modules = cold_start('import sys\n'
+                             'from qisbot.bot import Bot\n'
+                             'bot = Bot(sys.argv[1], sys.argv[2])\n'
+                             'bot.exams_extract_dataset()\n'
+                             'bot.shutdown()', self.config_path, os.path.join(self.directory, 'qisbot.db'))
+        self.assertIn('tablib', modules)
+        self.assertNotImported(modules, 'numpy', *_network_modules)
+
+    def test_enable_imports_enabled_notifiers_only(self):
+        modules = cold_start('import sys\n'
+                             'from qisbot import config, notifies\n'
+                             'assert notifies.enable(config.QisConfiguration(sys.argv[1])) == '
+                             '["qisbot.notifies.stdout"]', self.config_path)
+        self.assertIn('qisbot.notifies.stdout', modules)
+        self.assertNotImported(modules, 'qisbot.notifies.email', 'smtplib')
+
+
+if __name__ == '__main__':
+    unittest.main()
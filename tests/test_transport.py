@@ -0,0 +1,77 @@
+import gzip
+import threading
+import unittest
+import http.server
+
+from qisbot import scraper
+from qisbot import transport
+
+_page = b'<html><body>' + b'<p>An exam</p>' * 200 + b'</body></html>'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = _page
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        if self.path == '/login':
+            self.send_header('Set-Cookie', 'JSESSIONID={}; Path=/'.format(self.headers.get('X-Account')))
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTunedHTTPAdapter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.HTTPServer(('127.0.0.1', 0), _Handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_init(self):
+        with self.assertRaises(ValueError):
+            transport.TunedHTTPAdapter(pool_maxsize=0)
+
+    def test_compression_and_reuse(self):
+        adapter = transport.TunedHTTPAdapter()
+        page_scraper = scraper.Scraper(adapter=adapter)
+        for _ in range(3):
+            page_scraper.fetch(self.url + '/page')
+        stats = page_scraper.transfer_stats()
+        self.assertEqual(stats['responses'], 3)
+        self.assertEqual(stats['compressed_responses'], 3)
+        self.assertEqual(stats['content_bytes'], 3 * len(_page))
+        self.assertLess(stats['wire_bytes'], stats['content_bytes'])
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reused_connections'], 2)
+
+    def test_shared_pool_keeps_cookies_apart(self):
+        adapter = transport.TunedHTTPAdapter()
+        alice, bob = scraper.Scraper(adapter=adapter), scraper.Scraper(adapter=adapter)
+        alice.session.headers['X-Account'] = 'alice'
+        bob.session.headers['X-Account'] = 'bob'
+        alice.fetch(self.url + '/login')
+        bob.fetch(self.url + '/login')
+        self.assertEqual(alice.cookies.get('JSESSIONID'), 'alice')
+        self.assertEqual(bob.cookies.get('JSESSIONID'), 'bob')
+        self.assertEqual(adapter.stats()['connections'], 1)
+
+    def test_mount_keeps_accepted_encodings(self):
+        session = transport.session()
+        session.headers['Accept-Encoding'] = 'br'
+        transport.mount(session, transport.TunedHTTPAdapter())
+        self.assertEqual(session.headers['Accept-Encoding'], 'br, gzip, deflate')